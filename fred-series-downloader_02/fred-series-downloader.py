@@ -14,41 +14,112 @@ Datum: 2025-03-12
 """
 
 import os
+import re
 import time
-import random
 import json
 import csv
 import logging
 import argparse
 import threading
-import pandas as pd
+import multiprocessing.util
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from queue import Queue
 from typing import Dict, List, Optional, Any, Tuple
 
-# Selenium a BeautifulSoup pro scraping
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, WebDriverException
+# HTTP klienti pro FRED API (synchronní pro jednotlivé série, asynchronní pro dávky)
+import asyncio
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Rychlejší parsování JSON odpovědí API (volitelná závislost)
+try:
+    import orjson
+    json_loads = orjson.loads
+    json_dumps = orjson.dumps
+except ImportError:
+    orjson = None
+    json_loads = json.loads
+    json_dumps = lambda obj: json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+# Perzistentní cache metadat (volitelná závislost)
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+# Parsování HTML v procesu místo dotazů do prohlížeče
+from lxml import etree, html as lxml_html
+
+# Selenium se importuje až ve funkcích, které ho používají - API cesta a --help
+# tak neplatí za jeho načtení
 
 # Konfigurace
 CONFIG = {
     "webdriver_path": None,  # Bude automaticky hledat driver
     "headless": False,       # False pro viditelný prohlížeč, True pro headless mód
-    "min_delay": 1.0,        # Minimální zpoždění mezi požadavky (sekundy)
-    "max_delay": 3.0,        # Maximální zpoždění mezi požadavky (sekundy)
+    "scrape_rate_limit": 2.0,  # Max. počet načtených stránek za sekundu (všechny workery dohromady)
+    "api_rate_limit": 2.0,   # Max. počet požadavků na FRED API za sekundu (limit API je 120/min)
     "page_load_timeout": 30, # Timeout pro načtení stránky (sekundy)
     "retry_limit": 3,        # Počet pokusů při chybě
     "max_workers": 4,        # Počet paralelních vláken
     "batch_size": 10,       # Velikost dávky pro zpracování
     "output_dir": "fred_data",  # Adresář pro výstupní soubory
+    "api_key": os.environ.get("FRED_API_KEY"),  # Klíč k FRED API (bez klíče se použije Selenium)
+    "api_timeout": 10,       # Timeout pro požadavek na FRED API (sekundy)
+    "api_concurrency": 32,   # Maximální počet souběžných požadavků na FRED API
+    "use_selenium": False,   # Stahovat stránky Seleniem i s API klíčem (API pak jen předfiltruje série)
+    "use_cache": True,       # Ukládat získaná metadata do cache na disku
+    "cache_ttl": 86400,      # Stáří záznamu v cache, po kterém se série stáhne znovu (sekundy)
     "debug": False           # Debug mód pro podrobnější logování
 }
 
+# Frekvence (první slovo popisu z FRED), které jsou čtvrtletní nebo častější
+HIGH_FREQ = frozenset({"daily", "weekly", "biweekly", "monthly", "quarterly"})
+
+# Zkratky frekvencí z FRED API, které jsou čtvrtletní nebo častější
+HIGH_FREQ_SHORT = frozenset({'D', 'W', 'BW', 'M', 'Q'})
+
+FRED_API_SERIES_URL = "https://api.stlouisfed.org/fred/series"
+
+# Zdroje, které prohlížeč nemusí stahovat (metadata jsou v samotném HTML)
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg",
+    "*.woff", "*.woff2", "*.ttf", "*.css",
+    "*gtag*", "*google-analytics*", "*doubleclick*"
+]
+
+# Sloupce výstupního CSV s metadaty (klíče slovníku metadata)
+FIELDS = ('series_id', 'title', 'frequency', 'units', 'seasonal_adjustment',
+          'last_updated', 'source', 'data_source', 'notes')
+
+# Předkompilované vzory pro záložní hledání metadat v textu stránky
+_FREQ_NAMES = "Monthly|Daily|Weekly|Quarterly|Annual|Biweekly|Semiannual"
+FREQ_RE = re.compile(rf"Frequency:(?:\s|</div>\s*<div[^>]*>)*({_FREQ_NAMES})|>({_FREQ_NAMES})<")
+UNITS_RE = re.compile(r"(Thousands of Persons|Billions of Dollars|Millions of Dollars|Percent|Index)")
+SA_RE = re.compile(r"(Not Seasonally Adjusted|Seasonally Adjusted)")
+
+# Předkompilované XPath dotazy pro stránku série (chybějící prvek vrací prázdný seznam)
+XP_TITLE = etree.XPath("//*[contains(concat(' ', normalize-space(@class), ' '), ' series-title ')] | //h1")
+
+# Pole metadat a nadpisy, za kterými na stránce série následuje jejich hodnota
+LABELS = (
+    ("frequency", "Frequency:"),
+    ("units", "Units:"),
+    ("last_updated", "Updated:"),
+    ("data_source", "Source:"),
+)
+
+# Nadpisy, jejichž hodnota je v sousedním divu (ostatní mají hodnotu ve stejném prvku)
+SIBLING_XP = {label: etree.XPath(f"//div[contains(text(), '{label}')]/following-sibling::div[1]")
+              for label in ("Frequency:", "Units:")}
+FREQUENCY_VALUE_XPATH = SIBLING_XP["Frequency:"].path
+XP_TEXT_CONTAINS = etree.XPath("//*[not(self::script or self::style)][contains(text(), $needle)]")
+
+
 # Nastavení logování
 def setup_logging(debug=False):
     """Nastaví logování"""
@@ -69,13 +140,53 @@ def setup_logging(debug=False):
 # Inicializace loggeru
 logger = setup_logging(CONFIG["debug"])
 
-def random_delay():
-    """Náhodné zpoždění pro simulaci lidského chování"""
-    delay = CONFIG["min_delay"] + random.random() * (CONFIG["max_delay"] - CONFIG["min_delay"])
-    time.sleep(delay)
+def create_session():
+    """Vytvoří HTTP session s keep-alive spojeními pro FRED API"""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(
+        pool_connections=CONFIG["max_workers"],
+        pool_maxsize=CONFIG["max_workers"] * 4,
+        max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    ))
+    return session
+
+# Sdílená HTTP session pro FRED API (v každém procesu vlastní)
+SESSION = create_session()
+
+class RateLimiter:
+    """Omezovač rychlosti požadavků - čeká, jen pokud by byl překročen povolený počet za sekundu"""
+    
+    def __init__(self, rps):
+        self.interval = 1.0 / rps
+        self.next = 0
+        self.lock = threading.Lock()
+    
+    def _reserve(self):
+        """Zarezervuje další volný termín a vrátí, jak dlouho na něj čekat"""
+        with self.lock:
+            now = time.monotonic()
+            delay = max(0, self.next - now)
+            self.next = max(now, self.next) + self.interval
+            return delay
+    
+    def wait(self):
+        """Počká na povolení k dalšímu požadavku"""
+        time.sleep(self._reserve())
+    
+    async def wait_async(self):
+        """Počká na povolení k dalšímu požadavku bez blokování smyčky událostí"""
+        await asyncio.sleep(self._reserve())
+
+# Omezovač požadavků na FRED API (API se volá jen z hlavního procesu)
+API_LIMITER = RateLimiter(CONFIG["api_rate_limit"])
+
+# Omezovač načítání stránek (v každém pracovním procesu vlastní, viz _init_worker)
+SCRAPE_LIMITER = None
 
 def create_driver():
     """Vytvoří a konfiguruje WebDriver pro Selenium"""
+    from selenium import webdriver
+    
     options = webdriver.ChromeOptions()
     
     # Nastavení pro nižší detekci automatizace
@@ -92,10 +203,18 @@ def create_driver():
         options.add_argument("--headless=new")
         options.add_argument("--window-size=1920,1080")
     
+    # Metadata jsou v úvodním HTML - nečekat na obrázky, fonty a analytiku
+    options.set_capability("pageLoadStrategy", "eager")
+    options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    
     # Vytvořit driver
     driver = webdriver.Chrome(options=options)
     driver.set_page_load_timeout(CONFIG["page_load_timeout"])
     
+    # Blokovat stahování zbytečných zdrojů přes DevTools protokol
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    
     # Obejít detekci
     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
     driver.execute_script("window.chrome = { runtime: {} };")
@@ -106,30 +225,210 @@ def create_driver():
     
     return driver
 
+def collect_cookies():
+    """Jednou navštíví hlavní stránku FRED a vrátí získané cookies"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+    
+    driver = create_driver()
+    try:
+        driver.get("https://fred.stlouisfed.org/")
+        
+        # Počkat na vyhledávací pole místo pevné pauzy
+        try:
+            WebDriverWait(driver, 10).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, "input[name='st'], input[type='search']"))
+            )
+        except TimeoutException:
+            logger.warning("Timeout při čekání na načtení hlavní stránky FRED")
+        
+        cookies = driver.get_cookies()
+        logger.info(f"Získáno {len(cookies)} cookies z hlavní stránky FRED")
+        return cookies
+    
+    except Exception as e:
+        logger.error(f"Chyba při získávání cookies: {str(e)}")
+        return []
+    
+    finally:
+        driver.quit()
+
+def set_cookies(driver, cookies):
+    """Vloží cookies do prohlížeče přes DevTools protokol (bez načtení stránky)"""
+    for cookie in cookies:
+        params = {key: cookie[key] for key in ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite')
+                  if key in cookie}
+        # WebDriver vrací 'expiry', DevTools očekává 'expires'
+        if 'expiry' in cookie:
+            params['expires'] = cookie['expiry']
+        
+        try:
+            driver.execute_cdp_cmd("Network.setCookie", params)
+        except Exception as e:
+            logger.warning(f"Nepodařilo se nastavit cookie {cookie.get('name')}: {str(e)}")
+
+class DriverPool:
+    """Pool předem vytvořených WebDriverů sdílených mezi vlákny"""
+    
+    def __init__(self, size):
+        self.size = size
+        self.queue = Queue()
+        for _ in range(size):
+            self.queue.put(self._new_driver())
+        logger.info(f"Vytvořen pool s {size} instancemi prohlížeče")
+    
+    def _new_driver(self):
+        """Vytvoří nový driver se sdílenými cookies bez návštěvy hlavní stránky"""
+        driver = create_driver()
+        set_cookies(driver, COOKIES)
+        return driver
+    
+    def get(self):
+        """Vypůjčí driver z poolu, případně nahradí driver se ztracenou session"""
+        from selenium.common.exceptions import WebDriverException
+        
+        driver = self.queue.get()
+        try:
+            driver.current_url
+        except WebDriverException:
+            logger.warning("Session prohlížeče byla ztracena, vytvářím nový driver")
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            driver = self._new_driver()
+        return driver
+    
+    def put(self, driver):
+        """Vrátí driver zpět do poolu"""
+        self.queue.put(driver)
+    
+    def close(self):
+        """Ukončí všechny drivery v poolu"""
+        while not self.queue.empty():
+            driver = self.queue.get_nowait()
+            try:
+                driver.quit()
+            except Exception:
+                pass
+
+# Globální pool driverů (inicializuje se v main, pokud se nepoužívá API)
+POOL = None
+
+# Cookies z hlavní stránky FRED získané jednou pro všechny pracovní procesy
+COOKIES = []
+
+# Cache metadat na disku (otevírá se líně v každém procesu zvlášť)
+CACHE = None
+
+def _metadata_from_api(series_id, payload):
+    """Převede odpověď FRED API na slovník metadat"""
+    seriess = payload.get("seriess") or []
+    
+    if not seriess:
+        logger.warning(f"FRED API nevrátilo žádná metadata pro {series_id}")
+        return None
+    
+    s = seriess[0]
+    metadata = {
+        'series_id': series_id,
+        'title': s.get('title', ''),
+        'frequency': s.get('frequency'),
+        'units': s.get('units'),
+        'seasonal_adjustment': s.get('seasonal_adjustment'),
+        'last_updated': s.get('last_updated'),
+        'source': 'FRED',
+        'data_source': None,
+        'notes': s.get('notes')
+    }
+    
+    logger.info(f"Extrahovaná metadata pro {series_id} z API: {metadata}")
+    return metadata
+
+def _api_params(series_id):
+    """Parametry dotazu na FRED API pro jednu sérii"""
+    return {"series_id": series_id, "api_key": CONFIG["api_key"], "file_type": "json"}
+
+def get_series_metadata_api(series_id):
+    """Získá metadata série jedním požadavkem na FRED API"""
+    try:
+        API_LIMITER.wait()
+        response = SESSION.get(FRED_API_SERIES_URL, params=_api_params(series_id),
+                               timeout=CONFIG["api_timeout"])
+        response.raise_for_status()
+        return _metadata_from_api(series_id, json_loads(response.content))
+    
+    except Exception as e:
+        # Text výjimek requests obsahuje URL dotazu včetně api_key - logovat jen typ a HTTP status
+        status = getattr(getattr(e, 'response', None), 'status_code', None)
+        logger.error(f"Chyba při získávání metadat z API pro {series_id}: {type(e).__name__}"
+                     + (f" (HTTP {status})" if status else ""))
+        return None
+
+async def _fetch_series_api_async(session, series_id, semaphore):
+    """Asynchronně stáhne odpověď FRED API pro jednu sérii, souběh omezuje semafor"""
+    async with semaphore:
+        try:
+            await API_LIMITER.wait_async()
+            async with session.get(FRED_API_SERIES_URL, params=_api_params(series_id),
+                                   timeout=aiohttp.ClientTimeout(total=CONFIG["api_timeout"])) as response:
+                response.raise_for_status()
+                return json_loads(await response.read())
+        
+        except Exception as e:
+            # Text ClientResponseError končí URL dotazu včetně api_key - logovat jen typ a HTTP status
+            status = getattr(e, 'status', None)
+            logger.error(f"Chyba při získávání metadat z API pro {series_id}: {type(e).__name__}"
+                         + (f" (HTTP {status})" if status else ""))
+            return None
+
+async def get_series_metadata_api_async(session, series_id, semaphore):
+    """Asynchronně získá metadata série z FRED API, vrací dvojici (series_id, metadata)"""
+    payload = await _fetch_series_api_async(session, series_id, semaphore)
+    if payload is None:
+        return series_id, None
+    return series_id, _metadata_from_api(series_id, payload)
+
+def _api_session(semaphore_size):
+    """Vytvoří aiohttp session se sdíleným connection poolem pro FRED API"""
+    connector = aiohttp.TCPConnector(limit=200, limit_per_host=semaphore_size, ttl_dns_cache=600)
+    return aiohttp.ClientSession(connector=connector)
+
 def get_series_metadata_selenium(driver, series_id):
     """Extrahuje metadata série z FRED stránky podle aktuální struktury"""
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+    
     try:
         url = f"https://fred.stlouisfed.org/series/{series_id}"
         
-        # Načíst stránku
+        # Načíst stránku (čeká se jen při překročení povolené rychlosti)
+        if SCRAPE_LIMITER:
+            SCRAPE_LIMITER.wait()
         driver.get(url)
         
-        # Počkat na načtení hlavního obsahu
+        # Počkat, až se vykreslí hodnota frekvence (objeví se až s metadaty série)
         try:
             WebDriverWait(driver, 15).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, ".series-title, h1"))
+                EC.presence_of_element_located((By.XPATH, FREQUENCY_VALUE_XPATH))
             )
-            # Krátká pauza pro dokončení JS renderování
-            time.sleep(1.5)
         except TimeoutException:
             logger.warning(f"Timeout při čekání na načtení stránky pro {series_id}")
         
+        # Zdrojový kód stránky serializovat jen jednou a dál pracovat s lokálním stromem
+        page_text = driver.page_source
+        tree = lxml_html.fromstring(page_text)
+        
         # Získat title
         title = ""
-        try:
-            title_element = driver.find_element(By.CSS_SELECTOR, '.series-title, h1')
-            title = title_element.text.strip()
-        except NoSuchElementException:
+        title_elements = XP_TITLE(tree)
+        if title_elements:
+            title = title_elements[0].text_content().strip()
+        else:
             logger.warning(f"Nepodařilo se najít název série pro {series_id}")
         
         # Inicializace metadat
@@ -141,141 +440,51 @@ def get_series_metadata_selenium(driver, series_id):
             'seasonal_adjustment': None,
             'last_updated': None,
             'source': 'FRED',
-            'data_source': None
+            'data_source': None,
+            'notes': None
         }
         
-        # METODA 1: Extrakce podle struktury stránky
-        
-        # Frequency - přímo z oblasti Frequency
-        try:
-            # Hledáme sekci "Frequency:" a hodnotu
-            freq_headers = driver.find_elements(By.XPATH, "//div[contains(text(), 'Frequency:')]")
-            if freq_headers:
-                # Pokud existuje Frequency: nadpis, vezmeme samotnou hodnotu, která je v té samé oblasti
-                freq_value = driver.find_element(By.XPATH, "//div[contains(text(), 'Frequency:')]/following-sibling::div").text.strip()
-                metadata['frequency'] = freq_value
-        except Exception as e:
-            logger.warning(f"Chyba při extrakci frekvence podle hlavičky: {e}")
+        # METODA 1: Extrakce podle struktury stránky - hodnota v sousedním divu za nadpisem,
+        # nebo text za nadpisem ve stejném prvku (např. "Updated: Mar 7, 2025 7:48 AM CST")
+        for key, label in LABELS:
+            value = None
+            if label in SIBLING_XP:
+                values = SIBLING_XP[label](tree)
+                if values:
+                    value = values[0].text_content().strip()
+            
+            if not value:
+                for elem in XP_TEXT_CONTAINS(tree, needle=label):
+                    value = elem.text_content().split(label, 1)[-1].strip()
+                    if value:
+                        break
+            
+            metadata[key] = value or None
         
         # Pokud první metoda selhala, zkusíme přímo najít hodnotu frekvence
         if not metadata['frequency']:
-            try:
-                # Zkontrolovat hodnoty v textu stránky
-                freq_values = ["Monthly", "Weekly", "Daily", "Quarterly", "Annual", "Biweekly", "Semiannual"]
-                for freq in freq_values:
-                    elements = driver.find_elements(By.XPATH, f"//*[contains(text(), '{freq}')]")
-                    if elements:
-                        for elem in elements:
-                            if len(elem.text) < 30:  # Krátký text napovídá, že jde o samotnou hodnotu
-                                metadata['frequency'] = freq
-                                break
-                        if metadata['frequency']:
-                            break
-            except Exception as e:
-                logger.warning(f"Chyba při přímém hledání hodnoty frekvence: {e}")
+            for freq in ["Monthly", "Weekly", "Daily", "Quarterly", "Annual", "Biweekly", "Semiannual"]:
+                # Krátký text napovídá, že jde o samotnou hodnotu
+                if any(len(elem.text_content()) < 30 for elem in XP_TEXT_CONTAINS(tree, needle=freq)):
+                    metadata['frequency'] = freq
+                    break
         
-        # Pokud stále nemáme frekvenci, zkusíme to jinak
+        # Pokud stále nemáme frekvenci, zkusíme jedním průchodem textu stránky
         if not metadata['frequency']:
-            try:
-                # Kompletní text stránky
-                page_text = driver.page_source
-                
-                # Hledat frekvenci v textu stránky
-                frequency_patterns = {
-                    "Monthly": ["Frequency: Monthly", "Frequency:</div><div>Monthly", ">Monthly<"],
-                    "Daily": ["Frequency: Daily", "Frequency:</div><div>Daily", ">Daily<"],
-                    "Weekly": ["Frequency: Weekly", "Frequency:</div><div>Weekly", ">Weekly<"],
-                    "Quarterly": ["Frequency: Quarterly", "Frequency:</div><div>Quarterly", ">Quarterly<"],
-                    "Annual": ["Frequency: Annual", "Frequency:</div><div>Annual", ">Annual<"],
-                    "Biweekly": ["Frequency: Biweekly", "Frequency:</div><div>Biweekly", ">Biweekly<"],
-                    "Semiannual": ["Frequency: Semiannual", "Frequency:</div><div>Semiannual", ">Semiannual<"]
-                }
-                
-                for freq, patterns in frequency_patterns.items():
-                    for pattern in patterns:
-                        if pattern in page_text:
-                            metadata['frequency'] = freq
-                            break
-                    if metadata['frequency']:
-                        break
-            except Exception as e:
-                logger.warning(f"Chyba při hledání frekvence v textu stránky: {e}")
-        
-        # Units a Seasonal Adjustment
-        try:
-            # Hledáme sekci "Units:" a hodnotu
-            units_headers = driver.find_elements(By.XPATH, "//div[contains(text(), 'Units:')]")
-            if units_headers:
-                # Pokud existuje Units: nadpis, vezmeme samotnou hodnotu, která je v té samé oblasti
-                units_value = driver.find_element(By.XPATH, "//div[contains(text(), 'Units:')]/following-sibling::div").text.strip()
-                metadata['units'] = units_value
-                
-                # Extrahovat Seasonal Adjustment
-                if "Seasonally Adjusted" in units_value:
-                    metadata['seasonal_adjustment'] = "Seasonally Adjusted"
-                elif "Not Seasonally Adjusted" in units_value:
-                    metadata['seasonal_adjustment'] = "Not Seasonally Adjusted"
-        except Exception as e:
-            logger.warning(f"Chyba při extrakci jednotek: {e}")
+            match = FREQ_RE.search(page_text)
+            if match:
+                metadata['frequency'] = match.group(1) or match.group(2)
         
         # Pokud nemáme jednotky, zkusíme to z textu stránky
         if not metadata['units']:
-            try:
-                page_text = driver.page_source
-                units_patterns = [
-                    "Thousands of Persons",
-                    "Billions of Dollars",
-                    "Millions of Dollars",
-                    "Percent",
-                    "Index"
-                ]
-                
-                for pattern in units_patterns:
-                    if pattern in page_text:
-                        metadata['units'] = pattern
-                        break
-                
-                # Extrahovat Seasonal Adjustment z textu
-                if "Seasonally Adjusted" in page_text:
-                    metadata['seasonal_adjustment'] = "Seasonally Adjusted"
-                elif "Not Seasonally Adjusted" in page_text:
-                    metadata['seasonal_adjustment'] = "Not Seasonally Adjusted"
-            except Exception as e:
-                logger.warning(f"Chyba při hledání jednotek v textu stránky: {e}")
-        
-        # Last Updated - podle běžného formátu "Updated: Mar 7, 2025 7:48 AM CST"
-        try:
-            update_elements = driver.find_elements(By.XPATH, "//div[contains(text(), 'Updated:')]")
-            if update_elements:
-                updated_text = update_elements[0].text.strip()
-                metadata['last_updated'] = updated_text.replace("Updated:", "").strip()
-        except Exception as e:
-            logger.warning(f"Chyba při extrakci data aktualizace: {e}")
-        
-        # Pokud nemáme datum aktualizace, zkusíme jiný přístup
-        if not metadata['last_updated']:
-            try:
-                # Hledat podle textu "Updated:"
-                updated_elements = driver.find_elements(By.XPATH, "//*[contains(text(), 'Updated:')]")
-                for elem in updated_elements:
-                    text = elem.text.strip()
-                    if "Updated:" in text:
-                        metadata['last_updated'] = text.split("Updated:")[1].strip()
-                        break
-            except Exception as e:
-                logger.warning(f"Chyba při hledání data aktualizace v textu: {e}")
+            match = UNITS_RE.search(page_text)
+            if match:
+                metadata['units'] = match.group(1)
         
-        # Source - typicky "U.S. Bureau of Labor Statistics via FRED®"
-        try:
-            source_elements = driver.find_elements(By.XPATH, "//*[contains(text(), 'Source:')]")
-            if source_elements:
-                for elem in source_elements:
-                    text = elem.text.strip()
-                    if "Source:" in text:
-                        metadata['data_source'] = text.replace("Source:", "").strip()
-                        break
-        except Exception as e:
-            logger.warning(f"Chyba při extrakci zdroje: {e}")
+        # Seasonal Adjustment je součástí jednotek, jinak ho hledat v textu stránky
+        match = SA_RE.search(metadata['units'] or '') or SA_RE.search(page_text)
+        if match:
+            metadata['seasonal_adjustment'] = match.group(1)
         
         # Diagnostika - pokud extrakce frekvence selhala
         if not metadata['frequency'] and CONFIG["debug"]:
@@ -290,16 +499,19 @@ def get_series_metadata_selenium(driver, series_id):
                 driver.save_screenshot(os.path.join(debug_dir, f"debug_{series_id}.png"))
                 
                 with open(os.path.join(debug_dir, f"debug_{series_id}.html"), "w", encoding="utf-8") as f:
-                    f.write(driver.page_source)
+                    f.write(page_text)
+                
+                # Dosud extrahovaná metadata pro porovnání s HTML
+                with open(os.path.join(debug_dir, f"debug_{series_id}.json"), "wb") as f:
+                    f.write(json_dumps(metadata))
                 
                 logger.info(f"Diagnostické informace uloženy do {debug_dir}")
             except Exception as e:
                 logger.error(f"Chyba při ukládání diagnostických informací: {e}")
         
-        # Defaultní hodnota pro frekvenci, pokud nebyla nalezena
+        # Nenalezenou frekvenci nechat prázdnou, sérii vyřadí až volající
         if not metadata['frequency']:
-            metadata['frequency'] = "Monthly"  # Default hodnota, aby série nebyla přeskočena
-            logger.warning(f"Pro sérii {series_id} nebyla nalezena frekvence, nastavuji na default (Monthly)")
+            logger.warning(f"Pro sérii {series_id} nebyla nalezena frekvence")
         
         # Výstupní log
         logger.info(f"Extrahovaná metadata pro {series_id}: {metadata}")
@@ -307,52 +519,92 @@ def get_series_metadata_selenium(driver, series_id):
     
     except Exception as e:
         logger.error(f"Kritická chyba při získávání metadat pro {series_id}: {str(e)}")
-        # Vrátit alespoň nějaká metadata, aby série nebyla přeskočena
-        return {
-            'series_id': series_id,
-            'title': '',
-            'frequency': 'Monthly',  # Default hodnota pro sérii s chybou
-            'units': '',
-            'seasonal_adjustment': '',
-            'last_updated': '',
-            'source': 'FRED',
-            'data_source': ''
-        }
+        return None
+
+def get_cache():
+    """Vrátí cache metadat (otevře ji při prvním použití), nebo None, pokud je vypnutá"""
+    global CACHE
+    if CACHE is None and CONFIG["use_cache"] and diskcache is not None:
+        CACHE = diskcache.Cache(os.path.join(CONFIG["output_dir"], "metadata.cache"))
+    return CACHE
+
+def cache_get(series_id):
+    """Vrátí metadata série z cache, pokud nejsou starší než cache_ttl"""
+    cache = get_cache()
+    if cache is None:
+        return None
+    
+    entry = cache.get(series_id)
+    if entry and entry[0] > time.time() - CONFIG["cache_ttl"]:
+        logger.debug(f"Metadata pro {series_id} načtena z cache")
+        return entry[1]
+    return None
+
+def cache_set(series_id, metadata):
+    """Uloží metadata série do cache, pokud se stránku podařilo skutečně načíst"""
+    cache = get_cache()
+    if cache is not None and metadata and metadata.get('title') and metadata.get('frequency'):
+        cache.set(series_id, (time.time(), metadata))
+
+def use_api():
+    """Určí, zda se metadata stahují z FRED API místo prohlížeče"""
+    return bool(CONFIG["api_key"]) and not CONFIG["use_selenium"]
+
+def get_series_metadata(driver, series_id):
+    """Získá metadata série z cache, z FRED API, pokud je k dispozici klíč, jinak pomocí Selenia"""
+    metadata = cache_get(series_id)
+    if metadata:
+        return metadata
+    
+    if use_api():
+        metadata = get_series_metadata_api(series_id)
+    else:
+        metadata = get_series_metadata_selenium(driver, series_id)
+    
+    cache_set(series_id, metadata)
+    return metadata
 
 def is_quarterly_or_more_frequent(frequency):
-    """Určí, zda je frekvence čtvrtletní nebo častější"""
+    """Určí, zda je frekvence čtvrtletní nebo častější (např. "Weekly, Ending Friday")"""
     if not frequency:
         return False
+    # Frekvence bez úvodního slova (" ", ", Ending Friday") není rozpoznaná
+    words = frequency.split(',')[0].split()
+    return bool(words) and words[0].lower() in HIGH_FREQ
+
+def keep_series(series_id, metadata):
+    """Určí, zda se má série uložit - vyřadí série s neznámou nebo nízkou frekvencí"""
+    frequency = metadata.get('frequency')
     
-    high_frequency = ['daily', 'weekly', 'biweekly', 'monthly', 'quarterly']
-    frequency_lower = frequency.lower() if frequency else ''
+    if not frequency:
+        logger.info(f"Série {series_id} přeskočena - frekvenci se nepodařilo zjistit")
+        return False
     
-    for freq in high_frequency:
-        if freq in frequency_lower:
-            return True
+    if not is_quarterly_or_more_frequent(frequency):
+        logger.info(f"Série {series_id} přeskočena - frekvence {frequency} není dostatečně častá")
+        return False
     
-    return False
+    return True
 
 def process_single_series(driver, series_id, save_to_csv=False):
     """Zpracuje jednu sérii a volitelně uloží výsledek do CSV"""
     try:
         # Získat metadata
-        metadata = get_series_metadata_selenium(driver, series_id)
+        metadata = get_series_metadata(driver, series_id)
         
         if not metadata:
             logger.error(f"Nepodařilo se získat metadata pro {series_id}")
             return None
         
-        # Kontrola frekvence, jen pokud potřebujeme
-        if metadata.get('frequency') and not is_quarterly_or_more_frequent(metadata['frequency']):
-            logger.info(f"Série {series_id} přeskočena - frekvence {metadata['frequency']} není dostatečně častá")
+        # Kontrola frekvence
+        if not keep_series(series_id, metadata):
             return None
         
         # Uložit do CSV, pokud je požadováno
         if save_to_csv:
             csv_path = os.path.join(CONFIG["output_dir"], f"{series_id}_metadata.csv")
             with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.DictWriter(f, fieldnames=metadata.keys())
+                writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction='ignore')
                 writer.writeheader()
                 writer.writerow(metadata)
             logger.info(f"Metadata pro {series_id} uložena do {csv_path}")
@@ -363,121 +615,237 @@ def process_single_series(driver, series_id, save_to_csv=False):
         logger.error(f"Chyba při zpracování série {series_id}: {str(e)}")
         return None
 
-def worker_function(worker_id, series_list):
-    """Pracovní funkce pro zpracování seznamu sérií v jednom vlákně"""
+def _init_worker(config, cookies):
+    """Inicializace pracovního procesu - vlastní konfigurace, HTTP session a driver"""
+    global POOL, SESSION, COOKIES, SCRAPE_LIMITER
+    
+    # Při spawn startu se modul načte znovu, proto převzít konfiguraci z hlavního procesu
+    CONFIG.update(config)
+    COOKIES = cookies
+    SESSION = create_session()
+    
+    if not use_api():
+        # Povolená rychlost se rovnoměrně dělí mezi pracovní procesy
+        SCRAPE_LIMITER = RateLimiter(CONFIG["scrape_rate_limit"] / CONFIG["max_workers"])
+        POOL = DriverPool(1)
+        # Ukončit prohlížeč při zániku procesu (atexit se v workerech nespouští)
+        multiprocessing.util.Finalize(None, POOL.close, exitpriority=10)
+
+def process_one(series_id):
+    """Zpracuje jednu sérii v pracovním procesu s driverem vypůjčeným z poolu"""
     driver = None
-    results = []
     
     try:
-        # Vytvořit driver pro toto vlákno
-        driver = create_driver()
+        # Vypůjčit driver z poolu (s API klíčem není potřeba)
+        if POOL:
+            driver = POOL.get()
         
-        # Nejprve navštívit hlavní stránku pro získání cookies
-        driver.get("https://fred.stlouisfed.org/")
-        time.sleep(2)
+        metadata = get_series_metadata(driver, series_id)
         
-        # Zpracovat seznam sérií
-        for i, series_info in enumerate(series_list):
-            series_id = series_info if isinstance(series_info, str) else series_info.get('series_id')
-            
-            if not series_id:
-                logger.warning(f"Worker {worker_id}: Přeskakuji sérii bez ID: {series_info}")
-                continue
-            
-            try:
-                # Zpracovat sérii
-                metadata = get_series_metadata_selenium(driver, series_id)
-                
-                if metadata:
-                    results.append(metadata)
-                    logger.info(f"Worker {worker_id}: Úspěšně zpracována série {series_id}")
-                
-                # Zobrazit průběh
-                if (i + 1) % 10 == 0:
-                    logger.info(f"Worker {worker_id}: Zpracováno {i+1}/{len(series_list)} sérií")
-                
-                # Náhodné zpoždění mezi požadavky
-                random_delay()
-                
-            except Exception as e:
-                logger.error(f"Worker {worker_id}: Chyba při zpracování série {series_id}: {str(e)}")
-                
-                # Zkusit se zotavit
-                try:
-                    driver.get("https://fred.stlouisfed.org/")
-                    time.sleep(3)
-                except:
-                    pass
+        if not metadata or not keep_series(series_id, metadata):
+            return None
         
-        logger.info(f"Worker {worker_id}: Dokončeno, zpracováno {len(results)}/{len(series_list)} sérií")
-        return results
+        # Do hlavního procesu posílat jen n-tici hodnot, ne celý slovník
+        return as_row(metadata)
     
     except Exception as e:
-        logger.error(f"Worker {worker_id}: Kritická chyba: {str(e)}")
-        return results
+        logger.error(f"Chyba při zpracování série {series_id}: {str(e)}")
+        
+        # Zkusit se zotavit
+        if driver:
+            try:
+                driver.get("https://fred.stlouisfed.org/")
+                time.sleep(3)
+            except:
+                pass
+        return None
     
     finally:
         if driver:
-            driver.quit()
+            POOL.put(driver)
 
-def process_csv_file(input_file, output_file, max_series=None, skip=0):
-    """Zpracuje seznam sérií z CSV souboru a uloží výsledky do výstupního CSV"""
-    try:
-        # Načíst CSV se sériemi
-        df = pd.read_csv(input_file)
-        logger.info(f"Načteno {len(df)} sérií z {input_file}")
-        
-        # Aplikovat limity
-        if skip > 0:
-            df = df.iloc[skip:]
-            logger.info(f"Přeskočeno prvních {skip} sérií")
+def as_row(metadata):
+    """Převede slovník metadat na n-tici hodnot v pořadí sloupců FIELDS"""
+    if not metadata:
+        return None
+    return tuple(metadata.get(field) for field in FIELDS)
+
+def _write_result(writer, fh, series_id, row):
+    """Zapíše řádek jedné série do výstupního CSV, vrací True při zápisu"""
+    if not row:
+        return False
+    
+    writer.writerow(row)
+    fh.flush()
+    logger.info(f"Úspěšně zpracována série {series_id}")
+    return True
+
+def process_series_selenium(series_ids, writer, fh):
+    """Zpracuje série v paralelních procesech s prohlížečem, vrací počet uložených"""
+    num_workers = min(CONFIG["max_workers"], len(series_ids))
+    logger.info(f"Zpracovávám {len(series_ids)} sérií s {num_workers} pracovními procesy")
+    saved_count = 0
+    
+    # Cookies získat jen jednou a předat všem procesům
+    cookies = collect_cookies()
+    
+    # Každý proces má vlastní driver vytvořený jen jednou pro celou dávku;
+    # pád prohlížeče tak shodí jen jeden proces, ne celý běh.
+    # Fronta executoru rozděluje série mezi procesy průběžně
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker,
+                             initargs=(dict(CONFIG, max_workers=num_workers), cookies)) as executor:
+        futures = {executor.submit(process_one, series_id): series_id for series_id in series_ids}
+        
+        for i, future in enumerate(as_completed(futures), 1):
+            series_id = futures[future]
+            try:
+                row = future.result()
+            except Exception as e:
+                logger.error(f"Chyba při zpracování série {series_id}: {str(e)}")
+                continue
+            
+            if _write_result(writer, fh, series_id, row):
+                saved_count += 1
+            
+            # Zobrazit průběh
+            if i % 10 == 0:
+                logger.info(f"Zpracováno {i}/{len(series_ids)} sérií")
+    
+    return saved_count
+
+async def process_series_api(series_ids, writer, fh):
+    """Zpracuje série souběžnými požadavky na FRED API v jednom procesu, vrací počet uložených"""
+    logger.info(f"Zpracovávám {len(series_ids)} sérií přes FRED API "
+                f"(max. {CONFIG['api_concurrency']} souběžných požadavků)")
+    saved_count = 0
+    semaphore = asyncio.Semaphore(CONFIG["api_concurrency"])
+    
+    # Série s čerstvými metadaty v cache zapsat hned, stahovat jen zbytek
+    to_fetch = []
+    for series_id in series_ids:
+        metadata = cache_get(series_id)
+        if metadata:
+            if keep_series(series_id, metadata) and _write_result(writer, fh, series_id, as_row(metadata)):
+                saved_count += 1
+        else:
+            to_fetch.append(series_id)
+    
+    if saved_count:
+        logger.info(f"{saved_count} sérií načteno z cache, stahuji {len(to_fetch)}")
+    
+    async with _api_session(CONFIG["api_concurrency"]) as session:
+        tasks = [get_series_metadata_api_async(session, series_id, semaphore) for series_id in to_fetch]
         
-        if max_series and max_series > 0:
-            df = df.iloc[:max_series]
-            logger.info(f"Omezeno na {max_series} sérií")
+        for i, task in enumerate(asyncio.as_completed(tasks), 1):
+            series_id, metadata = await task
+            cache_set(series_id, metadata)
+            
+            if metadata and keep_series(series_id, metadata) and _write_result(writer, fh, series_id, as_row(metadata)):
+                saved_count += 1
+            
+            # Zobrazit průběh
+            if i % 10 == 0:
+                logger.info(f"Zpracováno {i}/{len(to_fetch)} sérií")
+    
+    return saved_count
+
+async def _prefilter_async(series_ids):
+    """Vrátí z FRED API zkratky frekvencí pro zadané série"""
+    semaphore = asyncio.Semaphore(CONFIG["api_concurrency"])
+    
+    async with _api_session(CONFIG["api_concurrency"]) as session:
+        payloads = await asyncio.gather(
+            *(_fetch_series_api_async(session, series_id, semaphore) for series_id in series_ids))
+    
+    frequencies = {}
+    for series_id, payload in zip(series_ids, payloads):
+        seriess = (payload or {}).get("seriess") or []
+        frequencies[series_id] = seriess[0].get("frequency_short") if seriess else None
+    return frequencies
+
+def prefilter(series_ids):
+    """Ponechá jen série s čtvrtletní nebo častější frekvencí podle FRED API (bez klíče vrací vše)"""
+    if not CONFIG["api_key"]:
+        logger.info("Bez API klíče nelze série předfiltrovat podle frekvence")
+        return series_ids
+    
+    try:
+        frequencies = asyncio.run(_prefilter_async(series_ids))
+    except Exception as e:
+        logger.error(f"Chyba při předfiltrování sérií: {str(e)}")
+        return series_ids
+    
+    # Série, u kterých API frekvenci nevrátilo, raději ponechat pro úplné stažení
+    filtered = [series_id for series_id in series_ids
+                if frequencies.get(series_id) is None or frequencies[series_id] in HIGH_FREQ_SHORT]
+    
+    logger.info(f"Předfiltrování podle frekvence: ponecháno {len(filtered)} z {len(series_ids)} sérií")
+    return filtered
+
+def load_series_ids(input_file, max_series=None, skip=0):
+    """Načte ID sérií ze vstupního CSV po řádcích, vrací None při chybném formátu"""
+    with open(input_file, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        columns = reader.fieldnames or []
         
         # Kontrola správného formátu CSV
-        if 'series_id' not in df.columns:
+        id_column = 'series_id'
+        if id_column not in columns:
             # Pokusit se najít sloupec s ID
-            potential_id_columns = [col for col in df.columns if 'id' in col.lower()]
-            if potential_id_columns:
-                logger.warning(f"Sloupec 'series_id' nenalezen, používám {potential_id_columns[0]}")
-                df = df.rename(columns={potential_id_columns[0]: 'series_id'})
-            else:
+            potential_id_columns = [col for col in columns if 'id' in col.lower()]
+            if not potential_id_columns:
                 logger.error(f"Ve vstupním CSV chybí sloupec 'series_id'")
-                return False
-        
-        # Rozdělit série mezi workery
-        series_list = df.to_dict('records')
-        num_workers = min(CONFIG["max_workers"], len(series_list))
-        series_per_worker = (len(series_list) + num_workers - 1) // num_workers
-        worker_series = []
-        
-        for i in range(0, len(series_list), series_per_worker):
-            worker_series.append(series_list[i:i+series_per_worker])
+                return None
+            id_column = potential_id_columns[0]
+            logger.warning(f"Sloupec 'series_id' nenalezen, používám {id_column}")
+        
+        # Aplikovat limity už při čtení, zbytek souboru se nenačítá
+        stop = skip + max_series if max_series and max_series > 0 else None
+        series_ids = []
+        missing = 0
+        
+        for row in islice(reader, skip, stop):
+            series_id = (row.get(id_column) or '').strip()
+            if series_id:
+                series_ids.append(series_id)
+            else:
+                missing += 1
+    
+    if skip > 0:
+        logger.info(f"Přeskočeno prvních {skip} sérií")
+    if stop is not None:
+        logger.info(f"Omezeno na {max_series} sérií")
+    if missing:
+        logger.warning(f"Přeskakuji {missing} sérií bez ID")
+    
+    logger.info(f"Načteno {len(series_ids)} sérií z {input_file}")
+    return series_ids
+
+def process_csv_file(input_file, output_file, max_series=None, skip=0):
+    """Zpracuje seznam sérií z CSV souboru a uloží výsledky do výstupního CSV"""
+    try:
+        series_ids = load_series_ids(input_file, max_series, skip)
+        if series_ids is None:
+            return False
         
-        logger.info(f"Rozděleno {len(series_list)} sérií mezi {num_workers} workerů")
+        if not series_ids:
+            logger.error("Žádné série ke zpracování")
+            return False
         
-        # Zpracovat série v paralelních vláknech
-        all_results = []
-        threads = []
+        # Hotové výsledky se rovnou zapisují do výstupního CSV jako n-tice v pořadí FIELDS
+        with open(output_file, 'w', newline='', encoding='utf-8') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(FIELDS)
+            
+            if use_api():
+                saved_count = asyncio.run(process_series_api(series_ids, writer, fh))
+            else:
+                # Před drahým stahováním stránek vyřadit série s nízkou frekvencí
+                series_ids = prefilter(series_ids)
+                saved_count = process_series_selenium(series_ids, writer, fh) if series_ids else 0
         
-        for i, series_batch in enumerate(worker_series):
-            thread = threading.Thread(
-                target=lambda i=i, batch=series_batch: all_results.extend(worker_function(i, batch))
-            )
-            threads.append(thread)
-            thread.start()
-        
-        # Čekat na dokončení všech vláken
-        for thread in threads:
-            thread.join()
-        
-        # Uložit výsledky do výstupního CSV
-        if all_results:
-            results_df = pd.DataFrame(all_results)
-            results_df.to_csv(output_file, index=False)
-            logger.info(f"Uloženo {len(results_df)} metadat do {output_file}")
+        if saved_count:
+            logger.info(f"Uloženo {saved_count} metadat do {output_file}")
             return True
         else:
             logger.error("Žádné výsledky nebyly získány")
@@ -498,8 +866,12 @@ def main():
     parser.add_argument('--limit', type=int, help='Maximální počet sérií ke zpracování')
     parser.add_argument('--skip', type=int, default=0, help='Přeskočit prvních N sérií')
     parser.add_argument('--headless', action='store_true', help='Použít headless mód prohlížeče')
-    parser.add_argument('--delay', type=float, help='Základní zpoždění mezi požadavky (sekundy)')
+    parser.add_argument('--delay', type=float, help='Minimální odstup mezi načtením stránek všech workerů dohromady (sekundy)')
     parser.add_argument('--debug', action='store_true', help='Zapnout debug mód')
+    parser.add_argument('--api-key', type=str, help='Klíč k FRED API (jinak se použije proměnná FRED_API_KEY nebo Selenium)')
+    parser.add_argument('--selenium', action='store_true', help='Stahovat stránky prohlížečem i s API klíčem (API jen předfiltruje série)')
+    parser.add_argument('--no-cache', action='store_true', help='Nepoužívat cache metadat na disku')
+    parser.add_argument('--refresh-older-than', type=float, help='Znovu stáhnout série, jejichž metadata v cache jsou starší než N hodin')
     
     args = parser.parse_args()
     
@@ -511,8 +883,19 @@ def main():
         CONFIG["headless"] = True
     
     if args.delay:
-        CONFIG["min_delay"] = args.delay
-        CONFIG["max_delay"] = args.delay * 2
+        CONFIG["scrape_rate_limit"] = 1.0 / args.delay
+    
+    if args.api_key:
+        CONFIG["api_key"] = args.api_key
+    
+    if args.selenium:
+        CONFIG["use_selenium"] = True
+    
+    if args.no_cache:
+        CONFIG["use_cache"] = False
+    
+    if args.refresh_older_than is not None:
+        CONFIG["cache_ttl"] = args.refresh_older_than * 3600
     
     if args.debug:
         CONFIG["debug"] = True
@@ -523,16 +906,24 @@ def main():
     # Vytvořit výstupní adresář
     os.makedirs(CONFIG["output_dir"], exist_ok=True)
     
+    try:
+        return run(args, parser)
+    finally:
+        if POOL:
+            POOL.close()
+
+def run(args, parser):
+    """Spustí zpracování podle argumentů příkazové řádky"""
+    global POOL
+    
     # Zpracování jedné série
     if args.series:
         driver = None
         try:
             logger.info(f"Zpracovávám jednu sérii: {args.series}")
-            driver = create_driver()
-            
-            # Nejprve navštívit hlavní stránku pro získání cookies
-            driver.get("https://fred.stlouisfed.org/")
-            time.sleep(2)
+            if not use_api():
+                POOL = DriverPool(1)
+                driver = POOL.get()
             
             # Zpracovat sérii
             output_file = args.output or os.path.join(CONFIG["output_dir"], f"{args.series}_metadata.csv")
@@ -551,7 +942,7 @@ def main():
         
         finally:
             if driver:
-                driver.quit()
+                POOL.put(driver)
     
     # Zpracování CSV souboru
     elif args.input:
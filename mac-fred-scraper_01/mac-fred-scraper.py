@@ -4,34 +4,129 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
+import asyncio
+import aiohttp
+from lxml import etree, html as lxml_html
+from tenacity import AsyncRetrying, Retrying, stop_after_attempt, wait_random_exponential
 import time
 import random
+import threading
+from contextlib import contextmanager
+from queue import Queue
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import atexit
 import os
-import pandas as pd
+import csv
+import sqlite3
 import argparse
 
-# Nastavení logování
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("fred_mac_scraper.log"),
-        logging.StreamHandler()
-    ]
-)
+# Rychlejší parsování JSON odpovědí FRED API (volitelná závislost)
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    import json
+    json_loads = json.loads
+
+# Nastavení logování - zápis do souboru a na konzoli běží ve vlastním vlákně,
+# workery jen vloží záznam do fronty a neblokují se na I/O
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_handlers = [
+    logging.FileHandler("fred_mac_scraper.log"),
+    logging.StreamHandler()
+]
+for log_handler in log_handlers:
+    log_handler.setFormatter(log_formatter)
+log_queue = Queue()
+log_listener = QueueListener(log_queue, *log_handlers)
+log_listener.start()
+atexit.register(log_listener.stop)
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(log_queue)])
 logger = logging.getLogger(__name__)
 
-# Globální sety pro sledování zpracovaných URL
-processed_categories = set()
-processed_series = set()
-all_series_list = []
+# Sloupce výstupního CSV se sériemi
+SERIES_FIELDS = ['series_id', 'name', 'url', 'source_category']
+
+# Stav crawlingu na disku (hotové kategorie a fronta) pro navázání po přerušení
+STATE_DB = 'crawl_state.db'
+STATE_COMMIT_EVERY = 100  # Počet zápisů do stavu, po kterém se provede commit
+
+# Realistický user agent (sdílený prohlížečem i HTTP klientem)
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15"
+
+# Stránky kategorií jsou statické HTML - stačí je stáhnout přímo bez prohlížeče
+HTTP_CONCURRENCY = 8     # Maximální počet souběžných HTTP požadavků
+HTTP_TIMEOUT = 30        # Timeout pro načtení celé stránky (sekundy)
+HTTP_CONNECT_TIMEOUT = 10  # Timeout pro navázání spojení (sekundy)
+HTTP_READ_TIMEOUT = 20   # Timeout mezi přijatými daty (sekundy)
+LINKS_WAIT_TIMEOUT = 10  # Jak dlouho v prohlížeči čekat na odkazy na stránce (sekundy)
+HTTP_KEEPALIVE = 60      # Jak dlouho držet nevyužité spojení otevřené (sekundy)
+
+# Zdroje, které crawler nepotřebuje - prohlížeč je vůbec nestahuje
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.css",
+    "*google-analytics*", "*googletagmanager*", "*doubleclick*",
+]
+
+# Spouštět prohlížeč bez okna (nastavuje se přepínačem --headless)
+HEADLESS = False
+
+# Přepínače Chrome snižující paměť jedné instance (--single-process je nestabilní, nepoužívá se)
+CHROME_LEAN_FLAGS = [
+    "--no-sandbox", "--disable-dev-shm-usage",
+    "--disable-gpu", "--disable-software-rasterizer",
+    "--disable-background-networking", "--disable-sync", "--mute-audio",
+]
+
+# FRED API - strom kategorií jako JSON bez parsování HTML a stránkování
+FRED_API_URL = "https://api.stlouisfed.org/fred/"
+API_PAGE_LIMIT = 1000    # Maximální počet sérií na jednu odpověď API
+API_RATE_LIMIT = 2.0     # Max. počet požadavků za sekundu (limit API je 120/min)
+
+# Předpony absolutních odkazů na série a kategorie
+SERIES_PREFIX = "https://fred.stlouisfed.org/series/"
+CATEGORIES_PREFIX = "https://fred.stlouisfed.org/categories/"
+
+# XPath dotazy na odkazy, společné pro prohlížeč i lxml
+SERIES_XPATH = '//a[contains(@href, "/series/")]'
+CATEGORY_XPATH = '//a[contains(@href, "/categories/")]'
+NEXT_XPATH = "//ul[contains(@class, 'pagination')]//a[text()='Next']"
+
+# Jeden parser pro všechny stránky (asyncio běží v jednom vlákně), ID prvků crawler nepotřebuje
+HTML_PARSER = lxml_html.HTMLParser(collect_ids=False)
+
+# Tytéž dotazy předkompilované pro lxml (libxml2 je vyhodnotí jedním průchodem stromem)
+COMPILED_XPATHS = {xpath: etree.XPath(xpath) for xpath in (SERIES_XPATH, CATEGORY_XPATH, NEXT_XPATH)}
 
 def random_delay(min_delay=2, max_delay=5):
     """Náhodné zpoždění pro simulaci lidského chování"""
     delay = min_delay + random.random() * (max_delay - min_delay)
     time.sleep(delay)
 
+class AsyncRateLimiter:
+    """Rozestupy mezi požadavky pro asyncio - čeká, jen pokud by byl překročen povolený počet za sekundu"""
+    
+    def __init__(self, rps):
+        self.interval = 1.0 / rps
+        self.next = 0
+    
+    async def wait(self):
+        """Počká na povolení k dalšímu požadavku"""
+        now = time.monotonic()
+        delay = max(0, self.next - now)
+        self.next = max(now, self.next) + self.interval
+        await asyncio.sleep(delay)
+
+async def async_random_delay(min_delay=2, max_delay=5):
+    """Náhodné zpoždění bez blokování smyčky událostí"""
+    await asyncio.sleep(min_delay + random.random() * (max_delay - min_delay))
+
+def is_access_denied(text):
+    """Zjistí, zda stránka hlásí zablokovaný přístup"""
+    return "Access Denied" in text or "You don't have permission to access" in text
+
 def create_driver(proxy=None):
     """Vytvoří WebDriver s vlastnostmi pro obcházení detekce"""
     options = webdriver.ChromeOptions()
@@ -43,256 +138,725 @@ def create_driver(proxy=None):
     options.add_argument("--disable-infobars")
     
     # Realistický user agent
-    options.add_argument("--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15")
+    options.add_argument(f"--user-agent={USER_AGENT}")
     
     # Přidat proxy, pokud je specifikována
     if proxy:
         logger.info(f"Používám proxy: {proxy}")
         options.add_argument(f'--proxy-server={proxy}')
     
+    if HEADLESS:
+        options.add_argument("--headless=new")
+    
+    # Úspornější prohlížeč - bez GPU, synchronizace a služeb na pozadí, aby se vešlo více workerů
+    for flag in CHROME_LEAN_FLAGS:
+        options.add_argument(flag)
+    
+    # Nestahovat obrázky a neukazovat notifikace - crawler čte jen odkazy
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.default_content_setting_values.notifications": 2,
+    })
+    
+    # Nečekat na dočtení všech zdrojů, stačí rozparsované HTML
+    options.page_load_strategy = "eager"
+    
     # Vytvořit driver
     driver = webdriver.Chrome(options=options)
     driver.set_page_load_timeout(30)
     
+    # Blokovat styly, fonty a analytiku přes DevTools protokol
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    
     # Obejití detekce
     driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
     
     return driver
 
+class AccessDeniedError(Exception):
+    """FRED odmítl přístup ke stránce (Access Denied nebo neúspěšný HTTP status)"""
+
+def describe_error(e):
+    """Popis chyby pro log bez textu výjimky - text HTTP chyb obsahuje celé URL včetně api_key"""
+    status = getattr(e, 'status', None)
+    return f"{type(e).__name__} (HTTP {status})" if status else type(e).__name__
+
+def retry_policy(url, max_retries, retrying=Retrying):
+    """Opakování načtení stránky s exponenciálně rostoucím náhodným čekáním"""
+    def log_retry(retry_state):
+        logger.warning("Pokus %d/%d pro %s selhal: %s, čekám %.2fs...", retry_state.attempt_number, max_retries,
+                       url, describe_error(retry_state.outcome.exception()), retry_state.next_action.sleep)
+    
+    return retrying(stop=stop_after_attempt(max_retries),
+                    wait=wait_random_exponential(multiplier=2, max=60),
+                    before_sleep=log_retry,
+                    reraise=True)
+
+# Vrátí prvních 500 znaků viditelného textu stránky
+BODY_PREVIEW_SCRIPT = "return document.body && document.body.innerText ? document.body.innerText.substr(0, 500) : '';"
+
+def load_url(driver, url):
+    """Načte URL v prohlížeči, při zablokování vyvolá AccessDeniedError"""
+    random_delay()
+    driver.get(url)
+    
+    # Počkat na odkazy, které crawler čte (stránka je načtena jen "eager")
+    try:
+        WebDriverWait(driver, LINKS_WAIT_TIMEOUT).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, 'a[href*="/series/"], a[href*="/categories/"]'))
+        )
+    except TimeoutException:
+        logger.warning("Na stránce %s se neobjevily odkazy na kategorie ani série", url)
+    
+    # Zkontrolovat Access Denied - stačí začátek textu stránky, ne celý serializovaný DOM
+    if is_access_denied(driver.execute_script(BODY_PREVIEW_SCRIPT) or ''):
+        # Zkusit vrátit se na úvodní stránku před dalším pokusem
+        try:
+            driver.get("https://fred.stlouisfed.org/")
+        except Exception:
+            pass
+        raise AccessDeniedError(f"Access Denied pro {url}")
+
 def safe_get_url(driver, url, max_retries=3):
     """Bezpečně načte URL s ošetřením chyb a detekcí 'Access Denied'"""
-    for attempt in range(max_retries):
+    try:
+        for attempt in retry_policy(url, max_retries):
+            with attempt:
+                load_url(driver, url)
+        return True
+    
+    except AccessDeniedError:
+        logger.error("Nepodařilo se obejít Access Denied po %d pokusech", max_retries)
+        return False
+    except Exception as e:
+        logger.error("Nepodařilo se načíst %s po %d pokusech: %s", url, max_retries, e)
+        return False
+
+class DriverPool:
+    """Pool předem spuštěných prohlížečů, které si workeři půjčují a vracejí"""
+    
+    def __init__(self, size, proxy=None, warm=True):
+        self.proxy = proxy
+        self.warm = warm
+        self._queue = Queue()
+        for _ in range(size):
+            self._queue.put(self._new_driver())
+        logger.info(f"Vytvořen pool s {size} instancemi prohlížeče")
+    
+    def _new_driver(self):
+        """Spustí prohlížeč a (pokud je warm) načte hlavní stránku pro cookies"""
+        driver = create_driver(self.proxy)
+        if self.warm:
+            logger.info("Navštěvuji hlavní stránku FRED...")
+            if not safe_get_url(driver, "https://fred.stlouisfed.org/"):
+                logger.error("Nelze přistoupit k hlavní stránce FRED! Zkontrolujte proxy nebo síťové připojení.")
+        return driver
+    
+    @contextmanager
+    def acquire(self):
+        """Vypůjčí prohlížeč z poolu a po skončení bloku ho vrátí"""
+        driver = self._queue.get()
         try:
-            random_delay()
-            driver.get(url)
-            
-            # Zkontrolovat Access Denied
-            if "Access Denied" in driver.page_source or "You don't have permission to access" in driver.page_source:
-                logger.warning(f"Access Denied detekován při pokusu {attempt+1} pro {url}")
-                
-                if attempt < max_retries - 1:
-                    wait_time = 10 + random.random() * 5
-                    logger.info(f"Čekám {wait_time:.2f}s před dalším pokusem...")
-                    time.sleep(wait_time)
-                    
-                    # Zkusit vrátit se na úvodní stránku
-                    try:
-                        driver.get("https://fred.stlouisfed.org/")
-                        time.sleep(3)
-                    except:
-                        pass
-                else:
-                    logger.error(f"Nepodařilo se obejít Access Denied po {max_retries} pokusech")
-                    return False
-            else:
-                # Úspěšně načteno
-                return True
-                
-        except TimeoutException:
-            logger.warning(f"Timeout při načítání {url}, pokus {attempt+1}/{max_retries}")
-            if attempt < max_retries - 1:
-                time.sleep(5)
-            else:
-                logger.error(f"Nepodařilo se načíst {url} po {max_retries} pokusech")
-                return False
-        except Exception as e:
-            logger.error(f"Chyba při načítání {url}: {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(5)
-            else:
-                return False
+            yield driver
+        finally:
+            self._queue.put(driver)
+    
+    def close(self):
+        """Ukončí všechny prohlížeče v poolu"""
+        while not self._queue.empty():
+            driver = self._queue.get_nowait()
+            try:
+                driver.quit()
+            except Exception:
+                pass
     
-    return False
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+def create_http_session(concurrency=HTTP_CONCURRENCY):
+    """Vytvoří sdílenou HTTP session pro stahování stránek kategorií"""
+    # Spojení (TCP + TLS) se po požadavku nezavírá a další stránky ho znovu použijí
+    connector = aiohttp.TCPConnector(limit=64, limit_per_host=concurrency,
+                                     keepalive_timeout=HTTP_KEEPALIVE, ttl_dns_cache=600)
+    return aiohttp.ClientSession(connector=connector,
+                                 headers={"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"})
 
-def extract_series(driver, category_url):
-    """Extrahuje série z aktuální kategorie"""
-    series_list = []
+async def fetch_page(session, semaphore, url, proxy=None, max_retries=3):
+    """Stáhne stránku přes HTTP a vrátí HTML strom s absolutními odkazy, nebo None"""
     try:
-        series_links = driver.find_elements(By.CSS_SELECTOR, 'a[href*="/series/"]')
-        
-        for link in series_links:
-            try:
-                href = link.get_attribute('href')
-                if href and '/series/' in href:
-                    series_id = href.split('/')[-1]
-                    
-                    if href not in processed_series:
-                        processed_series.add(href)
-                        series_list.append({
-                            'series_id': series_id,
-                            'name': link.text.strip(),
-                            'url': href,
-                            'source_category': category_url
-                        })
-            except Exception as e:
-                logger.error(f"Chyba při extrakci série: {str(e)}")
-        
-        logger.info(f"Nalezeno {len(series_list)} sérií v kategorii {category_url}")
-        return series_list
+        async for attempt in retry_policy(url, max_retries, AsyncRetrying):
+            with attempt:
+                async with semaphore:
+                    await async_random_delay()
+                    async with session.get(url, proxy=f"http://{proxy}" if proxy else None,
+                                           timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT,
+                                                                         sock_connect=HTTP_CONNECT_TIMEOUT,
+                                                                         sock_read=HTTP_READ_TIMEOUT)) as response:
+                        status = response.status
+                        body = await response.text()
+                
+                # Neexistující stránku nemá smysl zkoušet znovu
+                if status == 404:
+                    logger.warning("Stránka %s neexistuje (HTTP 404)", url)
+                    return None
+                
+                # Zkontrolovat Access Denied
+                if status != 200 or is_access_denied(body):
+                    raise AccessDeniedError(f"Access Denied (HTTP {status}) pro {url}")
         
+        tree = lxml_html.fromstring(body, parser=HTML_PARSER)
+        tree.make_links_absolute(url)
+        return tree
+    
+    except AccessDeniedError:
+        logger.error("Nepodařilo se obejít Access Denied po %d pokusech", max_retries)
+        return None
     except Exception as e:
-        logger.error(f"Chyba při extrakci sérií z {category_url}: {str(e)}")
-        return []
+        logger.error("Nepodařilo se načíst %s po %d pokusech: %s", url, max_retries, e)
+        return None
+
+# Vrátí dvojice [href, text] odkazů pro každý zadaný XPath dotaz najednou
+LINKS_SCRIPT = """
+return Array.from(arguments, function (xpath) {
+    var result = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var links = [];
+    for (var i = 0; i < result.snapshotLength; i++) {
+        var a = result.snapshotItem(i);
+        links.push([a.href, a.innerText || '']);
+    }
+    return links;
+});
+"""
 
-def extract_subcategories(driver, parent_url):
-    """Extrahuje podkategorie z aktuální stránky"""
-    subcategories = []
+def driver_links(driver, *xpaths):
+    """Vrátí seznamy dvojic (href, text) odkazů pro každý XPath jedním voláním prohlížeče"""
     try:
-        category_links = driver.find_elements(By.CSS_SELECTOR, 'a[href*="/categories/"]')
-        
-        for link in category_links:
-            try:
-                href = link.get_attribute('href')
-                if href and '/categories/' in href and href != 'https://fred.stlouisfed.org/categories/':
-                    if href not in processed_categories and href != parent_url:
-                        category_id = href.split('/')[-1]
-                        category_name = link.text.strip()
-                        
-                        subcategories.append({
-                            'id': category_id,
-                            'name': category_name,
-                            'url': href
-                        })
-            except Exception as e:
-                logger.error(f"Chyba při extrakci podkategorie: {str(e)}")
-        
-        logger.info(f"Nalezeno {len(subcategories)} podkategorií v {parent_url}")
-        return subcategories
-        
+        return driver.execute_script(LINKS_SCRIPT, *xpaths)
     except Exception as e:
-        logger.error(f"Chyba při extrakci podkategorií z {parent_url}: {str(e)}")
-        return []
+        logger.error("Chyba při čtení odkazů: %s", e)
+        return [[] for _ in xpaths]
 
-def check_pagination(driver, current_url):
-    """Kontroluje a vrací odkaz na další stránku, pokud existuje"""
+def tree_links(tree, xpath):
+    """Vrátí dvojice (href, text) odkazů v HTML stromu"""
+    return [(link.get('href'), link.text_content()) for link in COMPILED_XPATHS[xpath](tree)]
+
+async def fetch_api(session, limiter, method, params, max_retries=3):
+    """Zavolá metodu FRED API a vrátí rozparsovanou JSON odpověď, nebo None"""
+    url = FRED_API_URL + method
+    # Do logu nepatří API klíč z parametrů
+    label = f"{method} (kategorie {params.get('category_id')})"
     try:
-        next_links = driver.find_elements(By.XPATH, "//ul[contains(@class, 'pagination')]//a[text()='Next']")
-        for link in next_links:
-            next_url = link.get_attribute('href')
-            if next_url and next_url != current_url and next_url not in processed_categories:
-                return next_url
-        return None
+        async for attempt in retry_policy(label, max_retries, AsyncRetrying):
+            with attempt:
+                await limiter.wait()
+                async with session.get(url, params=params,
+                                       timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT)) as response:
+                    # Chybný dotaz (např. neexistující kategorie) nemá smysl opakovat
+                    if response.status == 400:
+                        logger.warning("FRED API odmítlo dotaz %s: %s", label, await response.text())
+                        return None
+                    response.raise_for_status()
+                    return json_loads(await response.read())
+    
     except Exception as e:
-        logger.error(f"Chyba při kontrole paginace: {str(e)}")
+        logger.error("Chyba při volání FRED API %s: %s", label, describe_error(e))
         return None
 
-def save_results(filename='fred_series.csv'):
-    """Uloží výsledky do CSV souboru"""
-    # Deduplikace
-    unique_series = []
-    seen_ids = set()
-    
-    for series in all_series_list:
-        if series['series_id'] not in seen_ids:
-            seen_ids.add(series['series_id'])
-            unique_series.append(series)
-    
-    # Uložit do CSV
-    df = pd.DataFrame(unique_series)
-    df.to_csv(filename, index=False)
-    logger.info(f"Uloženo {len(unique_series)} unikátních sérií do {filename}")
-    return filename
-
-def crawl_recursive(proxy=None, start_url='https://fred.stlouisfed.org/categories/'):
-    """Rekurzivní procházení FRED kategorií"""
-    driver = None
-    try:
-        driver = create_driver(proxy)
-        categories_to_process = [{'url': start_url, 'name': 'Root Category'}]
+class Crawler:
+    """Stav jednoho crawlingu - zpracované kategorie, nalezené série, výstupní CSV a stav na disku"""
+    
+    def __init__(self, output_format='csv', state_db=STATE_DB):
+        # Formát finálního výstupu - 'csv', nebo 'parquet' (navíc k průběžnému CSV)
+        self.output_format = output_format
+        self.state_db = state_db
         
-        # Nejprve načíst hlavní stránku pro cookies
-        logger.info("Navštěvuji hlavní stránku FRED...")
-        if not safe_get_url(driver, "https://fred.stlouisfed.org/"):
-            logger.error("Nelze přistoupit k hlavní stránce FRED! Zkontrolujte proxy nebo síťové připojení.")
-            return False
+        # Zpracované URL kategorií
+        self.processed_categories = set()
+        # ID nalezených sérií - přesný set, žádná nová série se nesmí ztratit
+        self.processed_series = set()
+        self.all_series_list = []
         
-        categories_processed = 0
-        start_time = time.time()
+        # Všechny již vyhodnocené odkazy - navigace a patička se opakují na každé stránce,
+        # stačí je posoudit jen při prvním výskytu
+        self.seen_links = set()
         
-        # Rekurzivní zpracování kategorií
-        while categories_to_process:
-            # Vzít kategorii z fronty
-            category = categories_to_process.pop(0)
-            category_url = category['url']
-            category_name = category.get('name', 'Unknown')
-            
-            if category_url in processed_categories:
-                continue
+        # Výstupní CSV, do kterého se nalezené série zapisují průběžně
+        self.results_file = None
+        self.results_writer = None
+        
+        # Připojení ke stavu crawlingu na disku a počet zápisů od posledního commitu
+        self.state_conn = None
+        self.state_pending = 0
+    
+    def first_seen(self, href):
+        """Vrátí True při prvním výskytu odkazu a zaznamená ho, při dalších výskytech False"""
+        if not href or href in self.seen_links:
+            return False
+        self.seen_links.add(href)
+        return True
+    
+    def extract_series(self, links, category_url):
+        """Extrahuje série z odkazů aktuální kategorie"""
+        series_list = []
+        try:
+            for href, text in links:
+                if not self.first_seen(href):
+                    continue
+                try:
+                    if href.startswith(SERIES_PREFIX):
+                        series_id = href.rpartition('/')[2]
+                        
+                        if series_id not in self.processed_series:
+                            self.processed_series.add(series_id)
+                            series_list.append({
+                                'series_id': series_id,
+                                'name': text.strip(),
+                                'url': href,
+                                'source_category': category_url
+                            })
+                except Exception as e:
+                    logger.error("Chyba při extrakci série: %s", e)
             
-            logger.info(f"Zpracovávám kategorii: {category_name} ({category_url})")
+            logger.info("Nalezeno %d sérií v kategorii %s", len(series_list), category_url)
+            return series_list
+        
+        except Exception as e:
+            logger.error("Chyba při extrakci sérií z %s: %s", category_url, e)
+            return []
+    
+    def extract_subcategories(self, links, parent_url):
+        """Extrahuje podkategorie z odkazů aktuální stránky"""
+        subcategories = []
+        try:
+            for href, text in links:
+                if not self.first_seen(href):
+                    continue
+                try:
+                    if href.startswith(CATEGORIES_PREFIX) and href != CATEGORIES_PREFIX:
+                        if href not in self.processed_categories and href != parent_url:
+                            category_id = href.rpartition('/')[2]
+                            category_name = text.strip()
+                            
+                            subcategories.append({
+                                'id': category_id,
+                                'name': category_name,
+                                'url': href
+                            })
+                except Exception as e:
+                    logger.error("Chyba při extrakci podkategorie: %s", e)
             
-            # Načíst stránku kategorie
-            if not safe_get_url(driver, category_url):
-                logger.warning(f"Přeskakuji kategorii {category_name}, nelze načíst")
-                continue
+            logger.info("Nalezeno %d podkategorií v %s", len(subcategories), parent_url)
+            return subcategories
+        
+        except Exception as e:
+            logger.error("Chyba při extrakci podkategorií z %s: %s", parent_url, e)
+            return []
+    
+    def check_pagination(self, links, current_url):
+        """Kontroluje a vrací odkaz na další stránku, pokud existuje"""
+        try:
+            for next_url, _ in links:
+                if not self.first_seen(next_url):
+                    continue
+                if next_url != current_url and next_url not in self.processed_categories:
+                    return next_url
+            return None
+        except Exception as e:
+            logger.error("Chyba při kontrole paginace: %s", e)
+            return None
+    
+    def process_category(self, category, series_links, category_links, next_links):
+        """Zpracuje odkazy načtené stránky kategorie, vrací seznam dalších stránek ke zpracování"""
+        category_url = category['url']
+        category_name = category.get('name', 'Unknown')
+        new_categories = []
+        
+        # 1. Získat série v této kategorii
+        series_list = self.extract_series(series_links, category_url)
+        self.all_series_list.extend(series_list)
+        self.save_series(series_list)
+        
+        # 2. Zkontrolovat paginaci
+        next_page = self.check_pagination(next_links, category_url)
+        if next_page:
+            new_categories.append({
+                'url': next_page,
+                'name': f"{category_name} (další stránka)"
+            })
+        
+        # 3. Získat podkategorie
+        new_categories.extend(self.extract_subcategories(category_links, category_url))
+        
+        # Stav na disku pro případné navázání
+        self.remember_visited(category_url)
+        self.remember_frontier(new_categories)
+        return new_categories
+    
+    def report_progress(self, categories_processed, remaining, start_time):
+        """Každých 10 kategorií zobrazí průběžné statistiky"""
+        if categories_processed % 10 == 0:
+            elapsed = time.time() - start_time
+            logger.info("Postup: %d kategorií zpracováno, %d zbývá, %d sérií nalezeno, čas: %.2fs",
+                        categories_processed, remaining, len(self.all_series_list), elapsed)
+    
+    def finish_crawl(self, csv_file, categories_processed, start_time):
+        """Uzavře výstupní CSV a vypíše souhrn, vrací název výstupního souboru"""
+        self.close_results()
+        elapsed = time.time() - start_time
+        logger.info(f"Crawling dokončen za {elapsed:.2f}s. Zpracováno {categories_processed} kategorií, "
+                   f"nalezeno {len(self.all_series_list)} unikátních sérií")
+        logger.info(f"Uloženo {len(self.all_series_list)} unikátních sérií do {csv_file}")
+        
+        if self.output_format == 'parquet':
+            return self.save_parquet(csv_file.replace('.csv', '.parquet')) or csv_file
+        return csv_file
+    
+    def save_parquet(self, filename):
+        """Uloží nalezené série do sloupcového Parquet souboru, vrací jeho název nebo None"""
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            logger.error("Pro výstup ve formátu Parquet je potřeba nainstalovat pyarrow")
+            return None
+        
+        try:
+            table = pa.Table.from_pylist(self.all_series_list, schema=pa.schema([(f, pa.string()) for f in SERIES_FIELDS]))
+            pq.write_table(table, filename, compression='zstd')
+            logger.info(f"Série uloženy také do {filename}")
+            return filename
+        except Exception as e:
+            logger.error(f"Chyba při ukládání do {filename}: {str(e)}")
+            return None
+    
+    def open_results(self, filename, append=False):
+        """Otevře výstupní CSV (nové s hlavičkou, nebo existující pro připisování), vrací název souboru"""
+        self.results_file = open(filename, 'a' if append else 'w', newline='', encoding='utf-8')
+        self.results_writer = csv.DictWriter(self.results_file, fieldnames=SERIES_FIELDS)
+        if not append:
+            self.results_writer.writeheader()
+        logger.info(f"Nalezené série se průběžně ukládají do {filename}")
+        return filename
+    
+    def load_results(self, filename):
+        """Načte série z výstupního CSV přerušeného crawlingu, aby se neukládaly znovu"""
+        with open(filename, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                self.all_series_list.append(row)
+                self.processed_series.add(row['series_id'])
+        logger.info(f"Načteno {len(self.all_series_list)} již nalezených sérií z {filename}")
+    
+    def save_series(self, series_list):
+        """Připíše nově nalezené série do výstupního CSV (série jsou již deduplikované)"""
+        if series_list and self.results_writer:
+            self.results_writer.writerows(series_list)
+            self.results_file.flush()
+    
+    def open_state(self, path, restart=False):
+        """Otevře databázi stavu crawlingu, při nedokončeném crawlingu vrací (fronta, výstupní CSV)"""
+        self.state_conn = sqlite3.connect(path, check_same_thread=False)
+        self.state_conn.executescript("""
+            CREATE TABLE IF NOT EXISTS visited (url TEXT PRIMARY KEY, kind TEXT);
+            CREATE TABLE IF NOT EXISTS frontier (url TEXT PRIMARY KEY, name TEXT);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        
+        frontier = [{'url': url, 'name': name} for url, name in self.state_conn.execute("SELECT url, name FROM frontier")]
+        row = self.state_conn.execute("SELECT value FROM meta WHERE key = 'output_file'").fetchone()
+        
+        if not restart and frontier and row and os.path.exists(row[0]):
+            for (url,) in self.state_conn.execute("SELECT url FROM visited WHERE kind = 'category'"):
+                self.processed_categories.add(url)
+            return frontier, row[0]
+        
+        # Nový crawling - zahodit stav předchozího
+        self.state_conn.executescript("DELETE FROM visited; DELETE FROM frontier; DELETE FROM meta;")
+        return None, None
+    
+    def _state_written(self, count=1):
+        """Započítá zápis do stavu, commit se provádí po dávkách"""
+        self.state_pending += count
+        if self.state_pending >= STATE_COMMIT_EVERY:
+            self.state_conn.commit()
+            self.state_pending = 0
+    
+    def remember_frontier(self, categories):
+        """Uloží nově naplánované kategorie do fronty na disku"""
+        if self.state_conn and categories:
+            self.state_conn.executemany("INSERT OR IGNORE INTO frontier (url, name) VALUES (?, ?)",
+                                        [(c['url'], c.get('name')) for c in categories])
+            self._state_written(len(categories))
+    
+    def remember_visited(self, url):
+        """Označí kategorii na disku jako hotovou a odebere ji z fronty"""
+        if self.state_conn:
+            self.state_conn.execute("INSERT OR IGNORE INTO visited (url, kind) VALUES (?, 'category')", (url,))
+            self.state_conn.execute("DELETE FROM frontier WHERE url = ?", (url,))
+            self._state_written()
+    
+    def forget_frontier(self, url):
+        """Odebere z fronty na disku kategorii, kterou se nepodařilo načíst"""
+        if self.state_conn:
+            self.state_conn.execute("DELETE FROM frontier WHERE url = ?", (url,))
+            self._state_written()
+    
+    def close_state(self):
+        """Uloží a uzavře stav crawlingu"""
+        if self.state_conn:
+            self.state_conn.commit()
+            self.state_conn.close()
+            self.state_conn = None
+            self.state_pending = 0
+    
+    def start_crawl(self, start_url, restart=False):
+        """Naváže na přerušený crawling, nebo začne nový - vrací (výstupní CSV, kategorie do fronty)"""
+        frontier, csv_file = self.open_state(self.state_db, restart)
+        
+        if frontier:
+            logger.info(f"Navazuji na přerušený crawling: {len(self.processed_categories)} kategorií hotovo, "
+                        f"{len(frontier)} ve frontě (výchozí URL se ignoruje)")
+            self.load_results(csv_file)
+            return self.open_results(csv_file, append=True), frontier
+        
+        csv_file = self.open_results(f'fred_series_complete_{int(time.time())}.csv')
+        self.state_conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('output_file', ?)", (csv_file,))
+        root = [{'url': start_url, 'name': 'Root Category'}]
+        self.remember_frontier(root)
+        self.state_conn.commit()
+        return csv_file, root
+    
+    def close_results(self):
+        """Uzavře výstupní CSV, pokud je otevřené"""
+        if self.results_file:
+            self.results_file.close()
+            self.results_file = None
+            self.results_writer = None
+    
+    def crawl_recursive(self, proxy=None, start_url='https://fred.stlouisfed.org/categories/', num_workers=1, restart=False):
+        """Rekurzivní procházení FRED kategorií v prohlížeči, každý worker má vlastní driver z poolu"""
+        try:
+            csv_file, initial = self.start_crawl(start_url, restart)
+            categories_to_process = Queue()
+            for category in initial:
+                categories_to_process.put(category)
+            state_lock = threading.Lock()
+            categories_processed = 0
+            start_time = time.time()
             
-            # Označit jako zpracovanou
-            processed_categories.add(category_url)
-            categories_processed += 1
+            def worker(pool):
+                """Zpracovává kategorie z fronty s driverem vypůjčeným z poolu"""
+                nonlocal categories_processed
+                
+                with pool.acquire() as driver:
+                    while True:
+                        category = categories_to_process.get()
+                        if category is None:
+                            categories_to_process.task_done()
+                            return
+                        
+                        try:
+                            category_url = category['url']
+                            category_name = category.get('name', 'Unknown')
+                            
+                            # Kontrola a označení pod zámkem - jiný worker stejnou URL nevezme
+                            with state_lock:
+                                if category_url in self.processed_categories:
+                                    continue
+                                self.processed_categories.add(category_url)
+                            
+                            logger.info("Zpracovávám kategorii: %s (%s)", category_name, category_url)
+                            
+                            # Načíst stránku kategorie
+                            if not safe_get_url(driver, category_url):
+                                with state_lock:
+                                    self.processed_categories.discard(category_url)
+                                    self.seen_links.discard(category_url)
+                                    self.forget_frontier(category_url)
+                                logger.warning("Přeskakuji kategorii %s, nelze načíst", category_name)
+                                continue
+                            
+                            series_links, category_links, next_links = driver_links(driver, SERIES_XPATH, CATEGORY_XPATH, NEXT_XPATH)
+                            
+                            with state_lock:
+                                categories_processed += 1
+                                for new_category in self.process_category(category, series_links, category_links, next_links):
+                                    categories_to_process.put(new_category)
+                                self.report_progress(categories_processed, categories_to_process.qsize(), start_time)
+                        
+                        except Exception as e:
+                            logger.error("Chyba při zpracování kategorie %s: %s", category.get('url'), e)
+                        
+                        finally:
+                            categories_to_process.task_done()
             
-            # 1. Získat série v této kategorii
-            series_list = extract_series(driver, category_url)
-            all_series_list.extend(series_list)
+            # Prohlížeče se spustí jen jednou a načtou hlavní stránku pro cookies
+            with DriverPool(num_workers, proxy) as pool:
+                threads = [threading.Thread(target=worker, args=(pool,), daemon=True) for _ in range(num_workers)]
+                for thread in threads:
+                    thread.start()
+                
+                # Fronta je hotová, až ji všichni workeři vyprázdní a nic dalšího nepřidají
+                categories_to_process.join()
+                
+                for _ in threads:
+                    categories_to_process.put(None)
+                for thread in threads:
+                    thread.join()
             
-            # 2. Zkontrolovat paginaci
-            next_page = check_pagination(driver, category_url)
-            if next_page:
-                categories_to_process.append({
-                    'url': next_page,
-                    'name': f"{category_name} (další stránka)"
-                })
+            return self.finish_crawl(csv_file, categories_processed, start_time)
+        
+        except Exception as e:
+            logger.error(f"Neočekávaná chyba: {str(e)}", exc_info=True)
+            return False
+        
+        finally:
+            self.close_results()
+            self.close_state()
+    
+    async def crawl_async(self, load_links, start_url, num_workers, restart=False):
+        """Paralelní procházení kategorií asyncio workery, odkazy kategorie dodává load_links(session, url)"""
+        try:
+            csv_file, initial = self.start_crawl(start_url, restart)
+            queue = asyncio.Queue()
+            for category in initial:
+                queue.put_nowait(category)
+            categories_processed = 0
+            start_time = time.time()
             
-            # 3. Získat podkategorie
-            subcategories = extract_subcategories(driver, category_url)
-            categories_to_process.extend(subcategories)
+            async def worker(session):
+                """Zpracovává kategorie z fronty a nově nalezené do ní přidává"""
+                nonlocal categories_processed
+                
+                while True:
+                    category = await queue.get()
+                    try:
+                        category_url = category['url']
+                        category_name = category.get('name', 'Unknown')
+                        
+                        # Kontrola a označení bez await mezi nimi - jiný worker stejnou URL nevezme
+                        if category_url in self.processed_categories:
+                            continue
+                        self.processed_categories.add(category_url)
+                        
+                        logger.info("Zpracovávám kategorii: %s (%s)", category_name, category_url)
+                        
+                        # Načíst odkazy kategorie
+                        links = await load_links(session, category_url)
+                        if links is None:
+                            # Umožnit nový pokus, pokud kategorii najdeme znovu
+                            self.processed_categories.discard(category_url)
+                            self.seen_links.discard(category_url)
+                            self.forget_frontier(category_url)
+                            logger.warning("Přeskakuji kategorii %s, nelze načíst", category_name)
+                            continue
+                        
+                        categories_processed += 1
+                        
+                        for new_category in self.process_category(category, *links):
+                            queue.put_nowait(new_category)
+                        
+                        self.report_progress(categories_processed, queue.qsize(), start_time)
+                    
+                    except Exception as e:
+                        logger.error("Chyba při zpracování kategorie %s: %s", category.get('url'), e)
+                    
+                    finally:
+                        queue.task_done()
             
-            # Zobrazit průběžné statistiky
-            if categories_processed % 10 == 0:
-                elapsed = time.time() - start_time
-                logger.info(f"Postup: {categories_processed} kategorií zpracováno, "
-                           f"{len(categories_to_process)} zbývá, "
-                           f"{len(all_series_list)} sérií nalezeno, "
-                           f"čas: {elapsed:.2f}s")
+            async with create_http_session(num_workers) as session:
+                workers = [asyncio.create_task(worker(session)) for _ in range(num_workers)]
+                
+                # Fronta je hotová, až ji všichni workeři vyprázdní a nic dalšího nepřidají
+                await queue.join()
                 
-                # Průběžné ukládání
-                save_results(f'fred_series_progress_{int(time.time())}.csv')
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+            
+            return self.finish_crawl(csv_file, categories_processed, start_time)
         
-        # Finální uložení
-        csv_file = save_results(f'fred_series_complete_{int(time.time())}.csv')
-        elapsed = time.time() - start_time
-        logger.info(f"Crawling dokončen za {elapsed:.2f}s. Zpracováno {categories_processed} kategorií, "
-                   f"nalezeno {len(all_series_list)} sérií (před deduplikací)")
-        return csv_file
+        except Exception as e:
+            logger.error(f"Neočekávaná chyba: {str(e)}", exc_info=True)
+            return False
         
-    except Exception as e:
-        logger.error(f"Neočekávaná chyba: {str(e)}", exc_info=True)
-        return False
+        finally:
+            self.close_results()
+            self.close_state()
     
-    finally:
-        if driver:
-            driver.quit()
+    async def crawl_http(self, proxy=None, start_url='https://fred.stlouisfed.org/categories/', num_workers=HTTP_CONCURRENCY,
+                         restart=False):
+        """Paralelní procházení FRED kategorií přímými HTTP požadavky s parsováním přes lxml"""
+        semaphore = asyncio.Semaphore(num_workers)
+        
+        async def load_links(session, category_url):
+            tree = await fetch_page(session, semaphore, category_url, proxy)
+            if tree is None:
+                return None
+            return tuple(tree_links(tree, xpath) for xpath in (SERIES_XPATH, CATEGORY_XPATH, NEXT_XPATH))
+        
+        return await self.crawl_async(load_links, start_url, num_workers, restart)
+    
+    async def crawl_api(self, api_key, start_url='https://fred.stlouisfed.org/categories/', num_workers=HTTP_CONCURRENCY,
+                        restart=False):
+        """Procházení stromu kategorií přes FRED API (category/children a category/series) místo HTML"""
+        limiter = AsyncRateLimiter(API_RATE_LIMIT)
+        
+        async def load_links(session, category_url):
+            # Kořen kategorií má v API ID 0
+            category_id = category_url.rpartition('/')[2] or '0'
+            params = {'category_id': category_id, 'api_key': api_key, 'file_type': 'json'}
+            
+            # Podkategorie a první stránku sérií stáhnout najednou
+            children, first_page = await asyncio.gather(
+                fetch_api(session, limiter, 'category/children', params),
+                fetch_api(session, limiter, 'category/series', dict(params, limit=API_PAGE_LIMIT, offset=0)))
+            if children is None or first_page is None:
+                return None
+            category_links = [(CATEGORIES_PREFIX + str(c['id']), c.get('name', '')) for c in children.get('categories', [])]
+            
+            # Počet sérií je známý z první stránky - zbylé stránky stáhnout jednou dávkou
+            pages = [first_page]
+            offsets = range(API_PAGE_LIMIT, first_page.get('count', 0), API_PAGE_LIMIT)
+            if offsets:
+                pages.extend(await asyncio.gather(
+                    *(fetch_api(session, limiter, 'category/series', dict(params, limit=API_PAGE_LIMIT, offset=offset))
+                      for offset in offsets)))
+                if any(page is None for page in pages):
+                    return None
+            
+            series_links = [(SERIES_PREFIX + s['id'], s.get('title', ''))
+                            for page in pages for s in page.get('seriess', [])]
+            
+            # Stránkování řeší offset, odkazy "Next" v API nejsou
+            return series_links, category_links, []
+        
+        return await self.crawl_async(load_links, start_url, num_workers, restart)
 
 def test_proxy(proxy):
     """Otestuje, zda proxy funguje pro přístup k FRED"""
-    driver = None
     try:
         logger.info(f"Testuji proxy: {proxy}")
-        driver = create_driver(proxy)
-        
-        # Zkusit přístup na hlavní stránku
-        if not safe_get_url(driver, "https://fred.stlouisfed.org/"):
-            logger.error(f"Proxy {proxy} nefunguje pro přístup k FRED (hlavní stránka)")
-            return False
-        
-        # Zkusit přístup ke kategoriím
-        if not safe_get_url(driver, "https://fred.stlouisfed.org/categories/"):
-            logger.error(f"Proxy {proxy} nefunguje pro přístup ke kategoriím FRED")
-            return False
         
-        # Zkusit přístup ke konkrétní kategorii
-        if not safe_get_url(driver, "https://fred.stlouisfed.org/categories/33940"):
-            logger.error(f"Proxy {proxy} nefunguje pro přístup ke konkrétní kategorii")
-            return False
+        with DriverPool(1, proxy, warm=False) as pool, pool.acquire() as driver:
+            # Zkusit přístup na hlavní stránku
+            if not safe_get_url(driver, "https://fred.stlouisfed.org/"):
+                logger.error(f"Proxy {proxy} nefunguje pro přístup k FRED (hlavní stránka)")
+                return False
+            
+            # Zkusit přístup ke kategoriím
+            if not safe_get_url(driver, "https://fred.stlouisfed.org/categories/"):
+                logger.error(f"Proxy {proxy} nefunguje pro přístup ke kategoriím FRED")
+                return False
+            
+            # Zkusit přístup ke konkrétní kategorii
+            if not safe_get_url(driver, "https://fred.stlouisfed.org/categories/33940"):
+                logger.error(f"Proxy {proxy} nefunguje pro přístup ke konkrétní kategorii")
+                return False
         
         logger.info(f"Proxy {proxy} funguje pro přístup k FRED!")
         return True
@@ -300,25 +864,51 @@ def test_proxy(proxy):
     except Exception as e:
         logger.error(f"Chyba při testování proxy {proxy}: {str(e)}")
         return False
+
+async def test_proxy_http(proxy):
+    """Otestuje, zda proxy funguje pro přístup k FRED přes HTTP"""
+    logger.info(f"Testuji proxy: {proxy}")
+    semaphore = asyncio.Semaphore(HTTP_CONCURRENCY)
+    
+    async with create_http_session() as session:
+        for url in ("https://fred.stlouisfed.org/",
+                    "https://fred.stlouisfed.org/categories/",
+                    "https://fred.stlouisfed.org/categories/33940"):
+            if await fetch_page(session, semaphore, url, proxy) is None:
+                logger.error(f"Proxy {proxy} nefunguje pro přístup k {url}")
+                return False
     
-    finally:
-        if driver:
-            driver.quit()
+    logger.info(f"Proxy {proxy} funguje pro přístup k FRED!")
+    return True
 
 def main():
     parser = argparse.ArgumentParser(description='Jednoduchý FRED scraper pro macOS')
     parser.add_argument('--proxy', type=str, help='Proxy server v formátu ip:port')
     parser.add_argument('--test', action='store_true', help='Pouze otestovat přístup, nestahovat data')
     parser.add_argument('--category', type=str, help='Začít od konkrétní kategorie (URL)')
+    parser.add_argument('--workers', type=int, help=f'Počet souběžně zpracovávaných kategorií (výchozí: {HTTP_CONCURRENCY}, v prohlížeči 1)')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                        help='Formát finálního výstupu (parquet vyžaduje pyarrow, CSV se zapisuje vždy průběžně)')
+    parser.add_argument('--restart', action='store_true', help=f'Nenavazovat na přerušený crawling uložený v {STATE_DB}, začít znovu')
+    parser.add_argument('--headless', action='store_true', help='Spustit prohlížeč bez okna (jen s --browser)')
+    parser.add_argument('--api-key', type=str, default=os.environ.get('FRED_API_KEY'),
+                        help='Klíč k FRED API - strom kategorií se pak stahuje přes API (výchozí: proměnná FRED_API_KEY)')
+    parser.add_argument('--browser', action='store_true', help='Procházet stránky v prohlížeči (Selenium) místo přímých HTTP požadavků')
     
     args = parser.parse_args()
     
+    global HEADLESS
+    if args.headless:
+        HEADLESS = True
+    
     if args.test:
-        if args.proxy:
+        if not args.proxy:
+            logger.info("Testuji přístup bez proxy...")
+        
+        if args.browser:
             test_proxy(args.proxy)
         else:
-            logger.info("Testuji přístup bez proxy...")
-            test_proxy(None)
+            asyncio.run(test_proxy_http(args.proxy))
     else:
         # Spustit crawling
         start_url = args.category if args.category else 'https://fred.stlouisfed.org/categories/'
@@ -327,7 +917,14 @@ def main():
         logger.info(f"Spouštím crawling od: {start_url}")
         logger.info(f"Proxy: {proxy if proxy else 'nepoužívám'}")
         
-        crawl_recursive(proxy, start_url)
+        crawler = Crawler(output_format=args.format)
+        if args.browser:
+            crawler.crawl_recursive(proxy, start_url, args.workers or 1, args.restart)
+        elif args.api_key:
+            logger.info("Procházím kategorie přes FRED API")
+            asyncio.run(crawler.crawl_api(args.api_key, start_url, args.workers or HTTP_CONCURRENCY, args.restart))
+        else:
+            asyncio.run(crawler.crawl_http(proxy, start_url, args.workers or HTTP_CONCURRENCY, args.restart))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -4,12 +4,22 @@ import logging
 import time
 from datetime import datetime, timedelta
 import os
+import io
+import re
+import html
 import sys
 import json
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import count
+from queue import Queue, Empty
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
 import argparse
+import asyncio
+import aiohttp
 from selenium import webdriver
+import requests
+from requests.adapters import HTTPAdapter
+from lxml import html as lxml_html
 import random
 
 # Přidat cestu k modulům
@@ -22,13 +32,14 @@ try:
     # Importovat funkce z modulů, které jsme vytvořili
     from updated_database_module import (
         create_database, store_series, get_latest_date_in_db, 
-        check_if_needs_update_selenium, get_series_to_update, create_driver
+        check_if_needs_update_selenium, verify_on_web, get_series_to_update, create_driver,
+        UPSERT_METADATA_SQL, begin_bulk_load, end_bulk_load
     )
 except ImportError:
     # Záložní import, pokud moduly nejsou dostupné
     print("VAROVÁNÍ: Nemohu najít nové moduly, používám původní funkce")
     from database import store_series, get_latest_date_in_db, check_if_needs_update
-    from series_scraper import scrape_series_data, is_quarterly_or_more_frequent
+    from series_scraper import scrape_series_data
 
 # Nastavení logování
 logging.basicConfig(
@@ -50,78 +61,364 @@ CONFIG = {
     "min_delay": 1.0,  # minimální zpoždění mezi požadavky
     "max_delay": 3.0,  # maximální zpoždění
     "retry_limit": 3,  # počet pokusů při chybě
-    "use_proxy": None  # proxy server (volitelné)
+    "checked_batch_size": 200,  # po kolika sériích uložit datum poslední kontroly
+    "store_batch_size": 100,  # kolik stažených sérií uložit jednou transakcí
+    "store_flush_interval": 2.0,  # nejdéle po kolika sekundách uložit neúplnou dávku
+    "use_proxy": None,  # proxy server (volitelné)
+    "use_browser": False,  # stahovat v prohlížeči (Selenium) místo přímých HTTP požadavků
+    "api_key": os.environ.get("FRED_API_KEY"),  # klíč k FRED API pro hromadné zjištění změněných sérií
+    "prefilter_max_pages": 50,  # max. počet stránek (po 1000 sériích) seznamu změn z API
+    "bulk_load": False  # po dobu běhu odstranit index podle data (pro velká počáteční načtení)
 }
 
+# Seznam sérií seřazený podle času poslední aktualizace na serveru FRED
+FRED_API_UPDATES_URL = "https://api.stlouisfed.org/fred/series/updates"
+
+# Stejný user agent jako prohlížeč, aby cookies z jeho session platily i pro HTTP požadavky
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15"
+
+def create_session():
+    """Vytvoří HTTP session s keep-alive spojeními pro stahování CSV"""
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(
+        pool_connections=CONFIG["max_workers"],
+        pool_maxsize=CONFIG["max_workers"] * 2
+    ))
+    session.headers.update({"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"})
+    return session
+
+# Sdílená HTTP session - spojení (TCP + TLS) se znovu používá pro další série
+SESSION = create_session()
+
+# HTML značky kolem CSV zobrazeného v prohlížeči
+HTML_TAG_RE = re.compile(r'<[^>]+>')
+
+# Frekvence čtvrtletní nebo častější (biweekly pokrývá už 'weekly')
+HIGH_FREQUENCY_RE = re.compile(r'daily|weekly|monthly|quarterly', re.IGNORECASE)
+
+# SQLite připojení - každé vlákno si drží vlastní a používá ho opakovaně
+_thread_local = threading.local()
+
+def get_connection():
+    """Vrátí SQLite připojení aktuálního vlákna, při prvním použití ho otevře"""
+    conn = getattr(_thread_local, 'conn', None)
+    if conn is None:
+        # Autocommit, WAL a větší cache - zápisy z více vláken se navzájem neblokují
+        conn = sqlite3.connect(CONFIG["db_file"], isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-64000")
+        conn.execute("PRAGMA mmap_size=268435456")
+        _thread_local.conn = conn
+    return conn
+
+def close_connection():
+    """Uzavře SQLite připojení aktuálního vlákna, pokud je otevřené"""
+    conn = getattr(_thread_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _thread_local.conn = None
+
+# Čas poslední kontroly stačí s přesností na desítky sekund, není nutné ho formátovat pro každou sérii
+NOW_ISO_REFRESH = 30
+_now_iso_cache = (None, None)
+
+def now_iso():
+    """Aktuální čas v ISO formátu, přepočítaný nejvýše jednou za NOW_ISO_REFRESH sekund"""
+    global _now_iso_cache
+    cached_at, value = _now_iso_cache
+    now = time.monotonic()
+    if cached_at is None or now - cached_at > NOW_ISO_REFRESH:
+        value = datetime.now().isoformat()
+        _now_iso_cache = (now, value)
+    return value
+
+def mark_checked(series_id):
+    """Zaznamená kontrolu série bez aktualizace, do databáze se zapisuje po dávkách"""
+    pending = getattr(_thread_local, 'pending', None)
+    if pending is None:
+        pending = _thread_local.pending = []
+    
+    pending.append((now_iso(), series_id))
+    if len(pending) >= CONFIG["checked_batch_size"]:
+        flush_checked()
+
+def flush_checked():
+    """Zapíše nashromážděná data poslední kontroly jednou transakcí"""
+    pending = getattr(_thread_local, 'pending', None)
+    if not pending:
+        return
+    
+    conn = get_connection()
+    try:
+        conn.execute("BEGIN")
+        conn.executemany("UPDATE series_metadata SET last_checked = ? WHERE series_id = ?", pending)
+        conn.execute("COMMIT")
+    except Exception as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        logger.error(f"Chyba při ukládání data kontroly pro {len(pending)} sérií: {str(e)}")
+    finally:
+        pending.clear()
+
+def store_series_batch(series_batch):
+    """Uloží více sérií jednou transakcí, vrací počet sérií, které se nepodařilo uložit"""
+    if not series_batch:
+        return 0
+    
+    conn = get_connection()
+    now = datetime.now().isoformat()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(UPSERT_METADATA_SQL, [(
+            series_data['series_id'],
+            series_data.get('title', ''),
+            series_data.get('frequency', ''),
+            series_data.get('units', ''),
+            series_data.get('seasonal_adjustment', ''),
+            series_data.get('last_updated', ''),
+            now,
+            series_data.get('source', 'FRED'),
+            series_data.get('data_source', '')
+        ) for series_data in series_batch])
+        conn.executemany(
+            "INSERT OR REPLACE INTO series_values (series_id, date, value) VALUES (?, ?, ?)",
+            ((series_data['series_id'], point['date'], point['value'])
+             for series_data in series_batch for point in series_data.get('data') or [])
+        )
+        conn.executemany(
+            "INSERT INTO update_log (timestamp, series_id, action, status, message) VALUES (?, ?, ?, ?, ?)",
+            [(now, series_data['series_id'], 'UPDATE', 'SUCCESS',
+              f"Aktualizováno s {len(series_data.get('data') or [])} datovými body") for series_data in series_batch]
+        )
+        conn.execute("COMMIT")
+        logger.info(f"Uloženo {len(series_batch)} sérií jednou transakcí")
+        return 0
+    
+    except Exception as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        logger.error(f"Chyba při dávkovém ukládání {len(series_batch)} sérií: {str(e)}, ukládám jednotlivě")
+        return sum(1 for series_data in series_batch if not store_series(series_data))
+
+class SeriesWriter:
+    """Vlákno, které ukládá stažené série do databáze po dávkách, každou dávku jednou transakcí"""
+    
+    def __init__(self):
+        self.queue = Queue(maxsize=1000)
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def put(self, series_data):
+        """Předá sérii k uložení (při plné frontě počká na zapisovač)"""
+        self.queue.put(series_data)
+    
+    def close(self):
+        """Uloží zbývající série a ukončí vlákno, vrací počet sérií, které se nepodařilo uložit"""
+        self.queue.put(None)
+        self._thread.join()
+        return self.failed
+    
+    def _run(self):
+        """Sbírá série z fronty a ukládá je, když je dávka plná nebo uplyne interval"""
+        batch = []
+        flush_at = 0
+        running = True
+        
+        try:
+            while running:
+                try:
+                    item = self.queue.get(timeout=max(0, flush_at - time.monotonic()) if batch else None)
+                    if item is None:
+                        running = False
+                    else:
+                        if not batch:
+                            flush_at = time.monotonic() + CONFIG["store_flush_interval"]
+                        batch.append(item)
+                except Empty:
+                    pass
+                
+                if batch and (not running or len(batch) >= CONFIG["store_batch_size"] or time.monotonic() >= flush_at):
+                    self.failed += store_series_batch(batch)
+                    batch = []
+        
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Chyba zapisovače sérií: {str(e)}")
+        
+        finally:
+            close_connection()
+
 def random_delay():
     """Náhodné zpoždění pro simulaci lidského chování"""
     delay = CONFIG["min_delay"] + random.random() * (CONFIG["max_delay"] - CONFIG["min_delay"])
     time.sleep(delay)
 
-def extract_series_data_selenium(driver, series_id):
-    """Extrahuje data série pomocí Selenia"""
+async def async_random_delay():
+    """Náhodné zpoždění bez blokování smyčky událostí"""
+    await asyncio.sleep(CONFIG["min_delay"] + random.random() * (CONFIG["max_delay"] - CONFIG["min_delay"]))
+
+def copy_cookies(driver):
+    """Převezme cookies z prohlížeče do sdílené HTTP session"""
+    for cookie in driver.get_cookies():
+        SESSION.cookies.set(cookie['name'], cookie['value'],
+                            domain=cookie.get('domain'), path=cookie.get('path', '/'))
+
+def http_get(url):
+    """Stáhne URL přes sdílenou HTTP session, při zablokování nebo chybě vrací None"""
+    proxies = {"https": f"http://{CONFIG['use_proxy']}"} if CONFIG["use_proxy"] else None
+    
+    try:
+        response = SESSION.get(url, timeout=30, proxies=proxies)
+        if response.status_code != 200 or "Access Denied" in response.text[:1000]:
+            logger.warning(f"Přímé stažení {url} selhalo (HTTP {response.status_code}), zkouším prohlížeč")
+            return None
+        return response
+    except Exception as e:
+        logger.warning(f"Přímé stažení {url} selhalo: {str(e)}, zkouším prohlížeč")
+        return None
+
+def download_csv(series_id):
+    """Stáhne CSV série přímo přes HTTP bez prohlížeče, vrací text nebo None"""
+    response = http_get(f"https://fred.stlouisfed.org/graph/fredgraph.csv?id={series_id}")
+    return response.text if response is not None else None
+
+def parse_page_metadata(page_html):
+    """Vytáhne z HTML stránky série (název, dvojice popisek-hodnota)"""
+    tree = lxml_html.fromstring(page_html)
+    title = tree.xpath('string((//*[contains(@class, "series-title")])[1])').strip()
+    pairs = [(label.text_content().strip().lower(),
+              label.xpath('string(following-sibling::span[@class="series-meta-value"][1])').strip())
+             for label in tree.xpath('//span[@class="series-meta-label"]')]
+    return title, pairs
+
+def page_metadata_http(series_id):
+    """Stáhne stránku série přes HTTP a vrátí (název, dvojice popisek-hodnota), nebo None"""
+    response = http_get(f"https://fred.stlouisfed.org/series/{series_id}")
+    if response is None:
+        return None
+    return parse_page_metadata(response.content)
+
+# Vrátí dvojice [popisek, hodnota] metadat stránky série (popisek malými písmeny)
+META_PAIRS_SCRIPT = """
+return Array.from(document.querySelectorAll('span.series-meta-label'), function (label) {
+    var value = label.nextElementSibling;
+    return [label.textContent.trim().toLowerCase(), value ? value.textContent.trim() : ''];
+});
+"""
+
+def page_metadata_selenium(driver, series_id):
+    """Načte stránku série v prohlížeči a vrátí (název, dvojice popisek-hodnota), nebo None"""
+    url = f"https://fred.stlouisfed.org/series/{series_id}"
+    
+    # Načíst stránku
+    driver.get(url)
+    
+    # Kontrola na Access Denied
+    if "Access Denied" in driver.page_source:
+        logger.error(f"Přístup odepřen pro {series_id}")
+        return None
+    
+    # Získat metadata
+    title_element = None
+    try:
+        title_element = driver.find_element("css selector", 'h1.series-title')
+    except:
+        try:
+            title_element = driver.find_element("css selector", '.series-title')
+        except:
+            pass
+    
+    title = title_element.text.strip() if title_element else ""
+    
+    # Extrahovat metadata ze stránky - všechny dvojice jedním voláním prohlížeče
+    pairs = []
     try:
-        url = f"https://fred.stlouisfed.org/series/{series_id}"
+        pairs = driver.execute_script(META_PAIRS_SCRIPT) or []
+    except Exception as e:
+        logger.warning(f"Chyba při extrakci metadat pro {series_id}: {str(e)}")
+    
+    return title, pairs
+
+def build_metadata(series_id, title, meta_pairs):
+    """Sestaví metadata série z názvu a dvojic popisek-hodnota ze stránky"""
+    metadata = {
+        'series_id': series_id,
+        'title': title,
+        'frequency': None,
+        'units': None,
+        'seasonal_adjustment': None,
+        'last_updated': None,
+        'source': 'FRED',
+        'data_source': None
+    }
+    
+    for label, value in meta_pairs:
+        if 'frequency' in label:
+            metadata['frequency'] = value
+        elif 'units' in label:
+            metadata['units'] = value
+        elif 'adjustment' in label:
+            metadata['seasonal_adjustment'] = value
+        elif 'last updated' in label:
+            metadata['last_updated'] = value
+        elif 'source' in label:
+            metadata['data_source'] = value
+    
+    return metadata
+
+def parse_csv_data(series_id, csv_text):
+    """Převede stažené CSV (případně zabalené v HTML prohlížeče) na datové body, nebo None"""
+    # Čisté CSV z přímého HTTP stažení žádné čištění nepotřebuje
+    if csv_text.lstrip().startswith('<'):
+        # Prohlížeč zobrazí CSV v <pre> (případně přímo v <body>) - libxml2 vrátí jejich
+        # text už bez značek a s převedenými entitami
+        page = lxml_html.fromstring(csv_text)
+        csv_text = (page.xpath('string(//pre)') or page.xpath('string(//body)')
+                    or html.unescape(HTML_TAG_RE.sub('', csv_text)))
+    
+    # Načíst data přímo z textu v paměti, bez dočasného souboru
+    try:
+        df = pd.read_csv(io.StringIO(csv_text.strip()))
         
-        # Náhodné zpoždění
-        random_delay()
+        if df.empty:
+            logger.warning(f"Prázdná data pro {series_id}")
+            return None
         
-        # Načíst stránku
-        driver.get(url)
+        # Standardizovat názvy sloupců
+        df.columns = [col.strip() for col in df.columns]
         
-        # Kontrola na Access Denied
-        if "Access Denied" in driver.page_source:
-            logger.error(f"Přístup odepřen pro {series_id}")
-            return None
+        # Převést na formát pro databázi - celé sloupce najednou místo iterrows
+        dates = df.iloc[:, 0].astype(str).to_numpy()
+        raw_values = df.iloc[:, 1]
+        values = pd.to_numeric(raw_values, errors='coerce').to_numpy(dtype=float)
         
-        # Získat metadata
-        title_element = None
-        try:
-            title_element = driver.find_element("css selector", 'h1.series-title')
-        except:
-            try:
-                title_element = driver.find_element("css selector", '.series-title')
-            except:
-                pass
+        # Nečíselné hodnoty vynechat, chybějící zahrnout jako NULL pro úplnost
+        invalid = pd.isna(values) & raw_values.notna().to_numpy()
+        if invalid.any():
+            logger.warning(f"Vynechávám {int(invalid.sum())} neplatných hodnot pro {series_id}")
         
-        title = title_element.text.strip() if title_element else ""
+        # Filtrování a převod na Python typy proběhne v C (tolist), smyčka pak nepracuje s numpy skaláry
+        valid = ~invalid
+        return [{'date': date_str, 'value': None if value != value else value}
+                for date_str, value in zip(dates[valid].tolist(), values[valid].tolist())]
         
-        metadata = {
-            'series_id': series_id,
-            'title': title,
-            'frequency': None,
-            'units': None,
-            'seasonal_adjustment': None,
-            'last_updated': None,
-            'source': 'FRED',
-            'data_source': None
-        }
+    except Exception as e:
+        logger.error(f"Chyba při zpracování CSV dat pro {series_id}: {str(e)}")
+        return None
+
+def extract_series_data_selenium(driver, series_id):
+    """Extrahuje data série - přímo přes HTTP, v prohlížeči jen při zablokování"""
+    try:
+        # Náhodné zpoždění
+        random_delay()
         
-        # Extrahovat metadata ze stránky
-        try:
-            meta_labels = driver.find_elements("css selector", 'span.series-meta-label')
-            
-            for label_elem in meta_labels:
-                label = label_elem.text.strip().lower()
-                
-                try:
-                    value_elem = driver.find_element("xpath", f"//span[@class='series-meta-label' and contains(text(),'{label}')]/following-sibling::span[@class='series-meta-value']")
-                    value = value_elem.text.strip() if value_elem else ""
-                except:
-                    value = ""
-                
-                if 'frequency' in label:
-                    metadata['frequency'] = value
-                elif 'units' in label:
-                    metadata['units'] = value
-                elif 'adjustment' in label:
-                    metadata['seasonal_adjustment'] = value
-                elif 'last updated' in label:
-                    metadata['last_updated'] = value
-                elif 'source' in label:
-                    metadata['data_source'] = value
-        except Exception as e:
-            logger.warning(f"Chyba při extrakci metadat pro {series_id}: {str(e)}")
+        # Stránku série stáhnout přes HTTP a rozparsovat lxml, prohlížeč jen jako záloha
+        page = page_metadata_http(series_id) or page_metadata_selenium(driver, series_id)
+        if page is None:
+            return None
+        metadata = build_metadata(series_id, *page)
         
         # Kontrola frekvence
         if not is_quarterly_or_more_frequent(metadata['frequency']):
@@ -135,90 +432,20 @@ def extract_series_data_selenium(driver, series_id):
         random_delay()
         
         try:
-            driver.get(download_url)
-            
-            # Extrahovat CSV
-            page_source = driver.page_source
+            # CSV stáhnout přímo přes HTTP, prohlížeč jen jako záloha při zablokování
+            csv_text = download_csv(series_id)
+            if csv_text is None:
+                driver.get(download_url)
+                csv_text = driver.page_source
             
-            # Zpracovat CSV data
-            csv_text = page_source
-            
-            # Někdy je CSV vloženo do HTML, takže extrahujeme jen CSV část
-            if "<html" in csv_text:
-                # Může být různě formátováno podle prohlížeče
-                if "<pre" in csv_text:
-                    # Najít obsah mezi <pre> tagy
-                    start = csv_text.find("<pre")
-                    start = csv_text.find(">", start) + 1
-                    end = csv_text.find("</pre>", start)
-                    if start > 0 and end > start:
-                        csv_text = csv_text[start:end]
-                else:
-                    # Zkusit extrahovat text z body
-                    start = csv_text.find("<body")
-                    start = csv_text.find(">", start) + 1
-                    end = csv_text.find("</body>", start)
-                    if start > 0 and end > start:
-                        csv_text = csv_text[start:end]
-            
-            # Vyčistit případné HTML entity a značky
-            csv_text = csv_text.replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
-            csv_text = csv_text.replace("&quot;", "\"").replace("&apos;", "'")
+            data = parse_csv_data(series_id, csv_text)
+            if data is None:
+                return None
             
-            # Odstranit HTML tagy
-            import re
-            csv_text = re.sub(r'<[^>]+>', '', csv_text)
+            metadata['data'] = data
             
-            # Uložit do dočasného souboru
-            temp_file = f"temp_{series_id}.csv"
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                f.write(csv_text.strip())
-            
-            # Načíst data z dočasného souboru
-            try:
-                df = pd.read_csv(temp_file)
-                os.remove(temp_file)
-                
-                if df.empty:
-                    logger.warning(f"Prázdná data pro {series_id}")
-                    return None
-                
-                # Standardizovat názvy sloupců
-                df.columns = [col.strip() for col in df.columns]
-                
-                # Převést na formát pro databázi
-                data = []
-                for _, row in df.iterrows():
-                    date_str = str(row.iloc[0])
-                    value = row.iloc[1]
-                    
-                    # Kontrola platnosti hodnoty
-                    if pd.notna(value):
-                        try:
-                            value_float = float(value)
-                            data.append({
-                                'date': date_str,
-                                'value': value_float
-                            })
-                        except (ValueError, TypeError):
-                            logger.warning(f"Neplatná hodnota {value} pro {series_id} na {date_str}")
-                    else:
-                        # Zahrnout i NULL hodnoty pro úplnost
-                        data.append({
-                            'date': date_str,
-                            'value': None
-                        })
-                
-                metadata['data'] = data
-                
-                logger.info(f"Úspěšně extrahováno {len(data)} datových bodů pro {series_id}")
-                return metadata
-                
-            except Exception as e:
-                logger.error(f"Chyba při zpracování CSV dat pro {series_id}: {str(e)}")
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-                return None
+            logger.info(f"Úspěšně extrahováno {len(data)} datových bodů pro {series_id}")
+            return metadata
             
         except Exception as e:
             logger.error(f"Chyba při stahování CSV pro {series_id}: {str(e)}")
@@ -230,36 +457,21 @@ def extract_series_data_selenium(driver, series_id):
 
 def is_quarterly_or_more_frequent(frequency):
     """Určí, zda je frekvence čtvrtletní nebo častější"""
-    if not frequency:
-        return False
-    
-    high_frequency = ['daily', 'weekly', 'biweekly', 'monthly', 'quarterly']
-    frequency_lower = frequency.lower() if frequency else ''
-    
-    for freq in high_frequency:
-        if freq in frequency_lower:
-            return True
-    
-    return False
+    return bool(frequency) and HIGH_FREQUENCY_RE.search(frequency) is not None
 
-def update_series_selenium(driver, series_info):
-    """Aktualizuje jednu sérii pomocí Selenia"""
-    series_id, priority = series_info
+def update_series_selenium(driver, series_info, writer=None):
+    """Aktualizuje jednu sérii pomocí Selenia, se zapisovačem se data ukládají v dávkách"""
+    series_id = series_info['series_id']
     
     try:
-        # Zkontrolovat, zda potřebujeme aktualizaci
-        if not check_if_needs_update_selenium(series_id, driver):
-            logger.info(f"Série {series_id} (priorita {priority}) nepotřebuje aktualizaci")
+        # Zkontrolovat, zda potřebujeme aktualizaci (změny potvrzené FRED API není třeba ověřovat,
+        # interval podle frekvence už ověřila get_series_to_update)
+        if not series_info.get('changed') and \
+                not verify_on_web(series_id, series_info.get('last_updated'), driver):
+            logger.info(f"Série {series_id} ({series_info.get('frequency')}) nepotřebuje aktualizaci")
             
-            # Aktualizovat jen datum poslední kontroly
-            conn = sqlite3.connect(CONFIG["db_file"])
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE series_metadata SET last_checked = ? WHERE series_id = ?",
-                (datetime.now().isoformat(), series_id)
-            )
-            conn.commit()
-            conn.close()
+            # Aktualizovat jen datum poslední kontroly (zapíše se v dávce)
+            mark_checked(series_id)
             
             return False
         
@@ -270,6 +482,11 @@ def update_series_selenium(driver, series_info):
             logger.warning(f"Nepodařilo se získat data pro {series_id}")
             return False
         
+        # Předat zapisovači, který ukládá po dávkách
+        if writer:
+            writer.put(series_data)
+            return True
+        
         # Uložit do databáze
         success = store_series(series_data)
         
@@ -294,60 +511,318 @@ def update_series(series_info):
         logger.error(f"Chyba při aktualizaci série: {str(e)}")
         return False
     finally:
+        flush_checked()
         if driver:
             driver.quit()
 
-def driver_worker(worker_id, series_list, results):
-    """Worker vlákno, které pracuje s jednou instancí driveru"""
-    driver = None
+# Prostředky vláken poolu prohlížečů (driver, nezapsaná data kontroly) - po doběhnutí je uklidí hlavní vlákno
+_browser_workers = []
+_browser_workers_lock = threading.Lock()
+
+def init_browser_worker():
+    """Inicializace vlákna poolu - vlastní driver s cookies z hlavní stránky FRED"""
+    worker = {'driver': None, 'pending': []}
+    _thread_local.pending = worker['pending']
+    with _browser_workers_lock:
+        _browser_workers.append(worker)
+    
     try:
-        driver = create_driver()
-        logger.info(f"Worker {worker_id} vytvořil driver a začíná zpracování {len(series_list)} sérií")
+        worker['driver'] = create_driver()
         
         # Nejprve navštívit hlavní stránku pro získání cookies
-        driver.get("https://fred.stlouisfed.org/")
+        worker['driver'].get("https://fred.stlouisfed.org/")
         time.sleep(2)
         
-        for i, series_info in enumerate(series_list):
-            series_id = series_info[0]
-            
+        # Cookies z prohlížeče použije i HTTP session pro stahování CSV
+        copy_cookies(worker['driver'])
+        logger.info(f"Vlákno {threading.current_thread().name} vytvořilo driver a začíná zpracování")
+    except Exception as e:
+        logger.error(f"Vlákno {threading.current_thread().name}: Nelze vytvořit driver: {str(e)}")
+    
+    _thread_local.driver = worker['driver']
+
+def browser_task(series_info, writer):
+    """Aktualizuje jednu sérii driverem aktuálního vlákna poolu"""
+    driver = _thread_local.driver
+    if driver is None:
+        raise RuntimeError("Vlákno nemá funkční driver")
+    
+    try:
+        return update_series_selenium(driver, series_info, writer)
+    except Exception:
+        # Zkusit se zotavit - vrátit se na hlavní stránku pro reset session
+        try:
+            driver.get("https://fred.stlouisfed.org/")
+            time.sleep(3)
+        except:
+            pass
+        raise
+
+def close_browser_workers():
+    """Zapíše nezapsaná data kontroly všech vláken poolu a ukončí jejich prohlížeče"""
+    with _browser_workers_lock:
+        workers = list(_browser_workers)
+        _browser_workers.clear()
+    
+    _thread_local.pending = [row for worker in workers for row in worker['pending']]
+    flush_checked()
+    close_connection()
+    
+    for worker in workers:
+        if worker['driver']:
             try:
-                was_updated = update_series_selenium(driver, series_info)
+                worker['driver'].quit()
+            except:
+                pass
+
+async def fetch_text_async(session, url):
+    """Stáhne URL přes aiohttp, při zablokování nebo chybě vrací None"""
+    proxy = f"http://{CONFIG['use_proxy']}" if CONFIG["use_proxy"] else None
+    
+    try:
+        async with session.get(url, proxy=proxy, timeout=aiohttp.ClientTimeout(total=30)) as response:
+            body = await response.text()
+            if response.status != 200 or "Access Denied" in body[:1000]:
+                logger.warning(f"Stažení {url} selhalo (HTTP {response.status})")
+                return None
+            return body
+    except Exception as e:
+        logger.warning(f"Stažení {url} selhalo: {str(e)}")
+        return None
+
+def needs_update(series_info, last_updated_web):
+    """Porovná datum poslední aktualizace z webu s uloženým v databázi"""
+    if 'last_updated' in series_info:
+        # Načteno už se seznamem sérií
+        last_updated_db = series_info['last_updated']
+    else:
+        row = get_connection().execute(
+            "SELECT last_updated FROM series_metadata WHERE series_id = ?", (series_info['series_id'],)
+        ).fetchone()
+        last_updated_db = row[0] if row else None
+    return not last_updated_db or not last_updated_web or last_updated_db != last_updated_web
+
+async def update_series_async(session, semaphore, series_info, db_queue):
+    """Stáhne stránku a CSV jedné série a předá výsledek zapisovači databáze"""
+    series_id = series_info['series_id']
+    
+    try:
+        async with semaphore:
+            await async_random_delay()
+            page_html = await fetch_text_async(session, f"https://fred.stlouisfed.org/series/{series_id}")
+            if page_html is None:
+                await db_queue.put(('failed', series_id))
+                return
+            
+            metadata = build_metadata(series_id, *parse_page_metadata(page_html))
+            
+            # Frekvence a datum poslední aktualizace jsou na stránce série, CSV stačí stáhnout jen při změně
+            if not is_quarterly_or_more_frequent(metadata['frequency']) or \
+                    not (series_info.get('changed') or needs_update(series_info, metadata['last_updated'])):
+                logger.info(f"Série {series_id} nepotřebuje aktualizaci")
+                await db_queue.put(('checked', series_id))
+                return
+            
+            await async_random_delay()
+            csv_text = await fetch_text_async(session, f"https://fred.stlouisfed.org/graph/fredgraph.csv?id={series_id}")
+        
+        data = parse_csv_data(series_id, csv_text) if csv_text is not None else None
+        if data is None:
+            logger.warning(f"Nepodařilo se získat data pro {series_id}")
+            await db_queue.put(('failed', series_id))
+            return
+        
+        metadata['data'] = data
+        await db_queue.put(('store', metadata))
+    
+    except Exception as e:
+        logger.error(f"Chyba při aktualizaci série {series_id}: {str(e)}")
+        await db_queue.put(('failed', series_id))
+
+async def database_writer(db_queue, results, writer):
+    """Jediný zapisovač do databáze - předává výsledky HTTP workerů do vlákna pro zápisy"""
+    loop = asyncio.get_running_loop()
+    progress = count(results['updated'] + results['skipped'] + results['failed'] + 1)
+    
+    # Jedno vlákno pro zápisy, aby drželo jedno připojení a dávku dat kontroly
+    with ThreadPoolExecutor(max_workers=1) as db_thread:
+        try:
+            while True:
+                item = await db_queue.get()
+                if item is None:
+                    break
                 
-                if was_updated:
+                action, payload = item
+                if action == 'checked':
+                    await loop.run_in_executor(db_thread, mark_checked, payload)
+                    results['skipped'] += 1
+                elif action == 'store':
+                    # Plná fronta zapisovače počká ve vlákně, smyčka událostí se neblokuje
+                    await loop.run_in_executor(db_thread, writer.put, payload)
                     results['updated'] += 1
                 else:
-                    results['skipped'] += 1
+                    results['failed'] += 1
                 
                 # Zobrazit průběh
-                if (i + 1) % 10 == 0 or i == len(series_list) - 1:
-                    processed = results['updated'] + results['skipped'] + results['failed']
-                    logger.info(f"Worker {worker_id}: Zpracováno {i+1}/{len(series_list)} sérií "
-                                f"({processed}/{results['total']} celkem)")
+                processed = next(progress)
+                if processed % 10 == 0 or processed == results['total']:
+                    logger.info(f"Zpracováno {processed}/{results['total']} sérií")
+        
+        finally:
+            await loop.run_in_executor(db_thread, flush_checked)
+            await loop.run_in_executor(db_thread, close_connection)
+
+async def update_series_http(series_list, max_workers, results):
+    """Souběžně aktualizuje série přímými HTTP požadavky nad sdíleným poolem spojení"""
+    semaphore = asyncio.Semaphore(max_workers)
+    db_queue = asyncio.Queue(maxsize=max_workers * 4)
+    connector = aiohttp.TCPConnector(limit=max_workers * 4, keepalive_timeout=60)
+    
+    async with aiohttp.ClientSession(connector=connector,
+                                     headers={"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"}) as session:
+        writer = SeriesWriter()
+        writer_task = asyncio.create_task(database_writer(db_queue, results, writer))
+        try:
+            await asyncio.gather(*(update_series_async(session, semaphore, series_info, db_queue)
+                                   for series_info in series_list))
+        finally:
+            await db_queue.put(None)
+            await writer_task
             
+            # Série, které zapisovač nakonec neuložil, nejsou aktualizované
+            failed = await asyncio.get_running_loop().run_in_executor(None, writer.close)
+            results['updated'] -= failed
+            results['failed'] += failed
+    
+    close_connection()
+
+def update_series_browser(series_list, max_workers, results):
+    """Aktualizuje série v poolu vláken, každé vlákno s vlastním driverem"""
+    num_workers = min(max_workers, len(series_list))
+    if num_workers == 0:
+        return
+    
+    writer = SeriesWriter()
+    progress = count(results['updated'] + results['skipped'] + results['failed'] + 1)
+    executor = ThreadPoolExecutor(max_workers=num_workers, initializer=init_browser_worker)
+    futures = {executor.submit(browser_task, series_info, writer): series_info['series_id']
+               for series_info in series_list}
+    
+    try:
+        # Série si postupně berou volná vlákna, celý běh je omezen časovým limitem
+        for future in as_completed(futures, timeout=CONFIG["timeout"]):
+            series_id = futures[future]
+            try:
+                if future.result():
+                    results['updated'] += 1
+                else:
+                    results['skipped'] += 1
             except Exception as e:
                 results['failed'] += 1
-                logger.error(f"Worker {worker_id}: Chyba během aktualizace {series_id}: {str(e)}")
-                
-                # Zkusit se zotavit
-                try:
-                    # Vrátit se na hlavní stránku pro reset session
-                    driver.get("https://fred.stlouisfed.org/")
-                    time.sleep(3)
-                except:
-                    pass
-        
-        logger.info(f"Worker {worker_id} dokončil zpracování {len(series_list)} sérií")
+                logger.error(f"Chyba během aktualizace {series_id}: {str(e)}")
+            
+            # Zobrazit průběh
+            processed = next(progress)
+            if processed % 10 == 0 or processed == results['total']:
+                logger.info(f"Zpracováno {processed}/{results['total']} sérií")
     
-    except Exception as e:
-        logger.error(f"Worker {worker_id}: Kritická chyba: {str(e)}")
+    except FuturesTimeoutError:
+        logger.warning(f"Překročen časový limit {CONFIG['timeout']}s, zbývající série se přeskočí")
     
     finally:
-        if driver:
-            driver.quit()
+        # Nezačaté série zrušit, rozpracované doběhnou
+        executor.shutdown(wait=True, cancel_futures=True)
+        close_browser_workers()
+        
+        # Série, které zapisovač nakonec neuložil, nejsou aktualizované
+        failed = writer.close()
+        results['updated'] -= failed
+        results['failed'] += failed
+
+def parse_fred_timestamp(value):
+    """Převede čas z FRED API (např. '2024-10-11 07:53:02-05') na místní čas bez časové zóny"""
+    return datetime.strptime(value + '00', '%Y-%m-%d %H:%M:%S%z').astimezone().replace(tzinfo=None)
+
+def fetch_recent_updates(oldest_check):
+    """Stáhne z FRED API časy posledních aktualizací, vrací ({série: čas}, nejstarší čas), nebo (None, None)"""
+    updated = {}
+    window_start = None
+    
+    for page in range(CONFIG["prefilter_max_pages"]):
+        try:
+            response = SESSION.get(FRED_API_UPDATES_URL, timeout=30, params={
+                'api_key': CONFIG["api_key"], 'file_type': 'json', 'limit': 1000, 'offset': page * 1000
+            })
+            response.raise_for_status()
+            seriess = response.json().get('seriess', [])
+        except Exception as e:
+            # Text výjimek requests obsahuje URL dotazu včetně api_key - logovat jen typ a HTTP status
+            status = getattr(getattr(e, 'response', None), 'status_code', None)
+            logger.error(f"Chyba při stahování seznamu změn z FRED API: {type(e).__name__}"
+                         + (f" (HTTP {status})" if status else ""))
+            return None, None
+        
+        for item in seriess:
+            updated.setdefault(item['id'], parse_fred_timestamp(item['last_updated']))
+        
+        # Seznam je seřazený od nejnovějších - změny známe úplně od posledního času na stránce
+        if seriess:
+            window_start = parse_fred_timestamp(seriess[-1]['last_updated'])
+        if len(seriess) < 1000 or window_start is None or window_start <= oldest_check:
+            break
+    
+    return updated, window_start
+
+def prefilter_series(series_list, results):
+    """Jedním seznamem změn z FRED API vyřadí série, které se od poslední kontroly nezměnily"""
+    if not CONFIG["api_key"]:
+        return series_list
+    
+    # Nejstarší poslední kontrola - dál do historie změn není třeba stránkovat
+    checked = []
+    for series_info in series_list:
+        try:
+            checked.append(datetime.fromisoformat(series_info.get('last_checked')))
+        except (ValueError, TypeError):
+            pass
+    if not checked:
+        return series_list
+    
+    updated, window_start = fetch_recent_updates(min(checked))
+    if window_start is None:
+        return series_list
+    
+    to_update = []
+    unchanged = []
+    for series_info in series_list:
+        try:
+            last_checked = datetime.fromisoformat(series_info.get('last_checked'))
+        except (ValueError, TypeError):
+            last_checked = None
+        
+        series_id = series_info['series_id']
+        if last_checked is None or last_checked < window_start:
+            # Kontrola je starší než známá historie změn, nelze rozhodnout
+            to_update.append(series_info)
+        elif series_id in updated and updated[series_id] > last_checked:
+            # Změna potvrzená API - kontrolu na webu lze vynechat
+            to_update.append(dict(series_info, changed=True))
+        else:
+            unchanged.append(series_id)
+    
+    # Nezměněné série jsou zkontrolované k dnešku
+    for series_id in unchanged:
+        mark_checked(series_id)
+    flush_checked()
+    close_connection()
+    results['skipped'] += len(unchanged)
+    
+    logger.info(f"Podle FRED API se změnilo nebo nelze posoudit {len(to_update)} sérií, "
+                f"{len(unchanged)} je aktuálních")
+    return to_update
 
 def parallel_update_series_with_workers(max_workers=None, limit=None):
-    """Paralelní aktualizace sérií s více workery, každý s vlastním driverem"""
+    """Paralelní aktualizace sérií - přímo přes HTTP, nebo s více workery, každý s vlastním driverem"""
     if max_workers is None:
         max_workers = CONFIG["max_workers"]
     
@@ -369,26 +844,22 @@ def parallel_update_series_with_workers(max_workers=None, limit=None):
         'failed': 0
     }
     
-    # Rozdělit série mezi workery
-    worker_series = []
-    series_per_worker = (len(series_list) + max_workers - 1) // max_workers
+    # Série beze změny vyřadit ještě před spuštěním prohlížečů nebo stahováním stránek
+    series_list = prefilter_series(series_list, results)
     
-    for i in range(0, len(series_list), series_per_worker):
-        worker_series.append(series_list[i:i+series_per_worker])
+    if CONFIG["bulk_load"]:
+        begin_bulk_load(get_connection())
     
-    # Spustit worker vlákna
-    threads = []
-    for i, series_batch in enumerate(worker_series):
-        thread = threading.Thread(
-            target=driver_worker,
-            args=(i, series_batch, results)
-        )
-        threads.append(thread)
-        thread.start()
+    try:
+        if CONFIG["use_browser"]:
+            update_series_browser(series_list, max_workers, results)
+        else:
+            asyncio.run(update_series_http(series_list, max_workers, results))
     
-    # Čekat na dokončení všech vláken
-    for thread in threads:
-        thread.join()
+    finally:
+        if CONFIG["bulk_load"]:
+            end_bulk_load(get_connection())
+            close_connection()
     
     # Závěrečná zpráva
     elapsed = time.time() - start_time
@@ -402,6 +873,13 @@ def parallel_update_series(max_workers=None, limit=None):
     """Zpětná kompatibilita s původní funkcí"""
     return parallel_update_series_with_workers(max_workers, limit)
 
+def log_daily_update(status, message):
+    """Zaznamená výsledek denní aktualizace do update_log přes připojení vlákna"""
+    get_connection().execute(
+        "INSERT INTO update_log (timestamp, series_id, action, status, message) VALUES (?, ?, ?, ?, ?)",
+        (datetime.now().isoformat(), 'SYSTEM', 'DAILY_UPDATE', status, message)
+    )
+
 def schedule_daily_update():
     """Funkce pro plánování denních aktualizací (lze použít s cron nebo scheduled tasks)"""
     logger.info("Zahajuji denní aktualizaci FRED dat")
@@ -432,21 +910,8 @@ def schedule_daily_update():
         )
         
         # Zaznamenat výsledky
-        conn = sqlite3.connect(CONFIG["db_file"])
-        cursor = conn.cursor()
-        cursor.execute('''
-        INSERT INTO update_log 
-        (timestamp, series_id, action, status, message)
-        VALUES (?, ?, ?, ?, ?)
-        ''', (
-            datetime.now().isoformat(),
-            'SYSTEM',
-            'DAILY_UPDATE',
-            'SUCCESS',
-            f"Aktualizováno: {results['updated']}, Přeskočeno: {results['skipped']}, Chyba: {results['failed']}"
-        ))
-        conn.commit()
-        conn.close()
+        log_daily_update('SUCCESS', f"Aktualizováno: {results['updated']}, Přeskočeno: {results['skipped']}, "
+                                    f"Chyba: {results['failed']}")
         
         return True
     
@@ -455,25 +920,14 @@ def schedule_daily_update():
         
         # Zaznamenat chybu
         try:
-            conn = sqlite3.connect(CONFIG["db_file"])
-            cursor = conn.cursor()
-            cursor.execute('''
-            INSERT INTO update_log 
-            (timestamp, series_id, action, status, message)
-            VALUES (?, ?, ?, ?, ?)
-            ''', (
-                datetime.now().isoformat(),
-                'SYSTEM',
-                'DAILY_UPDATE',
-                'ERROR',
-                str(e)
-            ))
-            conn.commit()
-            conn.close()
+            log_daily_update('ERROR', str(e))
         except:
             pass
         
         return False
+    
+    finally:
+        close_connection()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Aktualizace FRED dat')
@@ -482,6 +936,9 @@ if __name__ == "__main__":
     parser.add_argument('--db-file', type=str, help='Cesta k databázovému souboru')
     parser.add_argument('--proxy', type=str, help='Proxy server (volitelné)')
     parser.add_argument('--delay', type=float, help='Základní zpoždění mezi požadavky')
+    parser.add_argument('--browser', action='store_true', help='Stahovat v prohlížeči (Selenium) místo přímých HTTP požadavků')
+    parser.add_argument('--api-key', type=str, help='Klíč k FRED API pro hromadné zjištění změněných sérií (výchozí: proměnná FRED_API_KEY)')
+    parser.add_argument('--bulk-load', action='store_true', help='Po dobu běhu odstranit index podle data (rychlejší velké načtení)')
     
     args = parser.parse_args()
     
@@ -499,6 +956,15 @@ if __name__ == "__main__":
         CONFIG["min_delay"] = args.delay
         CONFIG["max_delay"] = args.delay * 2
     
+    if args.browser:
+        CONFIG["use_browser"] = True
+    
+    if args.api_key:
+        CONFIG["api_key"] = args.api_key
+    
+    if args.bulk_load:
+        CONFIG["bulk_load"] = True
+    
     # Spustit aktualizaci
     if args.limit:
         parallel_update_series(
@@ -7,8 +7,17 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+import requests
+import asyncio
+import aiohttp
+from lxml import html as lxml_html
 import time
 import random
+import threading
+import atexit
+from queue import Queue, Empty
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 # Nastavení logování
 logging.basicConfig(
@@ -28,164 +37,360 @@ CONFIG = {
     "max_delay": 3.0,
     "page_load_timeout": 30,
     "retry_limit": 3,
-    "use_proxy": None
+    "use_proxy": None,
+    "check_concurrency": 10,  # max. souběžných HTTP požadavků při kontrole aktualizací
+    "query_chunk_size": 500,  # max. počet series_id v jednom dotazu IN (...)
+    "log_batch_size": 100,  # max. počet záznamů update_log v jednom zápisu
+    "log_flush_interval": 0.1,  # max. čekání (s) na doplnění dávky záznamů update_log
+    "df_chunk_size": 300  # řádků v jednom INSERT ... VALUES (3 parametry na řádek, limit SQLite 999)
 }
 
+# Nastavení připojení - WAL se v souboru databáze drží trvale, ostatní platí pro každé připojení
+CONNECTION_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA mmap_size=268435456;
+PRAGMA cache_size=-64000;
+"""
+
+def _connect():
+    """Otevře SQLite připojení s nastavením pro rychlé zápisy a souběžné čtení"""
+    # Autocommit - transakce se řídí explicitně příkazy BEGIN/COMMIT
+    conn = sqlite3.connect(CONFIG["db_file"], isolation_level=None, check_same_thread=False)
+    conn.executescript(CONNECTION_PRAGMAS)
+    return conn
+
+# Připojení otevřená v jednotlivých vláknech, drží se po celou dobu běhu
+_thread_local = threading.local()
+_connections = []
+_connections_lock = threading.Lock()
+
+# SQLite zapisuje vždy jen jedním připojením, zápisy se řadí tímto zámkem
+_write_lock = threading.Lock()
+
+def _get_conn():
+    """Vrátí SQLite připojení aktuálního vlákna, při prvním použití ho otevře"""
+    conn = getattr(_thread_local, 'conn', None)
+    if conn is None:
+        conn = _connect()
+        _thread_local.conn = conn
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+@atexit.register
+def close_connections():
+    """Uzavře všechna připojení otevřená v jednotlivých vláknech"""
+    with _connections_lock:
+        for conn in _connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        _connections.clear()
+
+# Záznamy do update_log zapisuje po dávkách samostatné vlákno mimo transakce s daty
+_log_queue = Queue()
+
+# Vkládání záznamu do update_log - stejný text příkazu pro všechny dávky
+INSERT_LOG_SQL = "INSERT INTO update_log (timestamp, series_id, action, status, message) VALUES (?, ?, ?, ?, ?)"
+
+def log_update(series_id, action, status, message, timestamp=None):
+    """Zařadí záznam do update_log, zapíše ho vlákno zapisovače"""
+    _log_queue.put((timestamp or datetime.now().isoformat(), series_id, action, status, message))
+
+def _log_writer():
+    """Sbírá záznamy z fronty a zapisuje je do update_log po dávkách"""
+    running = True
+    while running:
+        item = _log_queue.get()
+        if item is None:
+            break
+        
+        batch = [item]
+        deadline = time.monotonic() + CONFIG["log_flush_interval"]
+        while len(batch) < CONFIG["log_batch_size"]:
+            try:
+                item = _log_queue.get(timeout=max(0, deadline - time.monotonic()))
+            except Empty:
+                break
+            if item is None:
+                running = False
+                break
+            batch.append(item)
+        
+        # Připojení je v autocommit režimu - celá dávka v jedné explicitní transakci, jeden commit
+        try:
+            with _write_lock:
+                conn = _get_conn()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.executemany(INSERT_LOG_SQL, batch)
+                    conn.execute("COMMIT")
+                except Exception:
+                    if conn.in_transaction:
+                        conn.execute("ROLLBACK")
+                    raise
+        except Exception as e:
+            logger.error(f"Chyba při zápisu {len(batch)} záznamů do update_log: {str(e)}")
+
+_log_thread = threading.Thread(target=_log_writer, name="update-log-writer", daemon=True)
+_log_thread.start()
+
+@atexit.register
+def flush_update_log():
+    """Zapíše zbývající záznamy update_log a ukončí vlákno zapisovače"""
+    if _log_thread.is_alive():
+        _log_queue.put(None)
+        _log_thread.join()
+
+# Schéma databáze optimalizované pro časové řady
+SCHEMA_SQL = """
+BEGIN;
+
+-- Tabulka pro metadata sérií
+CREATE TABLE IF NOT EXISTS series_metadata (
+    series_id TEXT PRIMARY KEY,
+    title TEXT,
+    frequency TEXT,
+    units TEXT,
+    seasonal_adjustment TEXT,
+    last_updated TEXT,
+    last_checked TEXT,
+    source TEXT,
+    data_source TEXT,
+    notes TEXT
+);
+
+-- Tabulka pro hodnoty sérií - hlavní tabulka dat
+-- WITHOUT ROWID: řádky jsou přímo ve stromu primárního klíče, klíč se neukládá podruhé v indexu
+CREATE TABLE IF NOT EXISTS series_values (
+    series_id TEXT,
+    date TEXT,
+    value REAL,
+    PRIMARY KEY (series_id, date)
+) WITHOUT ROWID;
+
+-- Tabulka pro sledování aktualizací
+CREATE TABLE IF NOT EXISTS update_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT,
+    series_id TEXT,
+    action TEXT,
+    status TEXT,
+    message TEXT
+);
+
+-- Indexy pro rychlejší vyhledávání
+CREATE INDEX IF NOT EXISTS idx_series_values_date ON series_values (date);
+
+-- Vyhledání podle series_id pokrývá primární klíč (series_id, date), samostatný index jen zpomaluje zápisy
+DROP INDEX IF EXISTS idx_series_values_series_id;
+
+COMMIT;
+"""
+
 def create_database(db_file=None):
     """Vytvoří strukturu databáze optimalizovanou pro časové řady"""
     if db_file:
         CONFIG["db_file"] = db_file
         
-    conn = sqlite3.connect(CONFIG["db_file"])
-    cursor = conn.cursor()
-    
-    # Tabulka pro metadata sérií
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS series_metadata (
-        series_id TEXT PRIMARY KEY,
-        title TEXT,
-        frequency TEXT,
-        units TEXT,
-        seasonal_adjustment TEXT,
-        last_updated TEXT,
-        last_checked TEXT,
-        source TEXT,
-        data_source TEXT,
-        notes TEXT
-    )
-    ''')
-    
-    # Tabulka pro hodnoty sérií - hlavní tabulka dat
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS series_values (
-        series_id TEXT,
-        date TEXT,
-        value REAL,
-        PRIMARY KEY (series_id, date)
-    )
-    ''')
-    
-    # Tabulka pro sledování aktualizací
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS update_log (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT,
-        series_id TEXT,
-        action TEXT,
-        status TEXT,
-        message TEXT
-    )
-    ''')
-    
-    # Indexy pro rychlejší vyhledávání
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_series_values_date ON series_values (date)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_series_values_series_id ON series_values (series_id)')
-    
-    conn.commit()
+    # WAL a další nastavení už nastavilo připojení, celé schéma vytvořit jednou transakcí
+    conn = _connect()
+    conn.executescript(SCHEMA_SQL)
     conn.close()
     logger.info(f"Databáze úspěšně inicializována v souboru {CONFIG['db_file']}")
     return True
 
+def begin_bulk_load(conn=None):
+    """Před hromadným načítáním odstraní index podle data, aby se neaktualizoval s každým řádkem"""
+    # Dotazy na časová období (a get_series_stats) do end_bulk_load() nespouštět - index chybí
+    (conn or _get_conn()).execute("DROP INDEX IF EXISTS idx_series_values_date")
+    logger.info("Index idx_series_values_date odstraněn pro hromadné načítání")
+
+def end_bulk_load(conn=None):
+    """Po hromadném načítání znovu vytvoří index podle data a obnoví statistiky plánovače"""
+    (conn or _get_conn()).executescript("""
+    CREATE INDEX IF NOT EXISTS idx_series_values_date ON series_values (date);
+    ANALYZE;
+    """)
+    logger.info("Index idx_series_values_date znovu vytvořen")
+
+# Metadata aktualizovat na místě (upsert), INSERT OR REPLACE by řádek smazal a vložil znovu
+UPSERT_METADATA_SQL = '''
+INSERT INTO series_metadata
+(series_id, title, frequency, units, seasonal_adjustment, last_updated, 
+ last_checked, source, data_source)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(series_id) DO UPDATE SET
+    title = excluded.title,
+    frequency = excluded.frequency,
+    units = excluded.units,
+    seasonal_adjustment = excluded.seasonal_adjustment,
+    last_updated = excluded.last_updated,
+    last_checked = excluded.last_checked,
+    source = excluded.source,
+    data_source = excluded.data_source
+'''
+
 def store_series(series_data):
     """Uloží data série do databáze"""
     if not series_data or 'series_id' not in series_data:
         return False
     
-    try:
-        conn = sqlite3.connect(CONFIG["db_file"])
-        cursor = conn.cursor()
-        
-        # Uložit metadata
-        cursor.execute('''
-        INSERT OR REPLACE INTO series_metadata
-        (series_id, title, frequency, units, seasonal_adjustment, last_updated, 
-         last_checked, source, data_source)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            series_data['series_id'],
-            series_data.get('title', ''),
-            series_data.get('frequency', ''),
-            series_data.get('units', ''),
-            series_data.get('seasonal_adjustment', ''),
-            series_data.get('last_updated', ''),
-            datetime.now().isoformat(),
-            series_data.get('source', 'FRED'),
-            series_data.get('data_source', '')
-        ))
-        
-        # Uložit hodnoty
-        if 'data' in series_data and series_data['data']:
-            for point in series_data['data']:
+    series_id = series_data['series_id']
+    now = datetime.now().isoformat()
+    data = series_data.get('data') or ()
+    
+    # Zápisy z více vláken řadit za sebe, SQLite má vždy jen jednoho zapisovatele
+    with _write_lock:
+        try:
+            conn = _get_conn()
+            cursor = conn.cursor()
+            
+            # Celou sérii zapsat jednou transakcí
+            cursor.execute("BEGIN IMMEDIATE")
+            
+            # Uložit metadata
+            cursor.execute(UPSERT_METADATA_SQL, (
+                series_id,
+                series_data.get('title', ''),
+                series_data.get('frequency', ''),
+                series_data.get('units', ''),
+                series_data.get('seasonal_adjustment', ''),
+                series_data.get('last_updated', ''),
+                now,
+                series_data.get('source', 'FRED'),
+                series_data.get('data_source', '')
+            ))
+            
+            # Uložit hodnoty jedním dávkovým příkazem
+            if data:
+                rows = [(series_id, point['date'], point['value']) for point in data]
                 try:
-                    cursor.execute('''
+                    cursor.executemany('''
                     INSERT OR REPLACE INTO series_values (series_id, date, value)
                     VALUES (?, ?, ?)
-                    ''', (
-                        series_data['series_id'],
-                        point['date'],
-                        point['value']
-                    ))
-                except Exception as e:
-                    logger.error(f"Chyba při ukládání hodnoty {point} pro {series_data['series_id']}: {str(e)}")
-        
-        # Zaznamenat aktualizaci
-        data_count = len(series_data.get('data', []))
-        cursor.execute('''
-        INSERT INTO update_log (timestamp, series_id, action, status, message)
-        VALUES (?, ?, ?, ?, ?)
-        ''', (
-            datetime.now().isoformat(),
-            series_data['series_id'],
-            'UPDATE',
-            'SUCCESS',
-            f"Aktualizováno s {data_count} datovými body"
-        ))
-        
-        conn.commit()
-        conn.close()
-        
-        logger.info(f"Série {series_data['series_id']} úspěšně uložena s {data_count} hodnotami")
-        return True
-    except Exception as e:
-        logger.error(f"Chyba při ukládání série {series_data['series_id']}: {str(e)}")
-        
+                    ''', rows)
+                except sqlite3.Error as e:
+                    # Dávka selhala - uložit po jedné, aby se ztratily jen chybné hodnoty
+                    logger.error(f"Chyba při dávkovém ukládání hodnot pro {series_id}: {str(e)}, ukládám jednotlivě")
+                    for row in rows:
+                        try:
+                            cursor.execute('''
+                            INSERT OR REPLACE INTO series_values (series_id, date, value)
+                            VALUES (?, ?, ?)
+                            ''', row)
+                        except sqlite3.Error as e:
+                            logger.error(f"Chyba při ukládání hodnoty {row[1:]} pro {series_id}: {str(e)}")
+            
+            data_count = len(data)
+            cursor.execute("COMMIT")
+            
+            # Zaznamenat aktualizaci
+            log_update(series_id, 'UPDATE', 'SUCCESS', f"Aktualizováno s {data_count} datovými body", now)
+            
+            logger.info(f"Série {series_id} úspěšně uložena s {data_count} hodnotami")
+            return True
+        except Exception as e:
+            logger.error(f"Chyba při ukládání série {series_id}: {str(e)}")
+            
+            try:
+                # Vrátit rozpracované zápisy a zaznamenat chybu
+                conn = _get_conn()
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            except:
+                pass
+            
+            log_update(series_id, 'UPDATE', 'ERROR', str(e), now)
+            
+            return False
+
+def store_series_df(series_id, metadata, df):
+    """Uloží sérii z DataFrame se sloupci date a value víceřádkovými INSERT příkazy"""
+    now = datetime.now().isoformat()
+    
+    # Stejný tvar jako hodnoty ze store_series - datum jako text YYYY-MM-DD, bez chybějících hodnot
+    values = df[['date', 'value']].dropna(subset=['value'])
+    values = values.assign(
+        series_id=series_id,
+        date=pd.to_datetime(values['date']).dt.strftime('%Y-%m-%d')
+    )[['series_id', 'date', 'value']]
+    
+    with _write_lock:
         try:
-            # Zaznamenat chybu
-            conn = sqlite3.connect(CONFIG["db_file"])
+            conn = _get_conn()
             cursor = conn.cursor()
-            cursor.execute('''
-            INSERT INTO update_log (timestamp, series_id, action, status, message)
-            VALUES (?, ?, ?, ?, ?)
-            ''', (
-                datetime.now().isoformat(),
-                series_data['series_id'],
-                'UPDATE',
-                'ERROR',
-                str(e)
+            cursor.execute("BEGIN IMMEDIATE")
+            
+            # Uložit metadata
+            cursor.execute(UPSERT_METADATA_SQL, (
+                series_id,
+                metadata.get('title', ''),
+                metadata.get('frequency', ''),
+                metadata.get('units', ''),
+                metadata.get('seasonal_adjustment', ''),
+                metadata.get('last_updated', ''),
+                now,
+                metadata.get('source', 'FRED'),
+                metadata.get('data_source', '')
             ))
-            conn.commit()
-            conn.close()
-        except:
-            pass
-        
-        return False
+            
+            if len(values):
+                # Nahradit překrývající se období - to_sql umí jen připojovat
+                cursor.execute(
+                    "DELETE FROM series_values WHERE series_id = ? AND date BETWEEN ? AND ?",
+                    (series_id, values['date'].min(), values['date'].max())
+                )
+                
+                # pandas po zápisu sám potvrdí celou transakci včetně metadat a mazání
+                values.to_sql('series_values', conn, if_exists='append', index=False,
+                              chunksize=CONFIG["df_chunk_size"], method='multi')
+            
+            if conn.in_transaction:
+                cursor.execute("COMMIT")
+            
+            log_update(series_id, 'UPDATE', 'SUCCESS', f"Aktualizováno s {len(values)} datovými body", now)
+            logger.info(f"Série {series_id} úspěšně uložena s {len(values)} hodnotami")
+            return True
+        except Exception as e:
+            logger.error(f"Chyba při ukládání série {series_id}: {str(e)}")
+            
+            try:
+                conn = _get_conn()
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            except:
+                pass
+            
+            log_update(series_id, 'UPDATE', 'ERROR', str(e), now)
+            
+            return False
 
 def get_latest_date_in_db(series_id):
     """Získá poslední datum v databázi pro danou sérii"""
-    conn = sqlite3.connect(CONFIG["db_file"])
+    conn = _get_conn()
     cursor = conn.cursor()
     
     cursor.execute(
-        "SELECT MAX(date) FROM series_values WHERE series_id = ?", 
+        "SELECT date FROM series_values WHERE series_id = ? ORDER BY date DESC LIMIT 1", 
         (series_id,)
     )
     result = cursor.fetchone()
-    conn.close()
     
     if result and result[0]:
         return result[0]
     return None
 
+# Stejný user agent jako prohlížeč
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15"
+
+# Sdílená HTTP session pro kontrolu aktualizací - spojení se znovu používá
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"})
+
 def create_driver():
     """Vytvoří WebDriver s vlastnostmi pro obcházení detekce"""
     options = webdriver.ChromeOptions()
@@ -197,7 +402,7 @@ def create_driver():
     options.add_argument("--disable-infobars")
     
     # Realistický user agent
-    options.add_argument("--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.0 Safari/605.1.15")
+    options.add_argument(f"--user-agent={USER_AGENT}")
     
     # Přidat proxy, pokud je specifikována
     if CONFIG["use_proxy"]:
@@ -255,137 +460,310 @@ def safe_get_url(driver, url, max_retries=3):
     
     return False
 
-def check_if_needs_update_selenium(series_id, driver=None):
-    """Kontroluje pomocí Selenia, zda série potřebuje aktualizaci"""
+# Kód frekvence podle části názvu - 'biweekly' musí být před 'weekly', které obsahuje
+FREQUENCY_CODES = (
+    ('daily', 'D'),
+    ('biweekly', 'B'),
+    ('weekly', 'W'),
+    ('monthly', 'M'),
+    ('quarterly', 'Q')
+)
+
+# Po kolika dnech kontrolovat sérii dané frekvence
+CHECK_INTERVAL_DAYS = {'D': 1, 'W': 1, 'B': 2, 'M': 2, 'Q': 7}
+
+# Stejný interval jako výraz SQL, aby get_series_to_update vracela jen série, u kterých uplynul
+CHECK_INTERVAL_SQL = "CASE {} ELSE 1 END".format(" ".join(
+    f"WHEN frequency LIKE '%{name}%' THEN {CHECK_INTERVAL_DAYS[code]}" for name, code in FREQUENCY_CODES
+))
+
+@lru_cache(maxsize=None)
+def frequency_code(frequency):
+    """Převede název frekvence na jednopísmenný kód, u neznámé vrací ''"""
+    freq_lower = frequency.lower() if frequency else ''
+    return next((code for name, code in FREQUENCY_CODES if name in freq_lower), '')
+
+def needs_web_check(last_checked, frequency, now):
+    """Podle frekvence a data poslední kontroly rozhodne, zda je třeba ověřit sérii na webu"""
+    try:
+        last_checked_date = datetime.fromisoformat(last_checked)
+    except (ValueError, TypeError):
+        # Neplatné datum, aktualizujeme
+        return True
+    
+    # Zkontrolovat podle frekvence, jak často bychom měli kontrolovat
+    interval = CHECK_INTERVAL_DAYS.get(frequency_code(frequency), 1)
+    
+    # Pokud jsme nedávno kontrolovali, není potřeba aktualizovat
+    return (now - last_checked_date).days >= interval
+
+def parse_last_updated(page_html):
+    """Vytáhne 'last updated' z HTML stránky série, vrací hodnotu nebo None"""
+    tree = lxml_html.fromstring(page_html)
+    for label in tree.xpath('//span[@class="series-meta-label"]'):
+        if 'last updated' in label.text_content().lower():
+            value = label.xpath('string(following-sibling::span[@class="series-meta-value"][1])').strip()
+            return value or None
+    
+    # Alternativní zápis v textu položky metadat
+    for item in tree.xpath('//*[contains(@class, "series-meta-item")]'):
+        item_text = item.text_content()
+        if "Last Updated:" in item_text:
+            return item_text.split("Last Updated:", 1)[1].strip()
+    
+    return None
+
+def fetch_last_updated_http(series_id):
+    """Zjistí 'last updated' ze stránky série přes HTTP, vrací (stránka načtena, hodnota nebo None)"""
+    url = f"https://fred.stlouisfed.org/series/{series_id}"
+    proxies = {"https": f"http://{CONFIG['use_proxy']}"} if CONFIG["use_proxy"] else None
+    
+    try:
+        response = SESSION.get(url, timeout=CONFIG["page_load_timeout"], proxies=proxies)
+        if response.status_code != 200 or "Access Denied" in response.text[:1000]:
+            logger.warning(f"Přímé načtení {url} selhalo (HTTP {response.status_code}), zkouším prohlížeč")
+            return False, None
+        return True, parse_last_updated(response.content)
+    
+    except Exception as e:
+        logger.warning(f"Přímé načtení {url} selhalo: {str(e)}, zkouším prohlížeč")
+        return False, None
+
+# Vrátí hodnotu 'last updated' ze stránky série (popisek a sousední hodnota, jinak text položky metadat)
+LAST_UPDATED_SCRIPT = """
+var labels = document.querySelectorAll('span.series-meta-label');
+for (var i = 0; i < labels.length; i++) {
+    if (labels[i].textContent.toLowerCase().indexOf('last updated') !== -1) {
+        var value = labels[i].nextElementSibling;
+        if (value && value.classList.contains('series-meta-value') && value.textContent.trim()) {
+            return value.textContent.trim();
+        }
+    }
+}
+var items = document.querySelectorAll('.series-meta-item');
+for (var j = 0; j < items.length; j++) {
+    var text = items[j].innerText;
+    if (text.indexOf('Last Updated:') !== -1) {
+        return text.split('Last Updated:')[1].trim();
+    }
+}
+return null;
+"""
+
+def fetch_last_updated_selenium(series_id, driver):
+    """Zjistí 'last updated' ze stránky série v prohlížeči, vrací (stránka načtena, hodnota nebo None)"""
+    url = f"https://fred.stlouisfed.org/series/{series_id}"
+    
+    if not safe_get_url(driver, url):
+        return False, None
+    
+    # Najít datum poslední aktualizace na webu - jeden dotaz do stránky místo hledání prvek po prvku
+    try:
+        return True, driver.execute_script(LAST_UPDATED_SCRIPT) or None
+    
+    except Exception as e:
+        logger.error(f"Chyba při hledání 'last updated' pro {series_id}: {str(e)}")
+        return True, None
+
+def compare_last_updated(series_id, last_updated_web, last_updated_db):
+    """Porovná 'last updated' z webu s hodnotou z databáze, vrací True, pokud série potřebuje aktualizaci"""
+    if last_updated_web and last_updated_db:
+        # Porovnat data - pokud se liší, potřebujeme aktualizaci
+        needs_update = last_updated_web != last_updated_db
+        
+        if needs_update:
+            logger.info(f"Série {series_id} potřebuje aktualizaci: web={last_updated_web}, db={last_updated_db}")
+        else:
+            logger.info(f"Série {series_id} je aktuální")
+        
+        return needs_update
+    
+    # Pokud nemůžeme určit, raději aktualizujeme
+    logger.warning(f"Nelze určit 'last updated' pro {series_id}, raději aktualizuji")
+    return True
+
+def verify_on_web(series_id, last_updated_db, driver=None):
+    """Ověří na webu, zda se série od uložené poslední aktualizace změnila"""
     should_close_driver = False
     
     try:
-        conn = sqlite3.connect(CONFIG["db_file"])
+        # Metadata jsou ve stránce přímo ze serveru, prohlížeč jen pokud FRED HTTP požadavek odmítne
+        loaded, last_updated_web = fetch_last_updated_http(series_id)
+        
+        if not loaded:
+            # Vytvořit driver, pokud nebyl předán
+            if driver is None:
+                driver = create_driver()
+                should_close_driver = True
+            loaded, last_updated_web = fetch_last_updated_selenium(series_id, driver)
+        
+        if not loaded:
+            logger.error(f"Nepodařilo se načíst stránku pro {series_id}")
+            return True  # V případě chyby raději aktualizujeme
+        
+        return compare_last_updated(series_id, last_updated_web, last_updated_db)
+    
+    except Exception as e:
+        logger.error(f"Chyba při kontrole, zda {series_id} potřebuje aktualizaci: {str(e)}")
+        return True
+    
+    finally:
+        # Zavřít driver, pokud jsme ho vytvořili zde
+        if should_close_driver and driver:
+            driver.quit()
+
+def check_if_needs_update_selenium(series_id, driver=None):
+    """Kontroluje, zda série potřebuje aktualizaci (přes HTTP, při odmítnutí pomocí Selenia)"""
+    try:
+        conn = _get_conn()
         cursor = conn.cursor()
         
-        # Získat datum poslední kontroly a frekvenci
+        # Získat datum poslední kontroly, frekvenci a poslední aktualizaci
         cursor.execute(
-            "SELECT last_checked, frequency FROM series_metadata WHERE series_id = ?", 
+            "SELECT last_checked, frequency, last_updated FROM series_metadata WHERE series_id = ?", 
             (series_id,)
         )
         result = cursor.fetchone()
         
         if not result:
             # Nemáme žádné záznamy, potřebujeme stáhnout
-            conn.close()
             return True
         
-        last_checked, frequency = result
-        
-        try:
-            last_checked_date = datetime.fromisoformat(last_checked)
-        except (ValueError, TypeError):
-            # Neplatné datum, aktualizujeme
-            conn.close()
-            return True
-        
-        now = datetime.now()
-        
-        # Zkontrolovat podle frekvence, jak často bychom měli kontrolovat
-        check_interval_days = {
-            'Daily': 1,
-            'Weekly': 1,
-            'Biweekly': 2,
-            'Monthly': 2,
-            'Quarterly': 7
-        }
-        
-        # Získat interval
-        freq_lower = frequency.lower() if frequency else ''
-        interval = 1  # default
-        
-        for key, value in check_interval_days.items():
-            if key.lower() in freq_lower:
-                interval = value
-                break
+        last_checked, frequency, last_updated_db = result
         
-        # Pokud jsme nedávno kontrolovali, není potřeba aktualizovat
-        if (now - last_checked_date).days < interval:
-            conn.close()
+        if not needs_web_check(last_checked, frequency, datetime.now()):
             return False
-        
-        conn.close()
-        
-        # Jinak jdeme na web a kontrolujeme, zda došlo k aktualizaci
-        # Vytvořit driver, pokud nebyl předán
-        if driver is None:
-            driver = create_driver()
-            should_close_driver = True
-        
-        url = f"https://fred.stlouisfed.org/series/{series_id}"
-        
-        if not safe_get_url(driver, url):
-            logger.error(f"Nepodařilo se načíst stránku pro {series_id}")
-            return True  # V případě chyby raději aktualizujeme
-        
-        # Najít datum poslední aktualizace na webu
-        try:
-            meta_labels = driver.find_elements(By.CSS_SELECTOR, 'span.series-meta-label')
-            
-            last_updated_web = None
-            for label_elem in meta_labels:
-                if 'last updated' in label_elem.text.lower():
-                    try:
-                        value_elem = label_elem.find_element(By.XPATH, "following-sibling::span[@class='series-meta-value']")
-                        last_updated_web = value_elem.text.strip() if value_elem else None
-                        break
-                    except:
-                        pass
-            
-            if not last_updated_web:
-                # Zkusit alternativní způsob
-                meta_items = driver.find_elements(By.CSS_SELECTOR, '.series-meta-item')
-                for item in meta_items:
-                    item_text = item.text
-                    if "Last Updated:" in item_text:
-                        last_updated_web = item_text.split("Last Updated:", 1)[1].strip()
-                        break
-            
-            if last_updated_web:
-                # Získat poslední datum aktualizace v databázi
-                conn = sqlite3.connect(CONFIG["db_file"])
-                cursor = conn.cursor()
-                cursor.execute(
-                    "SELECT last_updated FROM series_metadata WHERE series_id = ?", 
-                    (series_id,)
-                )
-                result = cursor.fetchone()
-                conn.close()
-                
-                if result and result[0]:
-                    last_updated_db = result[0]
-                    
-                    # Porovnat data - pokud se liší, potřebujeme aktualizaci
-                    needs_update = last_updated_web != last_updated_db
-                    
-                    if needs_update:
-                        logger.info(f"Série {series_id} potřebuje aktualizaci: web={last_updated_web}, db={last_updated_db}")
-                    else:
-                        logger.info(f"Série {series_id} je aktuální")
-                    
-                    return needs_update
-            
-            # Pokud nemůžeme určit, raději aktualizujeme
-            logger.warning(f"Nelze určit 'last updated' pro {series_id}, raději aktualizuji")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Chyba při hledání 'last updated' pro {series_id}: {str(e)}")
-            return True
     
     except Exception as e:
         logger.error(f"Chyba při kontrole, zda {series_id} potřebuje aktualizaci: {str(e)}")
         return True
     
+    # Jinak jdeme na web a kontrolujeme, zda došlo k aktualizaci
+    return verify_on_web(series_id, last_updated_db, driver)
+
+def filter_needing_update(series_ids):
+    """Jedním dotazem (po dávkách) vyřadí série rozhodnutelné bez webu, vrací (výsledky, {series_id: uložená last_updated})"""
+    conn = _get_conn()
+    now = datetime.now()
+    results = {}
+    to_verify = {}
+    rows = {}
+    
+    for i in range(0, len(series_ids), CONFIG["query_chunk_size"]):
+        chunk = series_ids[i:i + CONFIG["query_chunk_size"]]
+        placeholders = ','.join('?' * len(chunk))
+        for series_id, last_checked, frequency, last_updated in conn.execute(
+                f"SELECT series_id, last_checked, frequency, last_updated FROM series_metadata "
+                f"WHERE series_id IN ({placeholders})", chunk):
+            rows[series_id] = (last_checked, frequency, last_updated)
+    
+    # Série bez záznamu je třeba stáhnout, nedávno kontrolované jsou aktuální
+    for series_id in series_ids:
+        row = rows.get(series_id)
+        if row is None:
+            results[series_id] = True
+        elif needs_web_check(row[0], row[1], now):
+            to_verify[series_id] = row[2]
+        else:
+            results[series_id] = False
+    
+    return results, to_verify
+
+def verify_in_browsers(to_verify, workers=4):
+    """Ověří série na webu nad poolem trvalých driverů, vrací {series_id: potřebuje aktualizaci}"""
+    workers = min(workers, len(to_verify))
+    if workers == 0:
+        return {}
+    
+    # Drivery vytvořit jednou, úlohy si je půjčují z fronty
+    drivers = Queue()
+    for _ in range(workers):
+        try:
+            drivers.put(create_driver())
+        except Exception as e:
+            logger.error(f"Nelze vytvořit driver: {str(e)}")
+    
+    if drivers.empty():
+        # Bez prohlížeče nelze rozhodnout, raději aktualizovat vše
+        return {series_id: True for series_id in to_verify}
+    
+    def verify(series_id):
+        driver = drivers.get()
+        try:
+            return verify_on_web(series_id, to_verify[series_id], driver)
+        finally:
+            drivers.put(driver)
+    
+    try:
+        with ThreadPoolExecutor(max_workers=drivers.qsize()) as executor:
+            return dict(zip(to_verify, executor.map(verify, to_verify)))
+    
     finally:
-        # Zavřít driver, pokud jsme ho vytvořili zde
-        if should_close_driver and driver:
-            driver.quit()
+        while not drivers.empty():
+            try:
+                drivers.get().quit()
+            except Exception:
+                pass
+
+def check_many(series_ids, workers=4):
+    """Souběžně zkontroluje více sérií nad poolem trvalých driverů, vrací {series_id: potřebuje aktualizaci}"""
+    results, to_verify = filter_needing_update(list(series_ids))
+    results.update(verify_in_browsers(to_verify, workers))
+    return results
+
+async def fetch_last_updated_async(session, semaphore, series_id):
+    """Zjistí 'last updated' ze stránky série asynchronně, vrací (stránka načtena, hodnota nebo None)"""
+    url = f"https://fred.stlouisfed.org/series/{series_id}"
+    proxy = f"http://{CONFIG['use_proxy']}" if CONFIG["use_proxy"] else None
+    
+    async with semaphore:
+        await asyncio.sleep(CONFIG["min_delay"] + random.random() * (CONFIG["max_delay"] - CONFIG["min_delay"]))
+        try:
+            async with session.get(url, proxy=proxy) as response:
+                body = await response.read()
+                if response.status != 200 or b"Access Denied" in body[:1000]:
+                    logger.warning(f"Přímé načtení {url} selhalo (HTTP {response.status}), zkusím prohlížeč")
+                    return False, None
+        except Exception as e:
+            logger.warning(f"Přímé načtení {url} selhalo: {str(e)}, zkusím prohlížeč")
+            return False, None
+    
+    return True, parse_last_updated(body)
+
+async def check_all_async(series_ids):
+    """Zkontroluje série souběžnými HTTP požadavky nad jedním poolem spojení, vrací (výsledky, odmítnuté série)"""
+    results, to_verify = filter_needing_update(series_ids)
+    
+    semaphore = asyncio.Semaphore(CONFIG["check_concurrency"])
+    connector = aiohttp.TCPConnector(limit=CONFIG["check_concurrency"])
+    timeout = aiohttp.ClientTimeout(total=CONFIG["page_load_timeout"])
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                     headers={"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"}) as session:
+        fetched = await asyncio.gather(*(fetch_last_updated_async(session, semaphore, series_id)
+                                         for series_id in to_verify))
+    
+    denied = {}
+    for (series_id, last_updated_db), (loaded, last_updated_web) in zip(to_verify.items(), fetched):
+        if loaded:
+            results[series_id] = compare_last_updated(series_id, last_updated_web, last_updated_db)
+        else:
+            denied[series_id] = last_updated_db
+    
+    return results, denied
+
+def check_all(series_ids, workers=4):
+    """Zkontroluje více sérií přes HTTP, odmítnuté požadavky dokončí v prohlížečích, vrací {series_id: potřebuje aktualizaci}"""
+    series_ids = list(series_ids)
+    if not series_ids:
+        return {}
+    
+    results, denied = asyncio.run(check_all_async(series_ids))
+    
+    if denied:
+        logger.info(f"{len(denied)} sérií FRED přes HTTP odmítl, kontroluji je v prohlížeči")
+        results.update(verify_in_browsers(denied, workers))
+    
+    return results
 
 def check_if_needs_update(series_id):
     """Zpětná kompatibilita pro původní funkci"""
@@ -394,34 +772,40 @@ def check_if_needs_update(series_id):
 def get_series_to_update(min_days=None):
     """Získá seznam sérií, které by měly být zkontrolovány pro aktualizaci"""
     try:
-        conn = sqlite3.connect(CONFIG["db_file"])
+        conn = _get_conn()
         cursor = conn.cursor()
         
-        query = """
-        SELECT series_id, frequency, last_checked 
+        # Stejný text dotazu při každém volání - SQLite použije připravený příkaz z cache
+        # Interval podle frekvence se vyhodnotí už v SQL, stejně jako v needs_web_check
+        query = f"""
+        SELECT series_id, frequency, last_checked, last_updated 
         FROM series_metadata 
-        WHERE frequency LIKE '%Daily%' OR 
-              frequency LIKE '%Weekly%' OR 
-              frequency LIKE '%Biweekly%' OR 
-              frequency LIKE '%Monthly%' OR 
-              frequency LIKE '%Quarterly%'
+        WHERE (frequency LIKE '%Daily%' OR 
+               frequency LIKE '%Weekly%' OR 
+               frequency LIKE '%Monthly%' OR 
+               frequency LIKE '%Quarterly%')
+          AND (julianday(last_checked) IS NULL OR 
+               julianday('now', 'localtime') - julianday(last_checked) >= {CHECK_INTERVAL_SQL})
         """
+        params = ()
         
         # Filtrovat podle počtu dní od poslední kontroly
         if min_days is not None:
             cutoff_date = (datetime.now() - timedelta(days=min_days)).isoformat()
-            query += f" AND (last_checked IS NULL OR last_checked < '{cutoff_date}')"
+            query += " AND (last_checked IS NULL OR last_checked < ?)"
+            params = (cutoff_date,)
         
-        cursor.execute(query)
+        cursor.execute(query, params)
         results = cursor.fetchall()
-        conn.close()
         
         series_list = []
-        for series_id, frequency, last_checked in results:
+        # Uložená last_updated jede se sérií, porovnání s webem pak nepotřebuje další dotaz
+        for series_id, frequency, last_checked, last_updated in results:
             series_list.append({
                 'series_id': series_id,
                 'frequency': frequency,
-                'last_checked': last_checked
+                'last_checked': last_checked,
+                'last_updated': last_updated
             })
         
         logger.info(f"Nalezeno {len(series_list)} sérií ke kontrole pro aktualizaci")
@@ -434,16 +818,16 @@ def get_series_to_update(min_days=None):
 def get_series_stats():
     """Získá statistiky o uložených sériích"""
     try:
-        conn = sqlite3.connect(CONFIG["db_file"])
+        conn = _get_conn()
         cursor = conn.cursor()
         
-        # Počet uložených sérií
-        cursor.execute("SELECT COUNT(*) FROM series_metadata")
-        series_count = cursor.fetchone()[0]
-        
-        # Počet hodnot
-        cursor.execute("SELECT COUNT(*) FROM series_values")
-        values_count = cursor.fetchone()[0]
+        # Počty sérií a hodnot a poslední úspěšná aktualizace jedním dotazem
+        cursor.execute("""
+        SELECT (SELECT COUNT(*) FROM series_metadata),
+               (SELECT COUNT(*) FROM series_values),
+               (SELECT datetime(MAX(timestamp)) FROM update_log WHERE status = 'SUCCESS')
+        """)
+        series_count, values_count, last_update = cursor.fetchone()
         
         # Frekvence aktualizace
         cursor.execute("""
@@ -454,16 +838,6 @@ def get_series_stats():
         """)
         frequency_counts = cursor.fetchall()
         
-        # Poslední aktualizace
-        cursor.execute("""
-        SELECT datetime(MAX(timestamp)) as last_update
-        FROM update_log
-        WHERE status = 'SUCCESS'
-        """)
-        last_update = cursor.fetchone()[0] if cursor.fetchone() else None
-        
-        conn.close()
-        
         stats = {
             'series_count': series_count,
             'values_count': values_count,
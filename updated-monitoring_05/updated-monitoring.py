@@ -1,17 +1,18 @@
 import sqlite3
 import logging
-import pandas as pd
 from datetime import datetime, timedelta
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import os
 import json
-import matplotlib.pyplot as plt
-import seaborn as sns
-from concurrent.futures import ThreadPoolExecutor
+import mmap
+from html import escape
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 import threading
+import atexit
+from queue import Queue, Empty
 import sys
 import argparse
 
@@ -53,8 +54,108 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Max. počet záznamů update_log v jednom zápisu vlákna zapisovače
+LOG_BATCH_SIZE = 512
+# Kapacita fronty záznamů - při zahlcení workery přibrzdí
+LOG_QUEUE_SIZE = 10000
+
+# Vkládání záznamu do update_log - stejný text příkazu, aby SQLite znovu použilo připravený příkaz
+INSERT_LOG_SQL = "INSERT INTO update_log (timestamp, series_id, action, status, message) VALUES (?, ?, ?, ?, ?)"
+
+# Indexy pro analytické dotazy nad update_log (filtr podle času a stavu/akce, seskupení podle série)
+LOG_INDEXES = {
+    'idx_log_ts_status': "CREATE INDEX IF NOT EXISTS idx_log_ts_status ON update_log(timestamp, status, series_id)",
+    'idx_log_series_action_ts': "CREATE INDEX IF NOT EXISTS idx_log_series_action_ts ON update_log(series_id, action, timestamp)",
+    'idx_log_status_series': "CREATE INDEX IF NOT EXISTS idx_log_status_series ON update_log(status, series_id) WHERE series_id != 'SYSTEM'"
+}
+
+# Od této velikosti (znaků) se report zapisuje přes mmap místo bufferovaného zápisu
+REPORT_MMAP_THRESHOLD = 256 * 1024
+
+# Statická část reportu - sestaví se jednou při importu, ne při každém generování
+REPORT_STYLE = """<style>
+                    body { font-family: Arial, sans-serif; line-height: 1.6; padding: 20px; }
+                    h1, h2, h3 { color: #333; }
+                    .container { max-width: 1200px; margin: 0 auto; }
+                    .section { margin-bottom: 30px; }
+                    .summary { display: flex; flex-wrap: wrap; gap: 20px; }
+                    .summary-item { background: #f5f5f5; padding: 15px; border-radius: 5px; flex: 1; }
+                    .success { color: green; }
+                    .warning { color: orange; }
+                    .error { color: red; }
+                    table { width: 100%; border-collapse: collapse; }
+                    th, td { padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }
+                    th { background-color: #f2f2f2; }
+                </style>"""
+
+# Šablony řádků tabulek reportu - rozparsují se jednou, v cyklu se jen volá format
+REPORT_ROW = """
+                        <tr>
+                            <td>{}</td>
+                            <td>{}</td>
+                        </tr>
+                    """.format
+REPORT_ITEM = "<li>{}</li>\n".format
+
+# HTTP statusy, kterými server dává najevo přetížení nebo omezení rychlosti
+THROTTLE_STATUSES = {429, 500, 502, 503, 504}
+
+def is_throttled(error=None, driver=None):
+    """Zda neúspěch vypadá na omezení ze strany serveru (HTTP 429/5xx nebo stránka Access Denied)"""
+    status = getattr(error, 'status', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    if status in THROTTLE_STATUSES:
+        return True
+    
+    if driver:
+        try:
+            return "Access Denied" in driver.page_source
+        except Exception:
+            return False
+    return False
+
+class TokenBucket:
+    """Omezovač rychlosti sdílený vlákny - při omezení serverem zpomalí na polovinu, při úspěchu postupně zrychlí"""
+    
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.cond = threading.Condition()
+    
+    def _refill(self):
+        """Doplní tokeny podle času od posledního doplnění"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def acquire(self):
+        """Počká na volný token a spotřebuje ho"""
+        with self.cond:
+            self._refill()
+            while self.tokens < 1:
+                self.cond.wait((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+    
+    def penalize(self):
+        """Po omezení serverem snížit rychlost na polovinu (nejvýše na 1/4 výchozí)"""
+        with self.cond:
+            self._refill()
+            self.rate = max(self.rate / 2, self.max_rate / 4)
+    
+    def reward(self):
+        """Po úspěchu lineárně vracet rychlost k výchozí hodnotě"""
+        with self.cond:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
 class FredMonitor:
-    def __init__(self, config_file='monitoring_config.json', db_file=None):
+    # Načtené konfigurační soubory: cesta -> (mtime, obsah), sdíleno mezi instancemi
+    _config_cache = {}
+    
+    def __init__(self, config_file='monitoring_config.json', db_file=None, persist_defaults=False):
         """Inicializace monitorovacího systému"""
         # Výchozí konfigurace
         self.config = {
@@ -74,12 +175,49 @@ class FredMonitor:
             'max_workers': 3,    # počet paralelních workerů pro retry
             'use_proxy': None,   # proxy server (volitelné)
             'db_file': db_file or 'fred_data.db',
-            'use_selenium': selenium_available  # automaticky detekovat, zda je Selenium k dispozici
+            'use_selenium': selenium_available,  # automaticky detekovat, zda je Selenium k dispozici
+            'request_rate': 1.0,  # max. počet požadavků za sekundu sdílený všemi workery
+            'request_burst': 3,   # kolik požadavků smí odejít hned za sebou
+            'persist_defaults': persist_defaults  # uložit výchozí konfiguraci, pokud soubor chybí
         }
         
         # Načíst konfiguraci, pokud existuje
         self.load_config(config_file)
         
+        # Jedno trvalé připojení pro celý monitor - WAL, čtení neblokují zápisy z workerů
+        self._conn = sqlite3.connect(self.config['db_file'], check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        
+        # Kurzor pro zápisy záznamů - vytvořen jednou, používá ho jen vlákno zapisovače
+        self._write_cur = self._conn.cursor()
+        
+        # Zápisy z více vláken řadit za sebe
+        self._write_lock = threading.Lock()
+        
+        # Záznamy update_log zapisuje po dávkách jediné vlákno, workery je jen zařadí do fronty
+        self._log_q = Queue(maxsize=LOG_QUEUE_SIZE)
+        self._log_thread = threading.Thread(target=self._log_writer, name="monitor-log-writer", daemon=True)
+        self._log_thread.start()
+        atexit.register(self.close_log)
+        
+        # Selenium driver - jeden na vlákno, ne na sérii; ukončí se při skončení programu
+        self._driver_tls = threading.local()
+        self._drivers = []
+        self._drivers_lock = threading.Lock()
+        atexit.register(self._close_drivers)
+        
+        # Společný omezovač rychlosti požadavků pro všechny workery
+        self.bucket = TokenBucket(self.config['request_rate'], self.config['request_burst'])
+        
+        # SMTP spojení se otevře při prvním e-mailu a zůstane otevřené do close()
+        self._smtp = None
+        # Report a alerty mohou při --full odesílat souběžně - spojení smí používat jen jedno vlákno
+        self._smtp_lock = threading.Lock()
+        
+        self._ensure_indexes()
+        
         # Vytvořit adresář pro reporty, pokud neexistuje
         if self.config['daily_report']:
             os.makedirs(self.config['report_dir'], exist_ok=True)
@@ -88,24 +226,113 @@ class FredMonitor:
         """Načtení konfigurace z JSON souboru"""
         try:
             if os.path.exists(config_file):
-                with open(config_file, 'r') as f:
-                    loaded_config = json.load(f)
-                    self.config.update(loaded_config)
+                # Soubor znovu parsovat jen při změně mtime
+                path = os.path.abspath(config_file)
+                mtime = os.stat(path).st_mtime
+                cached = FredMonitor._config_cache.get(path)
+                
+                if cached and cached[0] == mtime:
+                    loaded_config = cached[1]
+                else:
+                    with open(path, 'r') as f:
+                        loaded_config = json.load(f)
+                    FredMonitor._config_cache[path] = (mtime, loaded_config)
+                
+                self.config.update(loaded_config)
                 logger.info("Konfigurace úspěšně načtena")
             else:
                 logger.warning(f"Konfigurační soubor {config_file} nenalezen, použije se výchozí konfigurace")
-                # Uložit výchozí konfiguraci
-                with open(config_file, 'w') as f:
-                    json.dump(self.config, f, indent=2)
+                # Uložit výchozí konfiguraci jen na vyžádání
+                if self.config.get('persist_defaults', False):
+                    with open(config_file, 'w') as f:
+                        json.dump(self.config, f, indent=2)
         except Exception as e:
             logger.error(f"Chyba při načítání konfigurace: {str(e)}")
     
+    def _ensure_indexes(self):
+        """Vytvoří chybějící indexy nad update_log a aktualizuje statistiky pro plánovač"""
+        try:
+            existing = {row[0] for row in self._conn.execute(
+                "SELECT name FROM sqlite_master WHERE type IN ('table', 'index')"
+            )}
+            if 'update_log' not in existing:
+                return
+            
+            missing = [name for name in LOG_INDEXES if name not in existing]
+            if not missing:
+                return
+            
+            with self._write_lock:
+                for name in missing:
+                    self._conn.execute(LOG_INDEXES[name])
+                self._conn.execute("ANALYZE update_log")
+            logger.info(f"Vytvořeny indexy nad update_log: {', '.join(missing)}")
+        except Exception as e:
+            logger.error(f"Chyba při vytváření indexů update_log: {str(e)}")
+    
+    def _log(self, series_id, status, message):
+        """Zařadí výsledek pokusu do fronty záznamů update_log, čas doplní zapisovač"""
+        self._log_q.put((series_id, 'RETRY', status, message))
+    
+    def _log_writer(self):
+        """Sbírá záznamy z fronty a zapisuje je do update_log po dávkách"""
+        running = True
+        while running:
+            item = self._log_q.get()
+            if item is None:
+                self._log_q.task_done()
+                break
+            
+            batch = [item]
+            try:
+                while len(batch) < LOG_BATCH_SIZE:
+                    item = self._log_q.get_nowait()
+                    if item is None:
+                        running = False
+                        self._log_q.task_done()
+                        break
+                    batch.append(item)
+            except Empty:
+                pass
+            
+            try:
+                self._write_log_batch(batch)
+            except Exception as e:
+                logger.error(f"Chyba při zápisu {len(batch)} záznamů do update_log: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._log_q.task_done()
+    
+    def _write_log_batch(self, batch):
+        """Zapíše dávku záznamů do update_log jedním příkazem"""
+        # Jedno časové razítko (na sekundy) pro celou dávku
+        ts = datetime.now().replace(microsecond=0).isoformat()
+        rows = [(ts,) + item for item in batch]
+        
+        # Celá dávka v jedné explicitní transakci - jeden commit (fsync) na dávku
+        with self._write_lock:
+            self._write_cur.execute("BEGIN IMMEDIATE")
+            try:
+                self._write_cur.executemany(INSERT_LOG_SQL, rows)
+                self._write_cur.execute("COMMIT")
+            except Exception:
+                self._write_cur.execute("ROLLBACK")
+                raise
+    
+    def flush_log(self):
+        """Počká, až vlákno zapisovače zapíše všechny zařazené záznamy"""
+        if self._log_thread.is_alive():
+            self._log_q.join()
+    
+    def close_log(self):
+        """Zapíše zbývající záznamy a ukončí vlákno zapisovače"""
+        if self._log_thread.is_alive():
+            self._log_q.put(None)
+            self._log_thread.join()
+    
     def check_database_integrity(self):
         """Kontrola integrity databáze"""
         try:
-            conn = sqlite3.connect(self.config['db_file'])
-            cursor = conn.cursor()
-            
             # Kontrola existence a struktury tabulek
             tables = [
                 ("series_metadata", ["series_id", "title", "frequency", "units", "seasonal_adjustment", "last_updated", "last_checked"]),
@@ -113,31 +340,30 @@ class FredMonitor:
                 ("update_log", ["id", "timestamp", "series_id", "action", "status", "message"])
             ]
             
+            # Sloupce všech tabulek jedním dotazem přes sqlite_master a pragma_table_info
+            schema = {}
+            for table_name, column in self._conn.execute("""
+            SELECT m.name, p.name
+            FROM sqlite_master m, pragma_table_info(m.name) p
+            WHERE m.type = 'table'
+            """):
+                schema.setdefault(table_name, set()).add(column)
+            
             issues = []
             
             for table_name, expected_columns in tables:
-                # Kontrola existence tabulky
-                cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
-                if not cursor.fetchone():
+                if table_name not in schema:
                     issues.append(f"Tabulka {table_name} neexistuje")
                     continue
                 
-                # Kontrola sloupců
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = [row[1] for row in cursor.fetchall()]
-                
                 for col in expected_columns:
-                    if col not in columns:
+                    if col not in schema[table_name]:
                         issues.append(f"Chybí sloupec {col} v tabulce {table_name}")
             
-            # Kontrola dat
-            cursor.execute("SELECT COUNT(*) FROM series_metadata")
-            series_count = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM series_values")
-            values_count = cursor.fetchone()[0]
-            
-            conn.close()
+            # Kontrola dat - oba počty jedním příkazem
+            series_count, values_count = self._conn.execute("""
+            SELECT (SELECT COUNT(*) FROM series_metadata), (SELECT COUNT(*) FROM series_values)
+            """).fetchone()
             
             integrity_info = {
                 'issues': issues,
@@ -162,25 +388,44 @@ class FredMonitor:
                 'values_count': 0
             }
     
-    def analyze_errors(self, days=1):
-        """Analýza chyb za posledních X dní"""
+    def _window_counts(self, windows):
+        """Počty záznamů, chyb a úspěchů pro několik časových oken jedním průchodem update_log"""
+        now = datetime.now()
+        params = {f'd{days}': (now - timedelta(days=days)).isoformat() for days in windows}
+        params['start'] = min(params.values())
+        
+        columns = ", ".join(
+            f"COUNT(CASE WHEN timestamp >= :d{days} THEN 1 END), "
+            f"COUNT(CASE WHEN timestamp >= :d{days} AND status = 'ERROR' THEN 1 END), "
+            f"COUNT(CASE WHEN timestamp >= :d{days} AND status = 'SUCCESS' THEN 1 END)"
+            for days in windows
+        )
+        row = self._conn.execute(f"SELECT {columns} FROM update_log WHERE timestamp >= :start", params).fetchone()
+        
+        counts = {}
+        for i, days in enumerate(windows):
+            total_logs, error_count, success_count = row[3 * i:3 * i + 3]
+            counts[days] = {
+                'total_logs': total_logs,
+                'error_count': error_count,
+                'success_count': success_count,
+                'error_rate': error_count / total_logs if total_logs > 0 else 0
+            }
+        return counts
+    
+    def analyze_errors(self, days=1, summary_days=()):
+        """Analýza chyb za posledních X dní, pro okna v summary_days přidá souhrnné počty"""
+        windows = {}
         try:
-            conn = sqlite3.connect(self.config['db_file'])
-            
-            # Získat log za posledních X dní
+            # Agregace provádí SQLite, do Pythonu se přenesou jen souhrnné počty
             start_date = (datetime.now() - timedelta(days=days)).isoformat()
             
-            query = f"""
-            SELECT timestamp, series_id, action, status, message
-            FROM update_log
-            WHERE timestamp >= '{start_date}'
-            ORDER BY timestamp DESC
-            """
+            counts = self._window_counts((days,) + tuple(summary_days))
+            windows = {window: counts[window] for window in summary_days}
             
-            df = pd.read_sql_query(query, conn)
-            conn.close()
+            total_logs = counts[days]['total_logs']
             
-            if df.empty:
+            if total_logs == 0:
                 logger.info(f"Žádné záznamy za posledních {days} dní")
                 return {
                     'total_logs': 0,
@@ -188,38 +433,40 @@ class FredMonitor:
                     'success_count': 0,
                     'error_rate': 0,
                     'most_common_errors': [],
-                    'affected_series': []
+                    'affected_series': [],
+                    'windows': windows
                 }
             
-            # Transformace a analýza
-            df['date'] = pd.to_datetime(df['timestamp'])
-            
             # Základní metriky
-            error_logs = df[df['status'] == 'ERROR']
-            success_logs = df[df['status'] == 'SUCCESS']
-            
-            total_logs = len(df)
-            error_count = len(error_logs)
-            success_count = len(success_logs)
-            error_rate = error_count / total_logs if total_logs > 0 else 0
+            error_count = counts[days]['error_count']
+            success_count = counts[days]['success_count']
+            error_rate = counts[days]['error_rate']
             
             # Nejčastější chyby
-            most_common_errors = []
-            if not error_logs.empty:
-                error_counts = error_logs['message'].value_counts().head(10)
-                most_common_errors = [
-                    {'message': message, 'count': count}
-                    for message, count in error_counts.items()
-                ]
+            most_common_errors = [
+                {'message': message, 'count': count}
+                for message, count in self._conn.execute("""
+                SELECT message, COUNT(*) AS c
+                FROM update_log
+                WHERE timestamp >= ? AND status = 'ERROR'
+                GROUP BY message
+                ORDER BY c DESC
+                LIMIT 10
+                """, (start_date,))
+            ]
             
             # Série s nejvíce chybami
-            affected_series = []
-            if not error_logs.empty:
-                series_error_counts = error_logs['series_id'].value_counts().head(10)
-                affected_series = [
-                    {'series_id': series_id, 'error_count': count}
-                    for series_id, count in series_error_counts.items()
-                ]
+            affected_series = [
+                {'series_id': series_id, 'error_count': count}
+                for series_id, count in self._conn.execute("""
+                SELECT series_id, COUNT(*) AS c
+                FROM update_log
+                WHERE timestamp >= ? AND status = 'ERROR'
+                GROUP BY series_id
+                ORDER BY c DESC
+                LIMIT 10
+                """, (start_date,))
+            ]
             
             # Výsledky analýzy
             analysis_result = {
@@ -228,7 +475,8 @@ class FredMonitor:
                 'success_count': success_count,
                 'error_rate': error_rate,
                 'most_common_errors': most_common_errors,
-                'affected_series': affected_series
+                'affected_series': affected_series,
+                'windows': windows
             }
             
             logger.info(f"Analýza chyb za posledních {days} dní: "
@@ -246,6 +494,7 @@ class FredMonitor:
                 'error_rate': 0,
                 'most_common_errors': [],
                 'affected_series': [],
+                'windows': windows,
                 'error': str(e)
             }
     
@@ -261,20 +510,7 @@ class FredMonitor:
                 logger.warning(f"Nepodařilo se získat data pro {series_id}")
                 
                 # Zaznamenat pokus
-                conn = sqlite3.connect(self.config['db_file'])
-                cursor = conn.cursor()
-                cursor.execute('''
-                INSERT INTO update_log (timestamp, series_id, action, status, message)
-                VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    datetime.now().isoformat(),
-                    series_id,
-                    'RETRY',
-                    'ERROR',
-                    "Nepodařilo se získat data"
-                ))
-                conn.commit()
-                conn.close()
+                self._log(series_id, 'ERROR', "Nepodařilo se získat data")
                 return False
             
             # Uložit do databáze
@@ -284,38 +520,12 @@ class FredMonitor:
                 logger.info(f"Série {series_id} úspěšně znovustažena")
                 
                 # Zaznamenat úspěch
-                conn = sqlite3.connect(self.config['db_file'])
-                cursor = conn.cursor()
-                cursor.execute('''
-                INSERT INTO update_log (timestamp, series_id, action, status, message)
-                VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    datetime.now().isoformat(),
-                    series_id,
-                    'RETRY',
-                    'SUCCESS',
-                    f"Úspěšně znovustaženo s {len(series_data.get('data', []))} datovými body"
-                ))
-                conn.commit()
-                conn.close()
+                self._log(series_id, 'SUCCESS', f"Úspěšně znovustaženo s {len(series_data.get('data', []))} datovými body")
             else:
                 logger.warning(f"Problém při ukládání dat pro {series_id}")
                 
                 # Zaznamenat neúspěch
-                conn = sqlite3.connect(self.config['db_file'])
-                cursor = conn.cursor()
-                cursor.execute('''
-                INSERT INTO update_log (timestamp, series_id, action, status, message)
-                VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    datetime.now().isoformat(),
-                    series_id,
-                    'RETRY',
-                    'ERROR',
-                    "Problém při ukládání dat"
-                ))
-                conn.commit()
-                conn.close()
+                self._log(series_id, 'ERROR', "Problém při ukládání dat")
             
             return success
         
@@ -324,20 +534,7 @@ class FredMonitor:
             
             # Zaznamenat chybu
             try:
-                conn = sqlite3.connect(self.config['db_file'])
-                cursor = conn.cursor()
-                cursor.execute('''
-                INSERT INTO update_log (timestamp, series_id, action, status, message)
-                VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    datetime.now().isoformat(),
-                    series_id,
-                    'RETRY',
-                    'ERROR',
-                    str(e)
-                ))
-                conn.commit()
-                conn.close()
+                self._log(series_id, 'ERROR', str(e))
             except:
                 pass
             
@@ -346,16 +543,9 @@ class FredMonitor:
     def _retry_single_series(self, series_id):
         """Opakovat stažení jedné série (kompatibilita se starším API)"""
         if self.config['use_selenium']:
-            driver = None
-            try:
-                # Vytvořit dočasný driver
-                driver = create_driver()
-                # Zpoždění před pokusem (při opakování)
-                time.sleep(self.config['retry_delay'])
-                return self._retry_single_series_selenium(driver, series_id)
-            finally:
-                if driver:
-                    driver.quit()
+            # Zpoždění před pokusem (při opakování)
+            time.sleep(self.config['retry_delay'])
+            return self._retry_single_series_selenium(self._get_driver(), series_id)
         else:
             try:
                 logger.info(f"Pokus o znovustažení série {series_id}")
@@ -370,20 +560,7 @@ class FredMonitor:
                     logger.warning(f"Nepodařilo se získat data pro {series_id}")
                     
                     # Zaznamenat pokus
-                    conn = sqlite3.connect(self.config['db_file'])
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                    INSERT INTO update_log (timestamp, series_id, action, status, message)
-                    VALUES (?, ?, ?, ?, ?)
-                    ''', (
-                        datetime.now().isoformat(),
-                        series_id,
-                        'RETRY',
-                        'ERROR',
-                        "Nepodařilo se získat data"
-                    ))
-                    conn.commit()
-                    conn.close()
+                    self._log(series_id, 'ERROR', "Nepodařilo se získat data")
                     return False
                 
                 # Uložit do databáze
@@ -393,38 +570,12 @@ class FredMonitor:
                     logger.info(f"Série {series_id} úspěšně znovustažena")
                     
                     # Zaznamenat úspěch
-                    conn = sqlite3.connect(self.config['db_file'])
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                    INSERT INTO update_log (timestamp, series_id, action, status, message)
-                    VALUES (?, ?, ?, ?, ?)
-                    ''', (
-                        datetime.now().isoformat(),
-                        series_id,
-                        'RETRY',
-                        'SUCCESS',
-                        f"Úspěšně znovustaženo s {len(series_data.get('data', []))} datovými body"
-                    ))
-                    conn.commit()
-                    conn.close()
+                    self._log(series_id, 'SUCCESS', f"Úspěšně znovustaženo s {len(series_data.get('data', []))} datovými body")
                 else:
                     logger.warning(f"Problém při ukládání dat pro {series_id}")
                     
                     # Zaznamenat neúspěch
-                    conn = sqlite3.connect(self.config['db_file'])
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                    INSERT INTO update_log (timestamp, series_id, action, status, message)
-                    VALUES (?, ?, ?, ?, ?)
-                    ''', (
-                        datetime.now().isoformat(),
-                        series_id,
-                        'RETRY',
-                        'ERROR',
-                        "Problém při ukládání dat"
-                    ))
-                    conn.commit()
-                    conn.close()
+                    self._log(series_id, 'ERROR', "Problém při ukládání dat")
                 
                 return success
             
@@ -433,75 +584,75 @@ class FredMonitor:
                 
                 # Zaznamenat chybu
                 try:
-                    conn = sqlite3.connect(self.config['db_file'])
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                    INSERT INTO update_log (timestamp, series_id, action, status, message)
-                    VALUES (?, ?, ?, ?, ?)
-                    ''', (
-                        datetime.now().isoformat(),
-                        series_id,
-                        'RETRY',
-                        'ERROR',
-                        str(e)
-                    ))
-                    conn.commit()
-                    conn.close()
+                    self._log(series_id, 'ERROR', str(e))
                 except:
                     pass
                 
                 return False
     
-    def retry_worker(self, worker_id, series_list, results):
-        """Worker vlákno pro opakování stažení sérií"""
+    def _get_driver(self):
+        """Vrátí Selenium driver aktuálního vlákna, při prvním volání ho vytvoří"""
+        state = getattr(self._driver_tls, 'state', None)
+        if state is None or state['driver'] is None:
+            state = {'driver': create_driver()}
+            # Nejprve navštívit hlavní stránku pro získání cookies
+            state['driver'].get("https://fred.stlouisfed.org/")
+            time.sleep(2)
+            
+            self._driver_tls.state = state
+            with self._drivers_lock:
+                self._drivers.append(state)
+        return state['driver']
+    
+    def _close_drivers(self):
+        """Ukončí drivery všech vláken, vlákno si při dalším použití vytvoří nový"""
+        with self._drivers_lock:
+            states, self._drivers = self._drivers, []
+        
+        for state in states:
+            driver, state['driver'] = state['driver'], None
+            if driver:
+                try:
+                    driver.quit()
+                except:
+                    pass
+    
+    def retry_worker(self, series_id):
+        """Úloha pro pool workerů - opakovat stažení jedné série s driverem aktuálního vlákna"""
         driver = None
         try:
             if self.config['use_selenium']:
-                driver = create_driver()
-                # Nejprve navštívit hlavní stránku pro získání cookies
-                driver.get("https://fred.stlouisfed.org/")
-                time.sleep(2)
+                driver = self._get_driver()
             
-            for i, series_id in enumerate(series_list):
-                try:
-                    if self.config['use_selenium'] and driver:
-                        success = self._retry_single_series_selenium(driver, series_id)
-                    else:
-                        success = self._retry_single_series(series_id)
-                    
-                    if success:
-                        results['success'] += 1
-                    else:
-                        results['failed'] += 1
-                    
-                    # Zobrazit průběh
-                    if (i + 1) % 5 == 0 or i == len(series_list) - 1:
-                        logger.info(f"Worker {worker_id}: Zpracováno {i+1}/{len(series_list)} sérií")
-                    
-                    # Zpoždění mezi požadavky
-                    time.sleep(2 + random.random() * 2)
-                    
-                except Exception as e:
-                    results['failed'] += 1
-                    logger.error(f"Worker {worker_id}: Chyba při zpracování {series_id}: {str(e)}")
-                    
-                    # Zkusit se zotavit, pokud používáme Selenium
-                    if self.config['use_selenium'] and driver:
-                        try:
-                            # Vrátit se na hlavní stránku pro reset session
-                            driver.get("https://fred.stlouisfed.org/")
-                            time.sleep(3)
-                        except:
-                            pass
+            # Počkat na volný token místo pevné pauzy mezi požadavky
+            self.bucket.acquire()
             
-            logger.info(f"Worker {worker_id} dokončil zpracování {len(series_list)} sérií")
+            if driver:
+                success = self._retry_single_series_selenium(driver, series_id)
+            else:
+                success = self._retry_single_series(series_id)
+            
+            # Zpomalit jen při omezení serverem - chybějící data nebo chyba uložení nejsou důvodem
+            if success:
+                self.bucket.reward()
+            elif is_throttled(driver=driver):
+                self.bucket.penalize()
+            return success
         
         except Exception as e:
-            logger.error(f"Worker {worker_id}: Kritická chyba: {str(e)}")
-        
-        finally:
+            logger.error(f"Chyba při zpracování {series_id}: {str(e)}")
+            if is_throttled(e, driver):
+                self.bucket.penalize()
+            
+            # Zkusit se zotavit, pokud používáme Selenium
             if driver:
-                driver.quit()
+                try:
+                    # Vrátit se na hlavní stránku pro reset session
+                    driver.get("https://fred.stlouisfed.org/")
+                    time.sleep(3)
+                except:
+                    pass
+            return False
     
     def retry_failed_series(self, days=1, max_retries=None):
         """Opakovat stažení sérií, které selhaly"""
@@ -512,40 +663,31 @@ class FredMonitor:
         max_retries = max_retries or self.config['retry_limit']
         
         try:
-            # Získat seznam sérií, které selhaly
-            conn = sqlite3.connect(self.config['db_file'])
-            
+            # Série, které selhaly a nedosáhly limitu pokusů - jediný dotaz místo dotazu pro každou sérii
             start_date = (datetime.now() - timedelta(days=days)).isoformat()
             
-            query = f"""
-            SELECT DISTINCT series_id
-            FROM update_log
-            WHERE timestamp >= '{start_date}'
-            AND status = 'ERROR'
-            AND series_id != 'SYSTEM'
-            """
-            
-            df = pd.read_sql_query(query, conn)
-            
-            # Filtrovat série, které již dosáhly maximálního počtu pokusů
-            filtered_series = []
-            for _, row in df.iterrows():
-                series_id = row['series_id']
-                
-                retry_query = f"""
-                SELECT COUNT(*) FROM update_log
-                WHERE series_id = '{series_id}'
-                AND timestamp >= '{start_date}'
+            query = """
+            SELECT e.series_id
+            FROM (
+                SELECT DISTINCT series_id
+                FROM update_log
+                WHERE timestamp >= ?
+                AND status = 'ERROR'
+                AND series_id != 'SYSTEM'
+            ) e
+            LEFT JOIN (
+                SELECT series_id, COUNT(*) AS cnt
+                FROM update_log
+                WHERE timestamp >= ?
                 AND action = 'RETRY'
-                """
-                retry_count = pd.read_sql_query(retry_query, conn).iloc[0, 0]
-                
-                if retry_count < max_retries:
-                    filtered_series.append(series_id)
-                else:
-                    logger.info(f"Série {series_id} již dosáhla limitu pokusů ({retry_count}/{max_retries})")
+                GROUP BY series_id
+            ) r USING (series_id)
+            WHERE COALESCE(r.cnt, 0) < ?
+            """
             
-            conn.close()
+            filtered_series = [
+                row[0] for row in self._conn.execute(query, (start_date, start_date, max_retries)).fetchall()
+            ]
             
             if not filtered_series:
                 logger.info("Žádné série ke znovustažení")
@@ -570,28 +712,28 @@ class FredMonitor:
                     else:
                         results['failed'] += 1
             else:
-                # Jinak použít paralelní zpracování
-                # Rozdělit série mezi workery
+                # Jinak použít paralelní zpracování - každá série je samostatná úloha,
+                # volný worker si hned bere další, takže pomalá série nezdrží ostatní
                 max_workers = min(self.config['max_workers'], len(filtered_series))
-                series_per_worker = (len(filtered_series) + max_workers - 1) // max_workers
-                worker_series = []
-                
-                for i in range(0, len(filtered_series), series_per_worker):
-                    worker_series.append(filtered_series[i:i+series_per_worker])
-                
-                # Spustit worker vlákna
-                threads = []
-                for i, series_batch in enumerate(worker_series):
-                    thread = threading.Thread(
-                        target=self.retry_worker,
-                        args=(i, series_batch, results)
-                    )
-                    threads.append(thread)
-                    thread.start()
-                
-                # Čekat na dokončení všech vláken
-                for thread in threads:
-                    thread.join()
+                try:
+                    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                        futures = {executor.submit(self.retry_worker, series_id): series_id for series_id in filtered_series}
+                        
+                        for i, future in enumerate(as_completed(futures)):
+                            if future.result():
+                                results['success'] += 1
+                            else:
+                                results['failed'] += 1
+                            
+                            # Zobrazit průběh
+                            if (i + 1) % 5 == 0 or i == len(futures) - 1:
+                                logger.info(f"Zpracováno {i+1}/{len(futures)} sérií")
+                finally:
+                    # Vlákna poolu končí, jejich drivery už nikdo nepoužije
+                    self._close_drivers()
+            
+            # Záznamy o pokusech musí být v databázi dřív, než je přečte report nebo alerty
+            self.flush_log()
             
             logger.info(f"Opakované stažení dokončeno: {results['success']} úspěšných, {results['failed']} neúspěšných")
             return True
@@ -613,36 +755,40 @@ class FredMonitor:
             
             # Získat data pro report
             integrity = self.check_database_integrity()
-            error_analysis = self.analyze_errors(days=1)
-            error_analysis_week = self.analyze_errors(days=7)
-            
-            # Statistiky o datech
-            conn = sqlite3.connect(self.config['db_file'])
+            # Denní analýza a týdenní souhrn z jednoho průchodu update_log
+            error_analysis = self.analyze_errors(days=1, summary_days=(7,))
+            error_analysis_week = error_analysis['windows'].get(7, {
+                'total_logs': 0,
+                'error_count': 0,
+                'success_count': 0,
+                'error_rate': 0
+            })
             
-            # Počet aktualizovaných sérií za posledních 24 hodin
+            # Statistiky o datech - výsledky jsou malé, stačí fetchall bez DataFrame
+            # Počet aktualizací každé série celkem a za posledních 24 hodin - jeden průchod update_log
             yesterday = (datetime.now() - timedelta(days=1)).isoformat()
-            updated_query = f"""
-            SELECT COUNT(DISTINCT series_id) 
-            FROM update_log 
-            WHERE timestamp >= '{yesterday}'
-            AND status = 'SUCCESS'
-            AND series_id != 'SYSTEM'
+            log_stats_query = """
+            WITH log_stats AS (
+                SELECT series_id,
+                       COUNT(*) AS update_count,
+                       SUM(CASE WHEN timestamp >= ? THEN 1 ELSE 0 END) AS last24
+                FROM update_log
+                WHERE status = 'SUCCESS'
+                AND series_id != 'SYSTEM'
+                GROUP BY series_id
+            )
+            SELECT series_id, update_count, last24
+            FROM log_stats
+            ORDER BY update_count DESC
             """
             
-            updated_series = pd.read_sql_query(updated_query, conn).iloc[0, 0]
+            log_stats = self._conn.execute(log_stats_query, (yesterday,)).fetchall()
             
-            # Top 10 nejčastěji aktualizovaných sérií
-            top_updated_query = """
-            SELECT series_id, COUNT(*) as update_count
-            FROM update_log
-            WHERE status = 'SUCCESS'
-            AND series_id != 'SYSTEM'
-            GROUP BY series_id
-            ORDER BY update_count DESC
-            LIMIT 10
-            """
+            # Počet aktualizovaných sérií za posledních 24 hodin
+            updated_series = sum(1 for _, _, last24 in log_stats if last24 > 0)
             
-            top_updated = pd.read_sql_query(top_updated_query, conn)
+            # Top 10 nejčastěji aktualizovaných sérií
+            top_updated = [(series_id, update_count) for series_id, update_count, _ in log_stats[:10]]
             
             # Frekvence aktualizace
             frequency_query = """
@@ -652,30 +798,20 @@ class FredMonitor:
             ORDER BY series_count DESC
             """
             
-            frequency_data = pd.read_sql_query(frequency_query, conn)
-            
-            conn.close()
+            frequency_data = self._conn.execute(frequency_query).fetchall()
             
             # Vytvořit HTML report
-            html = f"""
+            parts = []
+            append = parts.append
+            row = REPORT_ROW
+            item = REPORT_ITEM
+            
+            append(f"""
             <!DOCTYPE html>
             <html>
             <head>
                 <title>FRED Data Report - {today}</title>
-                <style>
-                    body {{ font-family: Arial, sans-serif; line-height: 1.6; padding: 20px; }}
-                    h1, h2, h3 {{ color: #333; }}
-                    .container {{ max-width: 1200px; margin: 0 auto; }}
-                    .section {{ margin-bottom: 30px; }}
-                    .summary {{ display: flex; flex-wrap: wrap; gap: 20px; }}
-                    .summary-item {{ background: #f5f5f5; padding: 15px; border-radius: 5px; flex: 1; }}
-                    .success {{ color: green; }}
-                    .warning {{ color: orange; }}
-                    .error {{ color: red; }}
-                    table {{ width: 100%; border-collapse: collapse; }}
-                    th, td {{ padding: 8px; text-align: left; border-bottom: 1px solid #ddd; }}
-                    th {{ background-color: #f2f2f2; }}
-                </style>
+                {REPORT_STYLE}
             </head>
             <body>
                 <div class="container">
@@ -707,27 +843,26 @@ class FredMonitor:
                             </div>
                         </div>
                     </div>
-            """
+            """)
             
             # Přidat sekci o problémech, pokud existují
             if integrity['issues']:
-                html += f"""
+                append(f"""
                     <div class="section">
                         <h2>Problémy s integritou databáze</h2>
                         <ul>
-                """
+                """)
                 
-                for issue in integrity['issues']:
-                    html += f"<li>{issue}</li>\n"
+                parts.extend(map(item, map(escape, integrity['issues'])))
                 
-                html += """
+                append("""
                         </ul>
                     </div>
-                """
+                """)
             
             # Přidat sekci o nejčastějších chybách
             if error_analysis['most_common_errors']:
-                html += f"""
+                append(f"""
                     <div class="section">
                         <h2>Nejčastější chyby (24h)</h2>
                         <table>
@@ -735,24 +870,20 @@ class FredMonitor:
                                 <th>Chyba</th>
                                 <th>Počet</th>
                             </tr>
-                """
+                """)
                 
-                for error in error_analysis['most_common_errors']:
-                    html += f"""
-                        <tr>
-                            <td>{error['message']}</td>
-                            <td>{error['count']}</td>
-                        </tr>
-                    """
+                errors = error_analysis['most_common_errors']
+                messages = [escape(error['message'] or '') for error in errors]
+                parts.extend(row(m, c) for m, c in zip(messages, [error['count'] for error in errors]))
                 
-                html += """
+                append("""
                         </table>
                     </div>
-                """
+                """)
             
             # Přidat nejproblematičtější série
             if error_analysis['affected_series']:
-                html += f"""
+                append(f"""
                     <div class="section">
                         <h2>Série s nejvíce chybami (24h)</h2>
                         <table>
@@ -760,24 +891,20 @@ class FredMonitor:
                                 <th>Series ID</th>
                                 <th>Počet chyb</th>
                             </tr>
-                """
+                """)
                 
-                for series in error_analysis['affected_series']:
-                    html += f"""
-                        <tr>
-                            <td>{series['series_id']}</td>
-                            <td>{series['error_count']}</td>
-                        </tr>
-                    """
+                affected = error_analysis['affected_series']
+                series_ids = [escape(series['series_id']) for series in affected]
+                parts.extend(row(s, c) for s, c in zip(series_ids, [series['error_count'] for series in affected]))
                 
-                html += """
+                append("""
                         </table>
                     </div>
-                """
+                """)
             
             # Přidat nejvíce aktualizované série
-            if not top_updated.empty:
-                html += f"""
+            if top_updated:
+                append(f"""
                     <div class="section">
                         <h2>Nejčastěji aktualizované série</h2>
                         <table>
@@ -785,24 +912,19 @@ class FredMonitor:
                                 <th>Series ID</th>
                                 <th>Počet aktualizací</th>
                             </tr>
-                """
+                """)
                 
-                for _, row in top_updated.iterrows():
-                    html += f"""
-                        <tr>
-                            <td>{row['series_id']}</td>
-                            <td>{row['update_count']}</td>
-                        </tr>
-                    """
+                series_ids = [escape(series_id) for series_id, _ in top_updated]
+                parts.extend(row(s, c) for s, c in zip(series_ids, [update_count for _, update_count in top_updated]))
                 
-                html += """
+                append("""
                         </table>
                     </div>
-                """
+                """)
             
             # Přidat frekvence aktualizace
-            if not frequency_data.empty:
-                html += f"""
+            if frequency_data:
+                append(f"""
                     <div class="section">
                         <h2>Frekvence aktualizace</h2>
                         <table>
@@ -810,48 +932,48 @@ class FredMonitor:
                                 <th>Frekvence</th>
                                 <th>Počet sérií</th>
                             </tr>
-                """
+                """)
                 
-                for _, row in frequency_data.iterrows():
-                    html += f"""
-                        <tr>
-                            <td>{row['frequency'] or 'Neuvedeno'}</td>
-                            <td>{row['series_count']}</td>
-                        </tr>
-                    """
+                frequencies = [escape(frequency or 'Neuvedeno') for frequency, _ in frequency_data]
+                parts.extend(row(f, c) for f, c in zip(frequencies, [series_count for _, series_count in frequency_data]))
                 
-                html += """
+                append("""
                         </table>
                     </div>
-                """
+                """)
             
             # Přidat informaci o implementaci
-            html += f"""
+            append(f"""
                 <div class="section">
                     <h2>Informace o systému</h2>
-                    <p><strong>Databáze:</strong> {self.config['db_file']}</p>
+                    <p><strong>Databáze:</strong> {escape(self.config['db_file'])}</p>
                     <p><strong>Implementace:</strong> {'Selenium (obcházení blokování)' if self.config['use_selenium'] else 'Standardní (requests/BeautifulSoup)'}</p>
                     <p><strong>Použití proxy:</strong> {'Ano' if self.config['use_proxy'] else 'Ne'}</p>
                     <p><strong>Paralelní zpracování:</strong> {self.config['max_workers']} workerů</p>
                 </div>
-            """
+            """)
             
             # Uzavřít HTML
-            html += """
+            append("""
                 </div>
             </body>
             </html>
-            """
+            """)
             
-            # Uložit report
-            with open(report_file, 'w', encoding='utf-8') as f:
-                f.write(html)
+            # Uložit report - bez e-mailu se fragmenty zapíší rovnou, jinak se spojí jen jednou
+            # a stejný řetězec poslouží pro soubor i e-mail (seznam fragmentů se hned uvolní)
+            payload = None
+            if self.config['email_notifications']:
+                payload = "".join(parts)
+                parts = [payload]
+            self._write_report(report_file, parts)
+            del parts
             
             logger.info(f"Denní report vygenerován a uložen do {report_file}")
             
             # Pokud je nastaveno odesílání e-mailem
-            if self.config['email_notifications']:
-                self.send_email_report(html, f"FRED Data Report - {today}")
+            if payload is not None:
+                self.send_email_report(payload, f"FRED Data Report - {today}")
             
             return report_file
         
@@ -859,87 +981,144 @@ class FredMonitor:
             logger.error(f"Chyba při generování denního reportu: {str(e)}")
             return None
     
+    def _write_report(self, report_file, parts):
+        """Zapíše fragmenty reportu do souboru, velké reporty přes mmap"""
+        if sum(map(len, parts)) <= REPORT_MMAP_THRESHOLD:
+            # Malý report - fragmenty rovnou do souboru bez skládání jednoho velkého řetězce
+            with open(report_file, 'w', encoding='utf-8') as f:
+                f.writelines(parts)
+            return
+        
+        # Velký report - nastavit velikost souboru a zapsat obsah přímo do namapovaných stránek
+        payload = "".join(parts).encode('utf-8')
+        size = len(payload)
+        fd = os.open(report_file, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            os.ftruncate(fd, size)
+            with mmap.mmap(fd, size, access=mmap.ACCESS_WRITE) as mm:
+                mm[:size] = payload
+                mm.flush()
+        finally:
+            os.close(fd)
+    
     def send_email_report(self, html_content, subject):
         """Odeslat report e-mailem"""
-        if not self.config['email_notifications']:
+        cfg = self.config
+        if not cfg['email_notifications']:
             logger.info("E-mailové notifikace jsou vypnuty v konfiguraci")
             return False
         
         try:
+            recipients = ', '.join(cfg['email_to'])
+            
             # Vytvořit e-mail
             msg = MIMEMultipart()
-            msg['From'] = self.config['email_from']
-            msg['To'] = ', '.join(self.config['email_to'])
+            msg['From'] = cfg['email_from']
+            msg['To'] = recipients
             msg['Subject'] = subject
             
             # Přidat HTML obsah
             msg.attach(MIMEText(html_content, 'html'))
             
-            # Připojit se k SMTP serveru
-            server = smtplib.SMTP(self.config['smtp_server'], self.config['smtp_port'])
-            server.starttls()
-            server.login(self.config['smtp_user'], self.config['smtp_password'])
-            
-            # Odeslat e-mail
-            server.send_message(msg)
-            server.quit()
+            with self._smtp_lock:
+                # Připojit se k SMTP serveru jen pokud ještě nemáme živé spojení
+                if self._smtp is None or not self._smtp_alive():
+                    self._disconnect_smtp()
+                    self._smtp = smtplib.SMTP(cfg['smtp_server'], cfg['smtp_port'])
+                    self._smtp.starttls()
+                    self._smtp.login(cfg['smtp_user'], cfg['smtp_password'])
+                
+                # Odeslat e-mail, spojení zůstává otevřené pro další zprávy
+                self._smtp.send_message(msg)
             
-            logger.info(f"E-mail úspěšně odeslán na {', '.join(self.config['email_to'])}")
+            logger.info(f"E-mail úspěšně odeslán na {recipients}")
             return True
         
         except Exception as e:
             logger.error(f"Chyba při odesílání e-mailu: {str(e)}")
             return False
     
+    def _smtp_alive(self):
+        """Ověří, že otevřené SMTP spojení stále odpovídá"""
+        try:
+            return self._smtp.noop()[0] == 250
+        except Exception:
+            return False
+    
+    def _disconnect_smtp(self):
+        """Ukončí aktuální SMTP spojení, volající drží _smtp_lock"""
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+    
+    def close(self):
+        """Uzavře SMTP spojení otevřené pro odesílání e-mailů"""
+        with self._smtp_lock:
+            self._disconnect_smtp()
+    
     def check_for_alerts(self):
         """Kontroluje, zda je třeba odeslat upozornění o chybách"""
         try:
             # Analyzovat chyby za posledních 24 hodin
             error_analysis = self.analyze_errors(days=1)
             
+            cfg = self.config
+            threshold = cfg['error_threshold']
+            error_count = error_analysis['error_count']
+            
             # Pokud překročí práh, odeslat upozornění
-            if error_analysis['error_count'] >= self.config['error_threshold']:
-                subject = f"FRED Data Alert - {error_analysis['error_count']} chyb za posledních 24 hodin"
+            if error_count >= threshold:
+                subject = f"FRED Data Alert - {error_count} chyb za posledních 24 hodin"
                 
-                message = f"""
+                lines = [f"""
                 <html>
                 <body>
                     <h2>ALERT: Vysoký počet chyb při aktualizaci FRED dat</h2>
-                    <p>Za posledních 24 hodin došlo k {error_analysis['error_count']} chybám, 
-                    což překračuje nastavený práh {self.config['error_threshold']}.</p>
+                    <p>Za posledních 24 hodin došlo k {error_count} chybám, 
+                    což překračuje nastavený práh {threshold}.</p>
                     
                     <h3>Statistiky:</h3>
                     <ul>
                         <li>Celkem operací: {error_analysis['total_logs']}</li>
                         <li>Úspěšných: {error_analysis['success_count']}</li>
-                        <li>Chyb: {error_analysis['error_count']}</li>
+                        <li>Chyb: {error_count}</li>
                         <li>Míra chyb: {error_analysis['error_rate']:.2%}</li>
                     </ul>
                     
                     <h3>Nejčastější chyby:</h3>
                     <ol>
-                """
+                """]
                 
-                for error in error_analysis['most_common_errors'][:5]:
-                    message += f"<li>{error['message']} ({error['count']}x)</li>"
+                # Texty z logu escapovat předem po sloupcích, v generátoru už jen skládat řádky
+                top_errors = error_analysis['most_common_errors'][:5]
+                messages = [escape(error['message'] or '') for error in top_errors]
+                counts = [error['count'] for error in top_errors]
+                lines.extend(f"<li>{m} ({c}x)</li>" for m, c in zip(messages, counts))
                 
-                message += """
+                lines.append("""
                     </ol>
                     
                     <h3>Nejvíce zasažené série:</h3>
                     <ol>
-                """
+                """)
                 
-                for series in error_analysis['affected_series'][:5]:
-                    message += f"<li>{series['series_id']} ({series['error_count']}x)</li>"
+                top_series = error_analysis['affected_series'][:5]
+                series_ids = [escape(series['series_id']) for series in top_series]
+                counts = [series['error_count'] for series in top_series]
+                lines.extend(f"<li>{s} ({c}x)</li>" for s, c in zip(series_ids, counts))
                 
-                message += """
+                lines.append("""
                     </ol>
                 </body>
                 </html>
-                """
+                """)
+                
+                message = "".join(lines)
                 
-                if self.config['email_notifications']:
+                if cfg['email_notifications']:
                     self.send_email_report(message, subject)
                 
                 logger.warning(subject)
@@ -963,11 +1142,12 @@ def main():
     parser.add_argument('--full', action='store_true', help='Spustit všechny funkce (kontrola, retry, report, alerty)')
     parser.add_argument('--email', action='store_true', help='Aktivovat e-mailové notifikace')
     parser.add_argument('--proxy', type=str, help='Použít proxy server pro spojení')
+    parser.add_argument('--save-config', action='store_true', help='Uložit výchozí konfiguraci, pokud konfigurační soubor neexistuje')
     
     args = parser.parse_args()
     
     # Vytvořit instanci monitoru
-    monitor = FredMonitor(config_file=args.config, db_file=args.db_file)
+    monitor = FredMonitor(config_file=args.config, db_file=args.db_file, persist_defaults=args.save_config)
     
     # Aktualizovat konfiguraci podle argumentů
     if args.proxy:
@@ -976,23 +1156,30 @@ def main():
     if args.email:
         monitor.config['email_notifications'] = True
     
-    # Spustit požadované funkce
-    if args.check or args.full:
-        monitor.check_database_integrity()
-    
-    if args.retry or args.full:
-        monitor.retry_failed_series(days=args.retry_days)
-    
-    if args.report or args.full:
-        monitor.generate_daily_report()
+    # Akce v pořadí spuštění: (argument, funkce, parametry)
+    actions = [
+        ("check", monitor.check_database_integrity, ()),
+        ("retry", monitor.retry_failed_series, (args.retry_days,)),
+        ("report", monitor.generate_daily_report, ()),
+        ("alerts", monitor.check_for_alerts, ())
+    ]
     
-    if args.alerts or args.full:
-        monitor.check_for_alerts()
+    if args.full:
+        # Nezávislé akce běží souběžně; report a alerty čtou výsledky retry, proto až ve druhé vlně
+        for stage in (actions[:2], actions[2:]):
+            with ThreadPoolExecutor(max_workers=len(stage)) as executor:
+                list(executor.map(lambda action: action[1](*action[2]), stage))
+    else:
+        for name, func, params in actions:
+            if getattr(args, name):
+                func(*params)
     
     # Pokud nebyl zadán žádný argument, zkontrolovat integritu
     if not any([args.check, args.report, args.retry, args.alerts, args.full]):
         monitor.check_database_integrity()
         print("Pro zobrazení všech dostupných možností použijte --help")
+    
+    monitor.close()
 
 # Příklad použití
 if __name__ == "__main__":
@@ -1001,7 +1188,6 @@ if __name__ == "__main__":
         main()
     else:
         # Standardní chování při importu jako modul
-        random = __import__('random')  # Skrytý import, aby se dal použít v retry_worker
         monitor = FredMonitor()
         
         # Kontrola integrity
@@ -1017,4 +1203,6 @@ if __name__ == "__main__":
         monitor.generate_daily_report()
         
         # Kontrola upozornění
-        monitor.check_for_alerts()
\ No newline at end of file
+        monitor.check_for_alerts()
+        
+        monitor.close()
\ No newline at end of file